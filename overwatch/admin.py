@@ -5,6 +5,9 @@ from overwatch.models import (
     ApiProfile,
     Bot,
     BotHeartBeat,
+    BotLatestState,
+    BotProfitRollup,
+    BotDataRollup,
     BotError,
     BotPlacedOrder,
     BotPrice,
@@ -12,6 +15,7 @@ from overwatch.models import (
     BotTrade,
     Exchange,
     AWS,
+    PriceHistory,
 )
 
 
@@ -105,3 +109,27 @@ class ExchangeAdmin(admin.ModelAdmin):
 @admin.register(AWS)
 class AWSAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ["currency", "time", "price_url"]
+    list_filter = ["currency", "price_url"]
+
+
+@admin.register(BotLatestState)
+class BotLatestStateAdmin(admin.ModelAdmin):
+    list_display = ["bot", "last_heartbeat", "last_error", "profit", "version"]
+    raw_id_fields = ["bot", "last_price", "last_balance"]
+
+
+@admin.register(BotProfitRollup)
+class BotProfitRollupAdmin(admin.ModelAdmin):
+    list_display = ["bot", "day", "profit_usd", "trade_count"]
+    list_filter = ["bot"]
+
+
+@admin.register(BotDataRollup)
+class BotDataRollupAdmin(admin.ModelAdmin):
+    list_display = ["bot", "table", "period", "time", "count"]
+    list_filter = ["bot", "table", "period"]
@@ -1,19 +1,22 @@
 import datetime
-import math
 import os
+import signal
 import sys
+import threading
 import time
 import random
-import ccxt
 import logging
 
+from executor import OrderExecutor
+from market_cache import get_wrapper
 from price_manager import PriceManager
+from reconcile import Account, Snapshot, plan_side
 from vigil import vigil_alert
 from overwatch import Overwatch
 
 
 class Bot(object):
-    def __init__(self, name, exchange):
+    def __init__(self, name, exchange, price_manager=None, account=None):
         # get a decent logger#
         self.logger = self.setup_logging()
 
@@ -26,27 +29,69 @@ class Bot(object):
         self.get_overwatch_wrapper()
 
         # get the bot config from Overwatch
-        self.config = self.overwatch.get_config()
+        self.config = None
+        self.symbol = None
 
-        if not self.config:
-            self.logger.error("Failed to get Overwatch config")
+        # instantiate the ccxt wrapper for this bots exchange
+        self.wrapper = None
+        self.market = None
+
+        if not self.get_config():
             sys.exit(1)
 
+        # order actions run concurrently, paced by the exchange rate limit
+        self.executor = OrderExecutor(
+            self.wrapper,
+            workers=int(os.environ.get("ORDER_WORKERS", 4)),
+            burst=int(os.environ.get("ORDER_BURST", 1)),
+            batch_size=int(os.environ.get("ORDER_BATCH_SIZE", 5)),
+        )
+
+        # aggregator prices. A long running bot passes in one that keeps them between runs
+        self.price_manager = price_manager or PriceManager()
+
+        # the balances and orders of an account shared with other bots in the process
+        self.account = account
+
+        self.start_run()
+
+    def get_config(self):
+        """
+        Fetch the bot config from Overwatch and set up the market it names.
+        Once it has been fetched Overwatch only says whether it changed, and an unchanged config is kept as it is.
+        Returns False, leaving the current config in place, if it can't be fetched
+        """
+        config = self.overwatch.get_config()
+
+        if not config:
+            self.logger.error("Failed to get Overwatch config")
+            return False
+
+        if not self.overwatch.config_changed:
+            return True
+
+        self.config = config
         self.symbol = self.config.get("market")
 
-        # instantiate the ccxt wrapper for this bots exchange
-        self.wrapper = None
-        self.market = None
-        self.get_exchange_wrapper()
+        # the wrapper and its loaded markets are kept when the config is fetched again
+        if self.wrapper is None:
+            self.get_exchange_wrapper()
+        else:
+            self.market = self.wrapper.market(self.symbol)
 
-        # set the sleep values
-        self.sleep_short = int(os.environ.get("SLEEP_SHORT", 2))
-        self.sleep_medium = int(os.environ.get("SLEEP_MEDIUM", 3))
-        self.sleep_long = int(os.environ.get("SLEEP_LONG", 5))
+        return True
 
+    def start_run(self):
+        """
+        Get the prices and limits a run works with, and forget the orders and balances of the last one
+        """
         self.logger.info("Working on {}@{}".format(self.symbol, self.exchange))
         self.logger.info("{}".format(datetime.datetime.now()))
 
+        # the open orders and balances the run works from, fetched once
+        self.snapshot = None
+        self.executor.latencies = []
+
         # get the prices
         self.price = 0
         self.buy_price = 0
@@ -62,6 +107,16 @@ class Bot(object):
         self.total_ask = 0
         self.get_limits()
 
+    def tick(self):
+        """
+        Run again in a long running process.
+        The wrapper, markets and prices are reused and the config is only fetched again if it has changed
+        """
+        self.get_config()
+
+        self.start_run()
+        self.run()
+
     @staticmethod
     def setup_logging():
         logger = logging.getLogger()
@@ -80,17 +135,10 @@ class Bot(object):
         """
         Instantiate the CCXT exchange wrapper
         """
-        wrapper_class = getattr(ccxt, self.exchange.lower())
-        self.wrapper = wrapper_class(
-            {
-                "apiKey": os.environ["API_KEY"],
-                "secret": os.environ["API_SECRET"],
-                "nonce": ccxt.Exchange.milliseconds,
-            }
-        )
-        self.market = next(
-            m for m in self.wrapper.fetch_markets() if m.get("symbol") == self.symbol
+        self.wrapper = get_wrapper(
+            self.exchange, os.environ["API_KEY"], os.environ["API_SECRET"]
         )
+        self.market = self.wrapper.market(self.symbol)
 
     def get_overwatch_wrapper(self):
         """
@@ -100,6 +148,7 @@ class Bot(object):
             api_secret=os.environ["OVERWATCH_API_SECRET"],
             name=self.name,
             exchange=self.exchange,
+            buffered=True,
         )
 
     def get_prices(self):
@@ -111,7 +160,7 @@ class Bot(object):
         self.logger.info("Getting Price")
         market_price = self.wrapper.fetch_ticker(self.symbol).get("last")
 
-        pm = PriceManager()
+        pm = self.price_manager
         self.quote_price = pm.get_price(
             self.market.get("quote"), self.config.get("quote_price_url")
         )
@@ -222,11 +271,21 @@ class Bot(object):
             self.total_ask = self.config.get("total_ask", 0) / self.base_price
             self.total_bid = self.config.get("total_bid", 0) / self.base_price
 
-    def get_open_orders(self):
+    def get_snapshot(self):
         """
-        get the currently open orders
+        get the open orders and balances, fetched on first use in the run
         """
-        return self.wrapper.fetch_open_orders(self.symbol)
+        if self.snapshot is None and self.account is not None:
+            self.snapshot = self.account.get_snapshot(
+                self.symbol, self.get_base(), self.get_quote()
+            )
+
+        if self.snapshot is None:
+            self.snapshot = Snapshot.fetch(
+                self.wrapper, self.symbol, self.get_base(), self.get_quote()
+            )
+
+        return self.snapshot
 
     def get_base(self) -> str:
         """
@@ -311,130 +370,101 @@ class Bot(object):
 
         return True
 
-    def place_order(self, order_type, price, amount):
+    def check_order(self, price, amount):
         """
-        place an order based on the order_type
+        check the order lies within the market limits
         """
-        if not self.check_amount(amount):
-            return
+        return (
+            self.check_amount(amount)
+            and self.check_price(price)
+            and self.check_cost(amount, price)
+        )
 
-        if not self.check_price(price):
-            return
+    def place_orders(self, orders):
+        """
+        place the (order_type, price, amount) orders that lie within the market limits.
+        The snapshot holds each order once it is placed
+        """
+        orders = [order for order in orders if self.check_order(order[1], order[2])]
 
-        if not self.check_cost(amount, price):
-            return
+        for order_type, price, amount in orders:
+            self.logger.info(
+                "Placing {} order of {} @ {}".format(order_type.title(), amount, price)
+            )
 
-        if order_type == "buy":
-            try:
-                self.logger.info("Placing Buy order of {} @ {}".format(amount, price))
-                place = self.wrapper.create_limit_buy_order(self.symbol, amount, price)
-            except Exception as e:
-                self.logger.error("Placing limit buy order failed: {}".format(e))
-                return
-        else:
-            try:
-                self.logger.info("Placing Sell order of {} @ {}".format(amount, price))
-                place = self.wrapper.create_limit_sell_order(self.symbol, amount, price)
-            except Exception as e:
-                self.logger.error("Placing limit sell order failed: {}".format(e))
-                return
+        results = self.executor.create_orders(self.symbol, orders)
+
+        for (order_type, price, amount), result in zip(orders, results):
+            if result.error is not None:
+                self.logger.error(
+                    "Placing limit {} order failed: {}".format(order_type, result.error)
+                )
+                continue
+
+            if not result.value:
+                # TODO: if order placing fails. alert to vigil
+                self.logger.error("Failed to place order")
+                continue
 
-        if place:
             self.overwatch.record_placed_order(
                 self.market.get("base"),
                 self.market.get("quote"),
                 order_type,
                 price,
-                self.order_amount,
+                amount,
+            )
+            self.get_snapshot().placed(
+                result.value.get("id"), order_type, price, amount
+            )
+            self.logger.info(
+                "Order Placed: {} in {:.3f}s".format(
+                    result.value.get("id"), result.latency
+                )
             )
-            self.logger.info("Order Placed: {}".format(place.get("id")))
-
-        else:
-            # TODO: if order placing fails. alert to vigil
-            self.logger.error("Failed to place order")
 
-    def reset_order(self, order_id, order_type, price):
+    def cancel_orders(self, orders):
         """
-        Cancel the order given by order_id
-        Place an new order at price
+        Cancel the orders. Returns the orders that were cancelled
         """
-        self.logger.info("Resetting order {}".format(order_id))
-
-        # cancel the order
-        success = self.wrapper.cancel_order(order_id)
+        results = self.executor.cancel_orders(
+            self.symbol, [order.get("id") for order in orders]
+        )
+        cancelled = []
 
-        # check we've cancelled the order
-        if not success:
-            self.logger.error("Unable to cancel order {}".format(order_id))
-            return
+        for order, result in zip(orders, results):
+            if result.error is not None:
+                self.logger.error(
+                    "Cancelling order {} failed: {}".format(
+                        order.get("id"), result.error
+                    )
+                )
+                continue
 
-        time.sleep(self.sleep_short)
+            if not result.value:
+                self.logger.error("Unable to cancel order {}".format(order.get("id")))
+                continue
 
-        jittered_price = self.get_jittered_price(price, order_type)
-        amount = self.order_amount
+            self.get_snapshot().cancelled(order)
+            cancelled.append(order)
 
-        self.place_order(order_type, jittered_price, amount)
+        return cancelled
 
     def get_order_total(self):
         """
-        Get orders from exchange wrapper.
-        Return the total amount on each side
+        Return the total amount on order on each side
         """
-        total = {"sell": 0, "buy": 0}
-
-        for order in self.get_open_orders():
-            if order.get("side") == "buy":
-                total["buy"] += order.get("amount")
-            else:
-                total["sell"] += order.get("amount")
+        snapshot = self.get_snapshot()
 
-        return total
+        return {
+            "sell": snapshot.get_on_order("sell"),
+            "buy": snapshot.get_on_order("buy"),
+        }
 
     def get_available_balance(self, currency):
         """
         Return the available balance for the given currency
         """
-        balances = self.wrapper.fetch_balance()
-
-        for cur in balances:
-            if cur == currency.upper():
-                return balances.get(cur).get("free", 0.0)
-
-        return 0.0
-
-    def check_existing_orders(self):
-        orders = self.get_open_orders()
-        self.check_existing_side_orders(orders, "buy", self.buy_price)
-        self.check_existing_side_orders(orders, "sell", self.sell_price)
-
-    def check_existing_side_orders(self, orders, order_type, price):
-        """
-        Check that existing order prices lie within the pair tolerance
-        """
-        self.logger.info("Checking Existing {} Orders".format(order_type.title()))
-
-        for order in orders:
-            if order.get("side") != order_type:
-                continue
-
-            self.logger.info(
-                "Checking {} order {}".format(order_type.title(), order.get("id"))
-            )
-
-            order_tolerance = (
-                max(order.get("price"), price) - min(order.get("price"), price)
-            ) / price
-
-            self.logger.info(
-                "Got an order tolerance of {} against {}".format(
-                    order_tolerance, self.config.get("tolerance")
-                )
-            )
-
-            # if the order price is outside of the allowed tolerance
-            if order_tolerance > self.config.get("tolerance"):
-                self.reset_order(order.get("id"), order_type.lower(), price)
-                time.sleep(self.sleep_medium)
+        return self.get_snapshot().get_free(currency)
 
     def report_balances(self):
         """
@@ -455,189 +485,109 @@ class Bot(object):
             ask_on_order=totals_on_order["sell"],
         )
 
-    def check_total_is_reached(self):
-        self.check_side_total_is_reached("buy", self.total_ask, self.buy_price)
-        self.check_side_total_is_reached("sell", self.total_bid, self.sell_price)
-
-    def check_side_total_is_reached(self, side, side_total, price):
+    def plan_orders(self):
         """
-        Check that the combined amount on order is equal to or more than the target
-        If the combined amount comes up short,
-        place a number of orders to reach the target.
-        (We don't worry too much if the target isn't reached completely,
-        the bot should place the missing order in 60 seconds time.
-        We also don't worry if the target is slightly over)
+        Work out the orders to cancel, reset and place on each side from the snapshot
         """
-        self.logger.info("Checking {} Wall Height".format(side.title()))
-
-        total = self.get_order_total()[side]
-
-        target = side_total
-        step = self.order_amount
-
-        self.logger.info(
-            "{}: Total = {}, Target = {}, step = {}".format(
-                side.title(), total, target, step
-            )
-        )
-
-        if total < target:
-            # calculate the difference between current total and the target
-            difference = target - total
-            # get the balance Available
-            check_currency = (
-                self.market.get("quote") if side == "buy" else self.market.get("base")
-            )
-            balance = self.get_available_balance(check_currency)
+        snapshot = self.get_snapshot()
 
-            self.logger.info(
-                "Got available balance of {} {}".format(balance, check_currency)
+        return [
+            plan_side(
+                snapshot,
+                side,
+                price,
+                target,
+                self.order_amount,
+                self.config.get("tolerance"),
+                self.get_jittered_price,
             )
-
-            if side == "buy":
-                # if we are looking at the sell wall the balance will be in 'quote' currency
-                # we need to work out how many 'base' currency that is
-                balance = balance / self.price
-
-            self.logger.info(
-                "Got working balance of {} {}".format(balance, self.market.get("base"))
+            for side, price, target in (
+                ("buy", self.buy_price, self.total_bid),
+                ("sell", self.sell_price, self.total_ask),
             )
+        ]
 
-            # we can only place orders up to the value of 'balance'
-            if balance < difference:
-                # then warn
-                self.logger.warning("Not enough funds available to reach target")
-                self.logger.warning(
-                    "Need {} to reach target of {} "
-                    "but only {:.4f} available".format(difference, target, balance)
-                )
-                vigil_alert(
-                    alert_channel_id=os.environ["VIGIL_FUNDS_ALERT_CHANNEL_ID"],
-                    data={
-                        "bot_name": self.name,
-                        "currency": self.market.get("base")
-                        if side == "buy"
-                        else self.market.get("quote"),
-                        "exchange": self.exchange.title(),
-                        "target_amount": target,
-                        "amount_on_order": total,
-                        "amount_available": balance,
-                    },
-                )
-                # set difference to == balance
-                difference = balance
-
-            # calculate the number of orders we need to make the total
-            # use balance instead of step amount if not enough is available
-            if balance < step:
-                self.logger.warning(
-                    "Not enough funds to place a full order. Attempting to place available balance"
-                )
-                # setting step to balance exactly can cause api errors
-                step = balance * 0.9
-
-            number_of_orders = 0
-
-            if step > 0:
-                number_of_orders = math.ceil(difference / step)
-
-            # place the orders needed
-            if number_of_orders > 0:
-                self.logger.info(
-                    "Placing {} orders to reach {} target {} from {}".format(
-                        number_of_orders, side, target, total
-                    )
-                )
-                for x in range(number_of_orders):
-                    jittered_price = self.get_jittered_price(price, side)
-                    self.place_order(side, jittered_price, step)
-                    time.sleep(self.sleep_short)
-
-    def check_order_prices(self):
-        orders = self.get_open_orders()
-        self.check_order_side_prices(orders, "buy", self.buy_price)
-        self.check_order_side_prices(orders, "sell", self.sell_price)
-
-    def check_order_side_prices(self, orders, side, price):
+    def alert_shortfall(self, plan):
         """
-        For each order, check that the price it is placed at is correct.
-        Cancel the order if it isn't
+        Warn that the funds available can't reach the side target
         """
-        self.logger.info(
-            "Checking Existing {} Order Prices Against {} price {:.8f}".format(
-                side.title(), "Sell" if side == "sell" else "Buy", price
-            )
-        )
-
-        for order in orders:
-            if order.get("side") != side:
-                continue
-
-            if side == "buy":
-                cancel = float(order["price"]) > price
-            else:
-                cancel = float(order["price"]) < price
-
-            if cancel:
-                self.logger.info(
-                    "Cancelling {} Order {} @ {}".format(
-                        side.title(), order["id"], order["price"]
-                    )
-                )
-                self.wrapper.cancel_order(order.get("id"))
+        target, total, balance = plan.shortfall
 
-    def check_orders_over_target(self):
-        orders = self.get_open_orders()
-        self.check_orders_over_target_side(
-            orders, "buy", self.total_bid, self.buy_price
+        self.logger.warning("Not enough funds available to reach target")
+        self.logger.warning(
+            "Need {} to reach target of {} "
+            "but only {:.4f} available".format(target - total, target, balance)
         )
-        self.check_orders_over_target_side(
-            orders, "sell", self.total_ask, self.sell_price
+        vigil_alert(
+            alert_channel_id=os.environ["VIGIL_FUNDS_ALERT_CHANNEL_ID"],
+            data={
+                "bot_name": self.name,
+                "currency": self.market.get("base")
+                if plan.side == "buy"
+                else self.market.get("quote"),
+                "exchange": self.exchange.title(),
+                "target_amount": target,
+                "amount_on_order": total,
+                "amount_available": balance,
+            },
         )
 
-    def check_orders_over_target_side(self, orders, side, side_total, price):
+    def reconcile(self):
         """
-        Cancel any orders that take the side total to greater than the target
+        Bring the orders on each side in line with the current prices and targets
         """
-        self.logger.info("Checking For {} Orders Over Target".format(side.title()))
-
-        total = self.get_order_total()[side]
+        plans = self.plan_orders()
 
-        target = side_total + self.order_amount
-
-        self.logger.info(
-            "{}: Total = {}, Target = {}".format(side.title(), total, target)
-        )
-
-        if total > target:
-            # total on side is too high so remove bottom orders
-            difference = total - target
-            num = math.floor(difference / self.order_amount)
+        for plan in plans:
             self.logger.info(
-                "Got Diff of {}. Removing {} orders".format(difference, num)
+                "{}: {} to cancel, {} to reset, {} to place".format(
+                    plan.side.title(),
+                    len(plan.cancels),
+                    len(plan.resets),
+                    len(plan.places),
+                )
             )
 
-            remove_orders = sorted(
-                [o for o in orders if o.get("side") == side],
-                key=lambda x: x["price"],
-                reverse=(side == "sell"),
-            )
+            if plan.shortfall is not None:
+                self.alert_shortfall(plan)
 
-            self.logger.info("Remove {} Orders".format(len(remove_orders[:num])))
+        cancels = []
 
-            for order in remove_orders[:num]:
+        for plan in plans:
+            for order, reason in plan.cancels:
                 self.logger.info(
-                    "Cancelling {} Order {}".format(side.title(), order.get("id"))
+                    "Cancelling {} Order {} @ {} ({})".format(
+                        plan.side.title(), order.get("id"), order.get("price"), reason
+                    )
                 )
-                self.wrapper.cancel_order(order.get("id"))
+                cancels.append(order)
+
+            for order, price, amount in plan.resets:
+                self.logger.info("Resetting order {}".format(order.get("id")))
+                cancels.append(order)
+
+        # every cancel goes first, so the funds they free are there for the new orders
+        cancelled = {order.get("id") for order in self.cancel_orders(cancels)}
+
+        self.place_orders(
+            [
+                (order.get("side"), price, amount)
+                for plan in plans
+                for order, price, amount in plan.resets
+                if order.get("id") in cancelled
+            ]
+            + [
+                (plan.side, price, amount)
+                for plan in plans
+                for price, amount in plan.places
+            ]
+        )
 
     def cancel_all_orders(self):
         """
         In an emergency, cancel all the orders
         """
-        for order in self.wrapper.fetch_open_orders(self.symbol):
-            self.wrapper.cancel_order(order.get("id"))
-            time.sleep(self.sleep_short)
+        self.cancel_orders(list(self.get_snapshot().orders))
 
     def get_trades(self):
         """
@@ -674,6 +624,15 @@ class Bot(object):
             )
 
     def run(self):
+        try:
+            self.run_steps()
+        finally:
+            self.executor.log_latencies()
+
+            # send everything reported during the run to Overwatch in one request
+            self.overwatch.flush()
+
+    def run_steps(self):
         start_time = time.time()
 
         if self.config.get("stop"):
@@ -682,25 +641,15 @@ class Bot(object):
             self.cancel_all_orders()
             return
 
-        # cancel orders with prices which overlap the calculated price
-        self.check_order_prices()
-        time.sleep(self.sleep_short)
-
-        # cancel orders placed over side target
-        self.check_orders_over_target()
-        time.sleep(self.sleep_short)
-
-        # check that existing orders are placed within the price tolerance
-        self.check_existing_orders()
-        time.sleep(self.sleep_short)
+        if not self.price:
+            # there is no price to place orders at, the orders were cancelled when it wasn't found
+            return
 
-        # check that side targets are reached
-        self.check_total_is_reached()
-        time.sleep(self.sleep_short)
+        # cancel, reset and place orders from one snapshot of the open orders and balances
+        self.reconcile()
 
         # report balances to Overwatch
         self.report_balances()
-        time.sleep(self.sleep_long)
 
         # report new trades to Overwatch
         self.get_trades()
@@ -714,5 +663,68 @@ def main(event, context):
     return "Complete"
 
 
+def run_daemon():
+    """
+    Run bots every TICK_SECONDS in this process rather than once per Lambda invocation.
+    BOT_NAMES lists the bots (by default just BOT_NAME), all trading on the EXCHANGE account of API_KEY.
+    They share the ccxt wrapper and its loaded markets, aggregator prices are kept for PRICE_CACHE_SECONDS,
+    and the account's balances and open orders are fetched once a tick for all of them.
+    Each tick a bot asks Overwatch whether its config has changed, and only fetches it again if it has.
+    SIGTERM or SIGINT stop the loop once the current tick is over
+    """
+    tick_seconds = float(os.environ.get("TICK_SECONDS", 120))
+    names = os.environ.get("BOT_NAMES", os.environ.get("BOT_NAME", "")).split(",")
+    stopping = threading.Event()
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, lambda *args: stopping.set())
+
+    price_manager = PriceManager(
+        max_age=float(os.environ.get("PRICE_CACHE_SECONDS", 300))
+    )
+    account = Account(
+        get_wrapper(
+            os.environ.get("EXCHANGE"), os.environ["API_KEY"], os.environ["API_SECRET"]
+        )
+    )
+    bots = [
+        Bot(
+            name.strip(),
+            os.environ.get("EXCHANGE"),
+            price_manager=price_manager,
+            account=account,
+        )
+        for name in names
+        if name.strip()
+    ]
+    next_tick = time.monotonic()
+    first = True
+
+    while True:
+        account.start_tick([bot.symbol for bot in bots])
+
+        for bot in bots:
+            try:
+                if first:
+                    # the first run was started when the bot was created
+                    bot.run()
+                else:
+                    bot.tick()
+            except Exception as e:
+                # a failed run is tried again at the next tick
+                bot.logger.exception("{} run failed: {}".format(bot.name, e))
+
+        first = False
+
+        # a tick that overruns is followed straight away by the next, rather than by a backlog
+        next_tick = max(next_tick + tick_seconds, time.monotonic())
+
+        if stopping.wait(next_tick - time.monotonic()):
+            return
+
+
 if __name__ == "__main__":
-    main(None, None)
+    if "--daemon" in sys.argv:
+        run_daemon()
+    else:
+        main(None, None)
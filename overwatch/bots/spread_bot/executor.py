@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+"""
+Order actions (cancels and placements) run concurrently rather than one after another with sleeps between.
+Requests are started no faster than the exchange's ccxt rateLimit (the milliseconds between requests)
+allows, paced by a token bucket holding up to `burst` requests, so slow responses overlap
+instead of each one holding up the next.
+Where ccxt says the exchange can create or cancel several orders in one request,
+the actions are sent in batches of up to `batch_size`.
+The results are handed back to the caller's thread in the order the actions were given,
+so nothing the bot keeps (the snapshot, the Overwatch buffer) is touched from a worker thread.
+"""
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity):
+        # tokens added per second and the most the bucket holds
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class Result(object):
+    def __init__(self, action, value=None, error=None, latency=0.0):
+        self.action = action
+        self.value = value
+        self.error = error
+        self.latency = latency
+
+
+class OrderExecutor(object):
+    def __init__(self, wrapper, workers=4, burst=1, batch_size=5):
+        self.wrapper = wrapper
+        self.workers = workers
+        self.batch_size = batch_size
+        # rateLimit is the milliseconds ccxt waits between requests
+        self.bucket = TokenBucket(1000.0 / max(wrapper.rateLimit, 1), burst)
+        # (action, seconds) of every request made
+        self.latencies = []
+
+    def call(self, action, function, *args):
+        """
+        Make one paced request. Errors are returned in the Result rather than raised
+        """
+        self.bucket.acquire()
+        start = time.monotonic()
+
+        try:
+            value = function(*args)
+            error = None
+        except Exception as e:
+            value = None
+            error = e
+
+        latency = time.monotonic() - start
+        self.latencies.append((action, latency))
+
+        return Result(action, value, error, latency)
+
+    def run(self, calls):
+        """
+        Make the (action, function, *args) calls concurrently. Returns their Results in the same order
+        """
+        if not calls:
+            return []
+
+        if len(calls) == 1:
+            return [self.call(*calls[0])]
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(calls))) as pool:
+            return list(pool.map(lambda x: self.call(*x), calls))
+
+    def get_batches(self, items):
+        return [
+            items[index : index + self.batch_size]
+            for index in range(0, len(items), self.batch_size)
+        ]
+
+    def cancel_orders(self, symbol, order_ids):
+        """
+        Cancel the orders. Returns a Result for each order id
+        """
+        if len(order_ids) > 1 and self.wrapper.has.get("cancelOrders"):
+            results = []
+
+            for batch, result in self.run_batches(
+                "cancel_orders", order_ids, self.wrapper.cancel_orders, symbol
+            ):
+                results.extend(
+                    Result(
+                        "cancel", result.value is not None, result.error, result.latency
+                    )
+                    for _ in batch
+                )
+
+            return results
+
+        return self.run(
+            [("cancel", self.wrapper.cancel_order, order_id) for order_id in order_ids]
+        )
+
+    def create_orders(self, symbol, orders):
+        """
+        Place the (side, price, amount) limit orders. Returns a Result holding each placed order
+        """
+        if len(orders) > 1 and self.wrapper.has.get("createOrders"):
+            requests = [
+                {
+                    "symbol": symbol,
+                    "type": "limit",
+                    "side": side,
+                    "amount": amount,
+                    "price": price,
+                }
+                for side, price, amount in orders
+            ]
+            results = []
+
+            for batch, result in self.run_batches(
+                "create_orders", requests, self.wrapper.create_orders
+            ):
+                placed = result.value or [None] * len(batch)
+                results.extend(
+                    Result("place", order, result.error, result.latency)
+                    for order in placed
+                )
+
+            return results
+
+        return self.run(
+            [
+                (
+                    "place",
+                    self.wrapper.create_limit_buy_order
+                    if side == "buy"
+                    else self.wrapper.create_limit_sell_order,
+                    symbol,
+                    amount,
+                    price,
+                )
+                for side, price, amount in orders
+            ]
+        )
+
+    def run_batches(self, action, items, function, *args):
+        """
+        Send the items in batches. Returns (batch, Result) of each
+        """
+        batches = self.get_batches(items)
+
+        return zip(
+            batches, self.run([(action, function, batch) + args for batch in batches])
+        )
+
+    def log_latencies(self):
+        """
+        Log the count, average and slowest request time of each kind of action
+        """
+        actions = {}
+
+        for action, latency in self.latencies:
+            actions.setdefault(action, []).append(latency)
+
+        for action, latencies in sorted(actions.items()):
+            logger.info(
+                "{}: {} requests, {:.3f}s average, {:.3f}s slowest".format(
+                    action,
+                    len(latencies),
+                    sum(latencies) / len(latencies),
+                    max(latencies),
+                )
+            )
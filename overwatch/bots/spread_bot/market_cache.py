@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+"""
+Shared ccxt wrappers and exchange market metadata.
+Market metadata is the same for everyone using an exchange and can be megabytes to download,
+so it is kept in memory and on disk and only fetched again once it is older than the cache's max age.
+
+This module is packaged with the bot, which can't import the Django project,
+so overwatch.utils.exchange_clients imports the MarketCache from here rather than keeping its own.
+The bot caches markets in the MARKETS_CACHE_DIR environment variable (by default a directory in the
+system temp dir, which survives between warm Lambda invocations) for MARKETS_CACHE_SECONDS
+"""
+
+
+class MarketCache(object):
+    def __init__(self, cache_dir, max_age):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.markets = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def get_path(self, exchange):
+        return os.path.join(self.cache_dir, "{}.json".format(exchange))
+
+    def read(self, exchange):
+        """
+        Return (fetched time, markets) from disk, or None
+        """
+        path = self.get_path(exchange)
+
+        try:
+            with open(path) as markets_file:
+                return os.path.getmtime(path), json.load(markets_file)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, exchange, markets):
+        """
+        Write the markets to disk. The file is replaced in one step so readers never see half of it
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+
+            with os.fdopen(handle, "w") as markets_file:
+                json.dump(markets, markets_file)
+
+            os.replace(temp_path, self.get_path(exchange))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Failed caching {} markets: {}".format(exchange, e))
+
+    def get_markets(self, exchange, fetch_markets):
+        """
+        The markets of the exchange, as returned by fetch_markets().
+        Served from memory, then disk, and only fetched once both are older than max_age.
+        A stale copy is served if the exchange can't be reached
+        """
+        exchange = exchange.lower()
+
+        with self.lock:
+            lock = self.locks.setdefault(exchange, threading.Lock())
+
+        with lock:
+            cached = self.markets.get(exchange) or self.read(exchange)
+
+            if cached is not None and time.time() - cached[0] < self.max_age:
+                self.markets[exchange] = cached
+                return cached[1]
+
+            try:
+                markets = fetch_markets()
+            except ccxt.BaseError as e:
+                if cached is None:
+                    raise
+
+                logger.warning(
+                    "Failed refreshing {} markets, using the cached copy: {}".format(
+                        exchange, e
+                    )
+                )
+                return cached[1]
+
+            self.markets[exchange] = (time.time(), markets)
+            self.write(exchange, markets)
+
+            return markets
+
+
+market_cache = MarketCache(
+    os.environ.get(
+        "MARKETS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "spread_bot_markets")
+    ),
+    int(os.environ.get("MARKETS_CACHE_SECONDS", 6 * 60 * 60)),
+)
+
+_wrappers = {}
+_wrappers_lock = threading.Lock()
+
+
+def get_wrapper(exchange, api_key, secret):
+    """
+    Return the process wide ccxt wrapper of the exchange for the credentials, with the cached markets loaded
+    """
+    key = (exchange.lower(), api_key, secret)
+
+    with _wrappers_lock:
+        wrapper = _wrappers.get(key)
+
+        if wrapper is not None:
+            return wrapper
+
+        wrapper_class = getattr(ccxt, exchange.lower())
+        wrapper = wrapper_class(
+            {
+                "apiKey": api_key,
+                "secret": secret,
+                "nonce": ccxt.Exchange.milliseconds,
+                "enableRateLimit": True,
+            }
+        )
+        _wrappers[key] = wrapper
+
+    wrapper.set_markets(market_cache.get_markets(wrapper.id, wrapper.fetch_markets))
+
+    return wrapper
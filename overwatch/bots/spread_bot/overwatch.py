@@ -1,5 +1,7 @@
+import datetime
 import hashlib
 import hmac
+import json
 import logging
 import sys
 import time
@@ -9,12 +11,34 @@ import requests
 
 
 class Overwatch(object):
-    def __init__(self, api_secret, name, exchange):
+    url = "https://overwatch.crypto-daio.co.uk/bot"
+    # seconds to wait for Overwatch to answer a batch request and how many times to send it without an answer
+    batch_timeout = 30
+    batch_attempts = 2
+
+    # the endpoint each kind of data is sent to when not buffered
+    endpoints = {
+        "prices": "prices",
+        "balances": "balances",
+        "placed_orders": "placed_order",
+        "trades": "trades",
+    }
+
+    def __init__(self, api_secret, name, exchange, buffered=False):
         self.api_secret = api_secret
         self.name = name
         self.exchange = exchange
         self.logger = self.setup_logging()
 
+        # in buffered mode data is held until flush() sends it all in a single batch request
+        self.buffered = buffered
+        self.buffer = self.empty_buffer()
+
+        # the last config fetched and its ETag, which Overwatch answers 304 Not Modified to until it changes
+        self.config = None
+        self.config_etag = None
+        self.config_changed = False
+
     @staticmethod
     def setup_logging():
         logger = logging.getLogger()
@@ -63,94 +87,185 @@ class Overwatch(object):
         return response
 
     def get_config(self):
+        """
+        Fetch the bot config, or only check that it hasn't changed if it has been fetched before.
+        config_changed is set if the config returned is different to the last one
+        """
         nonce, generated_hash = self.generate_hash()
-        config = self.handle_response(
-            requests.get(
-                url="https://overwatch.crypto-daio.co.uk/bot/config",
-                params={
-                    "name": self.name,
-                    "exchange": self.exchange,
-                    "n": nonce,
-                    "h": generated_hash,
-                },
-            )
+        headers = {}
+
+        if self.config is not None and self.config_etag:
+            headers["If-None-Match"] = self.config_etag
+
+        r = requests.get(
+            url="{}/config".format(self.url),
+            params={
+                "name": self.name,
+                "exchange": self.exchange,
+                "n": nonce,
+                "h": generated_hash,
+            },
+            headers=headers,
         )
 
+        if r.status_code == requests.codes.not_modified and self.config is not None:
+            self.config_changed = False
+            return self.config
+
+        config = self.handle_response(r)
+
         if not config:
             self.logger.error(
                 "unable to get config for {}@{}".format(self.name, self.exchange)
             )
             return False
 
+        self.config_changed = config != self.config
+        self.config = config
+        self.config_etag = r.headers.get("ETag")
+
         return config
 
-    def record_placed_order(self, base, quote, order_type, price, amount):
+    def empty_buffer(self):
+        return {data_type: [] for data_type in self.endpoints}
+
+    def send(self, data_type, data):
+        """
+        Send the data to Overwatch, or hold it until the next flush when buffered
+        """
+        if self.buffered:
+            # Overwatch stores the data with the time it was recorded rather than when the batch arrives
+            data["time"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            self.buffer[data_type].append(data)
+            return
+
+        self.post(self.endpoints[data_type], data)
+
+    def post(self, endpoint, data):
         nonce, generated_hash = self.generate_hash()
-        self.handle_response(
-            requests.post(
-                url="https://overwatch.crypto-daio.co.uk/bot/placed_order",
-                data={
-                    "name": self.name,
-                    "exchange": self.exchange,
-                    "n": nonce,
-                    "h": generated_hash,
-                    "base": base,
-                    "quote": quote,
-                    "order_type": order_type,
-                    "price": price,
-                    "amount": amount,
-                },
+        data.update(
+            {
+                "name": self.name,
+                "exchange": self.exchange,
+                "n": nonce,
+                "h": generated_hash,
+            }
+        )
+        return self.handle_response(
+            requests.post(url="{}/{}".format(self.url, endpoint), data=data)
+        )
+
+    def post_batch(self, buffer):
+        """
+        Send the buffered data to the batch endpoint.
+        Returns the response, or None if Overwatch didn't answer
+        """
+        nonce, generated_hash = self.generate_hash()
+        batch = {
+            "name": self.name,
+            "exchange": self.exchange,
+            "n": nonce,
+            "h": generated_hash,
+        }
+        batch.update(buffer)
+
+        try:
+            return requests.post(
+                url="{}/batch".format(self.url),
+                data=json.dumps(batch),
+                headers={"Content-Type": "application/json"},
+                timeout=self.batch_timeout,
             )
+        except requests.RequestException as e:
+            self.logger.error("batch request to overwatch failed: {}".format(e))
+            return None
+
+    def flush(self):
+        """
+        Send everything that has been buffered in one request.
+        If the request fails without an answer the batch may still have been stored,
+        so it is sent again, as Overwatch skips the rows it already holds, and kept for the next flush if that fails.
+        If Overwatch rejects the batch none of it was stored, so the data is sent to the individual endpoints instead
+        """
+        buffer = self.buffer
+        self.buffer = self.empty_buffer()
+
+        if not any(buffer.values()):
+            return True
+
+        for attempt in range(self.batch_attempts):
+            r = self.post_batch(buffer)
+
+            if r is not None and r.status_code < 500:
+                break
+        else:
+            self.logger.warning("Batch may not have been stored. Keeping it to resend")
+
+            for data_type, rows in buffer.items():
+                self.buffer[data_type] = rows + self.buffer[data_type]
+
+            return False
+
+        response = self.handle_response(r)
+
+        if response:
+            self.logger.info("Sent batch to Overwatch: {}".format(response["created"]))
+            return True
+
+        self.logger.warning("Batch was rejected. Sending data individually")
+
+        for data_type, rows in buffer.items():
+            for data in rows:
+                self.post(self.endpoints[data_type], data)
+
+        return False
+
+    def record_placed_order(self, base, quote, order_type, price, amount):
+        self.send(
+            "placed_orders",
+            {
+                "base": base,
+                "quote": quote,
+                "order_type": order_type,
+                "price": price,
+                "amount": amount,
+            },
         )
 
     def record_price(
         self, price, bid_price, ask_price, market_price, base_price, quote_price
     ):
-        nonce, generated_hash = self.generate_hash()
-        self.handle_response(
-            requests.post(
-                url="https://overwatch.crypto-daio.co.uk/bot/prices",
-                data={
-                    "name": self.name,
-                    "exchange": self.exchange,
-                    "n": nonce,
-                    "h": generated_hash,
-                    "price": price,
-                    "bid_price": bid_price,
-                    "ask_price": ask_price,
-                    "market_price": market_price,
-                    "base_price": base_price,
-                    "quote_price": quote_price,
-                },
-            )
+        self.send(
+            "prices",
+            {
+                "price": price,
+                "bid_price": bid_price,
+                "ask_price": ask_price,
+                "market_price": market_price,
+                "base_price": base_price,
+                "quote_price": quote_price,
+            },
         )
 
     def record_balances(
         self, bid_available, ask_available, bid_on_order, ask_on_order, unit
     ):
-        nonce, generated_hash = self.generate_hash()
-        self.handle_response(
-            requests.post(
-                url="https://overwatch.crypto-daio.co.uk/bot/balances",
-                data={
-                    "name": self.name,
-                    "exchange": self.exchange,
-                    "n": nonce,
-                    "h": generated_hash,
-                    "unit": unit,
-                    "bid_available": bid_available,
-                    "ask_available": ask_available,
-                    "bid_on_order": bid_on_order,
-                    "ask_on_order": ask_on_order,
-                },
-            )
+        self.send(
+            "balances",
+            {
+                "unit": unit,
+                "bid_available": bid_available,
+                "ask_available": ask_available,
+                "bid_on_order": bid_on_order,
+                "ask_on_order": ask_on_order,
+            },
         )
 
     def get_last_trade_id(self):
         nonce, generated_hash = self.generate_hash()
         response = self.handle_response(
             requests.get(
-                url="https://overwatch.crypto-daio.co.uk/bot/trades",
+                url="{}/trades".format(self.url),
                 params={
                     "name": self.name,
                     "exchange": self.exchange,
@@ -162,22 +277,15 @@ class Overwatch(object):
         return response["trade_id"]
 
     def record_trade(self, time, id, type, price, amount, total, age):
-        nonce, generated_hash = self.generate_hash()
-        self.handle_response(
-            requests.post(
-                url="https://overwatch.crypto-daio.co.uk/bot/trades",
-                data={
-                    "name": self.name,
-                    "exchange": self.exchange,
-                    "n": nonce,
-                    "h": generated_hash,
-                    "trade_time": time,
-                    "trade_id": id,
-                    "trade_type": type,
-                    "price": price,
-                    "amount": amount,
-                    "total": total,
-                    "age": age,
-                },
-            )
+        self.send(
+            "trades",
+            {
+                "trade_time": time,
+                "trade_id": id,
+                "trade_type": type,
+                "price": price,
+                "amount": amount,
+                "total": total,
+                "age": age,
+            },
         )
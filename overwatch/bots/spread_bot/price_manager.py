@@ -1,24 +1,44 @@
+import time
+
 import requests
 
 
 class PriceManager(object):
-    def __init__(self):
+    def __init__(self, max_age=None):
+        # rates are fetched once and kept for max_age seconds, or for as long as the manager if it is None
+        self.max_age = max_age
         self.rates = {"USD": 1}
+        self.fetched = {}
+
+    def is_fresh(self, currency):
+        if currency not in self.rates:
+            return False
+
+        if self.max_age is None or currency not in self.fetched:
+            return True
+
+        return time.monotonic() - self.fetched[currency] < self.max_age
+
+    def set_rate(self, currency, rate):
+        self.rates[currency] = rate
+        self.fetched[currency] = time.monotonic()
 
     def get_aggregator_price(self, currency, url):
-        if currency.upper() in self.rates:
+        currency = currency.upper()
+
+        if self.is_fresh(currency):
             return
 
         r = requests.get(url="{}/{}".format(url, currency))
 
         if r.status_code != requests.codes.ok:
-            self.rates[currency] = None
+            self.set_rate(currency, None)
             return
 
         try:
             data = r.json()
         except ValueError:
-            self.rates[currency] = None
+            self.set_rate(currency, None)
             return
 
         moving_averages = data.get("moving_averages", {})
@@ -31,13 +51,13 @@ class PriceManager(object):
             avg_price = data.get("usd_price")
 
         if not avg_price:
-            self.rates[currency] = None
+            self.set_rate(currency, None)
             return
 
         try:
-            self.rates[currency] = float(avg_price)
+            self.set_rate(currency, float(avg_price))
         except ValueError:
-            self.rates[currency] = None
+            self.set_rate(currency, None)
         return
 
     def get_price(self, currency, url):
@@ -0,0 +1,236 @@
+import logging
+import math
+
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+"""
+A run of the bot works from one snapshot of its open orders and balances.
+The plan for each side is worked out from the snapshot alone, as the list of orders to cancel,
+orders to reset (cancel and place again at the current price) and new orders to place.
+The snapshot is then kept in step with the actions that succeed,
+so the balances reported at the end of the run don't need fetching again.
+
+Bots trading on one exchange account in the same process share an Account,
+which fetches the balances and open orders once a tick for all of them.
+Their snapshots share its free balances, so what one bot locks in orders is no longer available to the next.
+"""
+
+
+class Snapshot(object):
+    def __init__(self, orders, balances, base, quote, free=None):
+        self.orders = list(orders)
+        self.balances = balances
+        self.base = base
+        self.quote = quote
+        # the free balance of each currency, shared with the other snapshots of the account if given
+        self.free = {} if free is None else free
+
+        for currency in (base, quote):
+            if currency not in self.free:
+                self.free[currency] = self.get_balance(currency)
+
+    @classmethod
+    def fetch(cls, wrapper, symbol, base, quote):
+        """
+        Fetch the open orders of the symbol and the account balances, once
+        """
+        return cls(
+            wrapper.fetch_open_orders(symbol), wrapper.fetch_balance(), base, quote
+        )
+
+    def get_balance(self, currency):
+        for cur in self.balances:
+            if cur == currency.upper():
+                return self.balances.get(cur).get("free", 0.0) or 0.0
+
+        return 0.0
+
+    def get_orders(self, side):
+        return [order for order in self.orders if order.get("side") == side]
+
+    def get_free(self, currency):
+        return self.free.get(currency, 0.0)
+
+    def get_on_order(self, side):
+        return sum(order.get("amount") for order in self.get_orders(side))
+
+    def get_locked(self, side, price, amount):
+        """
+        The currency and amount of it an order locks: quote for a buy, base for a sell
+        """
+        if side == "buy":
+            return self.quote, amount * price
+
+        return self.base, amount
+
+    def cancelled(self, order):
+        self.orders = [o for o in self.orders if o.get("id") != order.get("id")]
+        currency, amount = self.get_locked(
+            order.get("side"), order.get("price"), order.get("amount")
+        )
+        self.free[currency] = self.free.get(currency, 0.0) + amount
+
+    def placed(self, order_id, side, price, amount):
+        self.orders.append(
+            {"id": order_id, "side": side, "price": price, "amount": amount}
+        )
+        currency, locked = self.get_locked(side, price, amount)
+        self.free[currency] = self.free.get(currency, 0.0) - locked
+
+
+class Account(object):
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+        self.symbols = []
+        self.balances = None
+        self.orders = None
+        self.free = {}
+        # set once the exchange has refused to list the open orders of every market at once
+        self.by_symbol = False
+
+    def start_tick(self, symbols):
+        """
+        Forget the last tick's balances and orders. They are fetched again when the first bot needs them
+        """
+        self.symbols = list(symbols)
+        self.balances = None
+        self.orders = None
+        self.free = {}
+
+    def fetch_orders(self):
+        """
+        The open orders of the account's symbols, by symbol.
+        Fetched in one request where the exchange allows it, otherwise one request per symbol
+        """
+        symbols = set(self.symbols)
+
+        if len(symbols) > 1 and not self.by_symbol:
+            try:
+                orders = {symbol: [] for symbol in symbols}
+
+                for order in self.wrapper.fetch_open_orders():
+                    orders.setdefault(order.get("symbol"), []).append(order)
+
+                return orders
+            except ccxt.ExchangeError as e:
+                logger.warning(
+                    "Failed fetching all open orders, fetching them by symbol: {}".format(
+                        e
+                    )
+                )
+                self.by_symbol = True
+
+        return {symbol: self.wrapper.fetch_open_orders(symbol) for symbol in symbols}
+
+    def get_snapshot(self, symbol, base, quote):
+        """
+        The snapshot of one bot's market, from the balances and orders fetched for the tick
+        """
+        if self.balances is None:
+            self.balances = self.wrapper.fetch_balance()
+
+        if self.orders is None:
+            self.orders = self.fetch_orders()
+
+        if symbol not in self.orders:
+            # the bot's market changed since the tick started
+            self.orders[symbol] = self.wrapper.fetch_open_orders(symbol)
+
+        return Snapshot(self.orders[symbol], self.balances, base, quote, self.free)
+
+
+class SidePlan(object):
+    def __init__(self, side):
+        self.side = side
+        # orders to cancel, as (order, reason)
+        self.cancels = []
+        # orders to cancel and place again, as (order, new price, new amount)
+        self.resets = []
+        # new orders, as (price, amount)
+        self.places = []
+        # (target, total, available) if the funds can't reach the target
+        self.shortfall = None
+
+
+def get_released(side, order, price):
+    """
+    The base amount cancelling the order makes available to the side at price
+    """
+    if side == "buy":
+        return order.get("amount") * order.get("price") / price
+
+    return order.get("amount")
+
+
+def plan_side(snapshot, side, price, target, step, tolerance, jitter):
+    """
+    Plan the orders of one side of the book, the same steps the bot always took:
+    1. cancel orders priced through the side price,
+    2. cancel the orders furthest from the price while the side is more than one order over target,
+    3. reset orders priced further from the side price than the tolerance,
+    4. place orders of step until the target is reached, or the available balance runs out.
+    Amounts are in base currency. jitter(price, side) gives the price to place each order at
+    """
+    plan = SidePlan(side)
+    currency = snapshot.quote if side == "buy" else snapshot.base
+    available = snapshot.get_free(currency)
+
+    if side == "buy":
+        # the balance is in quote currency, the plan needs it in base
+        available = available / price
+
+    kept = []
+
+    for order in snapshot.get_orders(side):
+        if side == "buy":
+            cancel = float(order["price"]) > price
+        else:
+            cancel = float(order["price"]) < price
+
+        if cancel:
+            plan.cancels.append((order, "price"))
+            available += get_released(side, order, price)
+        else:
+            kept.append(order)
+
+    total = sum(order.get("amount") for order in kept)
+
+    if step > 0 and total > target + step:
+        number = math.floor((total - target - step) / step)
+        # the orders furthest from the price go first
+        furthest = sorted(kept, key=lambda x: x["price"], reverse=(side == "sell"))
+
+        for order in furthest[:number]:
+            plan.cancels.append((order, "target"))
+            available += get_released(side, order, price)
+            kept.remove(order)
+            total -= order.get("amount")
+
+    for order in kept:
+        order_tolerance = (
+            max(order.get("price"), price) - min(order.get("price"), price)
+        ) / price
+
+        if order_tolerance > tolerance:
+            plan.resets.append((order, jitter(price, side), step))
+            available += get_released(side, order, price) - step
+            total += step - order.get("amount")
+
+    if total < target:
+        difference = target - total
+
+        if available < difference:
+            plan.shortfall = (target, total, available)
+            difference = available
+
+        if available < step:
+            # setting step to balance exactly can cause api errors
+            step = available * 0.9
+
+        if step > 0 and difference > 0:
+            for x in range(math.ceil(difference / step)):
+                plan.places.append((jitter(price, side), step))
+
+    return plan
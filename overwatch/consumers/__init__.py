@@ -3,10 +3,14 @@ from .bot import BotConsumer
 from .bot_deploy import BotDeployConsumer
 from .bot_form import BotFormConsumer
 from .bot_list import BotListConsumer
-from .bot_price import BotPriceConsumer
-from .bot_balance import BotBalanceConsumer
-from .bot_order import BotOrderConsumer
-from .bot_trade import BotTradeConsumer
+from .bot_price import BotPriceConsumer, AsyncBotPriceConsumer
+from .bot_balance import BotBalanceConsumer, AsyncBotBalanceConsumer
+from .bot_order import BotOrderConsumer, AsyncBotOrderConsumer
+from .bot_trade import BotTradeConsumer, AsyncBotTradeConsumer
+from .valuation import BotValuationConsumer
+from .bot_updates import BotUpdateConsumer
+from .exchange_balances import ExchangeBalancesConsumer
+from .retention import RetentionConsumer
 
 __all__ = [
     "CloudWatchLogsConsumer",
@@ -15,7 +19,15 @@ __all__ = [
     "BotFormConsumer",
     "BotListConsumer",
     "BotPriceConsumer",
+    "AsyncBotPriceConsumer",
     "BotBalanceConsumer",
+    "AsyncBotBalanceConsumer",
     "BotOrderConsumer",
+    "AsyncBotOrderConsumer",
     "BotTradeConsumer",
+    "AsyncBotTradeConsumer",
+    "BotValuationConsumer",
+    "BotUpdateConsumer",
+    "ExchangeBalancesConsumer",
+    "RetentionConsumer",
 ]
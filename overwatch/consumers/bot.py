@@ -3,13 +3,122 @@ import json
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import JsonWebsocketConsumer
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.template.loader import render_to_string
 
 from overwatch.models import Bot
+from overwatch.utils import bot_updates
+
+
+"""
+The bot_detail page is kept up to date with deltas.
+Each message carries the data version it was drawn from (see BotLatestState)
+and each connection remembers what it has sent, so only messages with a new version are sent
+and only with the fields that changed.
+Heartbeats carry their time and only those newer than the page already shows are sent, to be prepended.
+When the page (re)connects it sends a "sync" message with the versions and heartbeat time it holds
+"""
+
+
+def get_heart_beats_messages(bot):
+    # the latest heartbeats, oldest first so the page can prepend them in turn
+    return [
+        {
+            "message_type": "heartbeat",
+            "time": heartbeat.time.isoformat(),
+            "heartbeat": render_to_string(
+                "overwatch/fragments/heartbeat.html", {"heartbeat": heartbeat},
+            ),
+        }
+        for heartbeat in sorted(
+            bot.botheartbeat_set.all()[: settings.HEARTBEAT_HISTORY],
+            key=lambda x: x.time,
+        )
+    ]
+
+
+def get_price_info_messages(bot):
+    return [
+        {
+            "message_type": "price_info",
+            "version": bot.state.prices_version,
+            "price_peg": bot.rendered_price(usd=True),
+            "price": bot.rendered_price(usd=False),
+            "price_sparkline": bot.price_sparkline(),
+            "bid_price_peg": bot.rendered_bid_price(usd=True),
+            "bid_price": bot.rendered_bid_price(usd=False),
+            "ask_price_peg": bot.rendered_ask_price(usd=True),
+            "ask_price": bot.rendered_ask_price(usd=False),
+        }
+    ]
+
+
+def get_balance_info_messages(bot):
+    return [
+        {
+            "message_type": "balance_info",
+            "version": bot.state.balances_version,
+            "bid_balance_peg": "{} / {}".format(
+                bot.rendered_bid_balance(on_order=True, usd=True),
+                bot.rendered_bid_balance(on_order=False, usd=True),
+            ),
+            "bid_balance": "({} / {})".format(
+                bot.rendered_bid_balance(on_order=True, usd=False),
+                bot.rendered_bid_balance(on_order=False, usd=False),
+            ),
+            "ask_balance_peg": "{} / {}".format(
+                bot.rendered_ask_balance(on_order=True, usd=True),
+                bot.rendered_ask_balance(on_order=False, usd=True),
+            ),
+            "ask_balance": "({} / {})".format(
+                bot.rendered_ask_balance(on_order=True, usd=False),
+                bot.rendered_ask_balance(on_order=False, usd=False),
+            ),
+        },
+        {
+            "message_type": "balances_chart",
+            "version": bot.state.balances_version,
+            "chart": '<embed type="image/svg+xml" src="{}" />'.format(
+                bot.get_balances_chart()
+            ),
+        },
+    ]
+
+
+def get_placed_orders_messages(bot, hours=48):
+    return [
+        # this just redraws the datatable
+        {"message_type": "placed_order", "version": bot.state.placed_orders_version},
+        {
+            "message_type": "placed_order_chart",
+            "version": bot.state.placed_orders_version,
+            "chart": '<embed type="image/svg+xml" src="{}"/>'.format(
+                bot.get_placed_orders_chart(hours=hours)
+            ),
+        },
+    ]
+
+
+def get_trades_messages(bot, days=None):
+    return [
+        # this just redraws the datatable
+        {"message_type": "trade", "version": bot.state.trades_version},
+        {
+            "message_type": "trades_chart",
+            "version": bot.state.trades_version,
+            "chart": '<embed type="image/svg+xml" src="{}" />'.format(
+                bot.get_trades_chart(days=days)
+            ),
+        },
+    ]
 
 
 class BotConsumer(JsonWebsocketConsumer):
     bot = None
+    # the fields of each message type last sent to the page
+    sent = None
+    # the time of the latest heartbeat on the page
+    heartbeat_time = None
 
     def connect(self):
         """
@@ -17,7 +126,9 @@ class BotConsumer(JsonWebsocketConsumer):
         """
         # get the bot from the websocket url
         try:
-            self.bot = Bot.objects.get(pk=self.scope["url_route"]["kwargs"]["pk"])
+            self.bot = Bot.objects.with_state().get(
+                pk=self.scope["url_route"]["kwargs"]["pk"]
+            )
         except Bot.DoesNotExist:
             self.close()
             return
@@ -32,18 +143,14 @@ class BotConsumer(JsonWebsocketConsumer):
         async_to_sync(self.channel_layer.group_add)(
             "cloudwatch_logs_{}".format(self.bot.pk), self.channel_name
         )
+        bot_updates.watch("bot_{}".format(self.bot.pk), self.channel_name)
+
+        self.sent = {}
 
-        # clear the bot data
-        self.clear({})
         # clear the log data
         self.logs_clear({})
 
-        # get the bot price and order data
-        self.get_heart_beats({})
-        self.get_price_info({})
-        self.get_balance_info({})
-        self.get_placed_orders({})
-        self.get_trades({})
+        # the bot data is sent once the page has sent what it already holds
 
         # get the latest cloudwatch logs
         async_to_sync(get_channel_layer().send)(
@@ -60,6 +167,7 @@ class BotConsumer(JsonWebsocketConsumer):
         async_to_sync(self.channel_layer.group_discard)(
             "cloudwatch_logs_{}".format(self.bot.pk), self.channel_name
         )
+        bot_updates.watch("bot_{}".format(self.bot.pk), self.channel_name, False)
         self.close()
 
     def receive_json(self, content, **kwargs):
@@ -75,11 +183,57 @@ class BotConsumer(JsonWebsocketConsumer):
                 "bot-deploy", {"type": "update", "bot_pk": content.get("bot")},
             )
 
-    def clear(self, event):
+        if message_type == "sync":
+            self.sync(content)
+
+    def sync(self, content):
+        """
+        Send the bot data the page doesn't hold yet.
+        content has the version of each message type and the time of the latest heartbeat the page holds
+        """
+        for message_type, version in (content.get("versions") or {}).items():
+            self.sent[message_type] = {"version": version}
+
+        self.heartbeat_time = content.get("heartbeat")
+
+        self.get_heart_beats({})
+        self.get_price_info({})
+        self.get_balance_info({})
+        self.get_placed_orders({})
+        self.get_trades({})
+
+    def send_messages(self, messages):
         """
-        Instruct the javascript on the bot_detail page to clear the bot data holders
+        Send the parts of the messages the page doesn't hold yet
         """
-        self.send(json.dumps({"message_type": "bot_clear"}))
+        for message in messages:
+            message_type = message["message_type"]
+
+            if message_type == "heartbeat":
+                if (
+                    self.heartbeat_time is not None
+                    and message["time"] <= self.heartbeat_time
+                ):
+                    continue
+
+                self.heartbeat_time = message["time"]
+                self.send(json.dumps(message))
+                continue
+
+            sent = self.sent.get(message_type)
+
+            if sent is not None and sent.get("version") == message.get("version"):
+                continue
+
+            delta = {
+                key: value
+                for key, value in message.items()
+                if sent is None or key not in sent or sent[key] != value
+            }
+            self.sent[message_type] = dict(sent or {}, **delta)
+
+            delta["message_type"] = message_type
+            self.send(json.dumps(delta))
 
     def logs_clear(self, event):
         """
@@ -89,83 +243,34 @@ class BotConsumer(JsonWebsocketConsumer):
 
     def get_heart_beats(self, event):
         """
-        Send the 15 latest heartbeats to the front end
+        Send the latest heartbeats to the front end
         """
-        # clear the heartbeat container
-        self.send(json.dumps({"message_type": "heartbeat_clear"}))
-
-        # get the latest 15 heartbeats and send them to the javascript on the bot_detail page
-        for heartbeat in sorted(
-            self.bot.botheartbeat_set.all()[:15], key=lambda x: x.time
-        ):
-            self.send(
-                json.dumps(
-                    {
-                        "message_type": "heartbeat",
-                        "heartbeat": render_to_string(
-                            "overwatch/fragments/heartbeat.html",
-                            {"heartbeat": heartbeat},
-                        ),
-                    }
-                )
-            )
+        self.send_messages(get_heart_beats_messages(self.bot))
 
     def get_price_info(self, event):
         """
         calculate latest price info and send to front end
         """
-        self.send(
-            json.dumps(
-                {
-                    "message_type": "price_info",
-                    "price_peg": self.bot.rendered_price(usd=True),
-                    "price": self.bot.rendered_price(usd=False),
-                    "price_sparkline": self.bot.price_sparkline(),
-                    "bid_price_peg": self.bot.rendered_bid_price(usd=True),
-                    "bid_price": self.bot.rendered_bid_price(usd=False),
-                    "ask_price_peg": self.bot.rendered_ask_price(usd=True),
-                    "ask_price": self.bot.rendered_ask_price(usd=False),
-                }
-            )
-        )
+        self.bot.refresh_state()
+
+        self.send_messages(get_price_info_messages(self.bot))
 
     def get_balance_info(self, event):
         """
         get the latest balance info and send it to the front end
         """
-        self.send(
-            json.dumps(
-                {
-                    "message_type": "balance_info",
-                    "bid_balance_peg": "{} / {}".format(
-                        self.bot.rendered_bid_balance(on_order=True, usd=True),
-                        self.bot.rendered_bid_balance(on_order=False, usd=True),
-                    ),
-                    "bid_balance": "({} / {})".format(
-                        self.bot.rendered_bid_balance(on_order=True, usd=False),
-                        self.bot.rendered_bid_balance(on_order=False, usd=False),
-                    ),
-                    "ask_balance_peg": "{} / {}".format(
-                        self.bot.rendered_ask_balance(on_order=True, usd=True),
-                        self.bot.rendered_ask_balance(on_order=False, usd=True),
-                    ),
-                    "ask_balance": "({} / {})".format(
-                        self.bot.rendered_ask_balance(on_order=True, usd=False),
-                        self.bot.rendered_ask_balance(on_order=False, usd=False),
-                    ),
-                }
-            )
-        )
-        self.send(
-            json.dumps(
-                {
-                    "message_type": "balances_chart",
-                    "chart": '<embed type="image/svg+xml" src="{}" />'.format(
-                        self.bot.get_balances_chart()
-                    ),
-                }
-            )
-        )
+        self.bot.refresh_state()
+
+        self.send_messages(get_balance_info_messages(self.bot))
+
+    def send_rendered(self, event):
+        """
+        send messages rendered once for every viewer by the BotUpdateConsumer
+        """
+        if event.get("probe"):
+            bot_updates.watch("bot_{}".format(self.bot.pk), self.channel_name)
+
+        self.send_messages(event["messages"])
 
     def send_log_line(self, event):
         """
@@ -199,37 +304,26 @@ class BotConsumer(JsonWebsocketConsumer):
         """
         send placed_order table entries or the data url containing the placed_orders_chart to the front end
         """
-        # this send just redraws the datatable
-        self.send(json.dumps({"message_type": "placed_order",}))
-        # this send pushes the chart data url
-        self.send(
-            json.dumps(
-                {
-                    "message_type": "placed_order_chart",
-                    "chart": '<embed type="image/svg+xml" src="{}"/>'.format(
-                        self.bot.get_placed_orders_chart(hours=event.get("hours", 48))
-                    ),
-                }
-            )
+        self.bot.refresh_state()
+
+        if "hours" in event:
+            # a chart of a different period, so the page doesn't hold it whatever its version
+            self.sent.pop("placed_order_chart", None)
+
+        self.send_messages(
+            get_placed_orders_messages(self.bot, hours=event.get("hours", 48))
         )
 
     def get_trades(self, event):
         """
         send trade table entries or the data url containing the trades_chart to the front end
         """
-        # this send just redraws the datatable
-        self.send(json.dumps({"message_type": "trade",}))
-        # this send pushes the chart data url
-        self.send(
-            json.dumps(
-                {
-                    "message_type": "trades_chart",
-                    "chart": '<embed type="image/svg+xml" src="{}" />'.format(
-                        self.bot.get_trades_chart(days=event.get("days"))
-                    ),
-                }
-            )
-        )
+        self.bot.refresh_state()
+
+        if "days" in event:
+            self.sent.pop("trades_chart", None)
+
+        self.send_messages(get_trades_messages(self.bot, days=event.get("days")))
 
     def get_errors(self, event):
         """
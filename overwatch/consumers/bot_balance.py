@@ -2,8 +2,9 @@ import logging
 
 from channels.consumer import SyncConsumer
 
-from overwatch.models import BotBalance, BotPrice
-from overwatch.utils.price_aggregator import get_price_data
+from overwatch.models import BotBalance
+from overwatch.utils.valuation import drain_pending
+from overwatch.consumers.valuation import AsyncValuationConsumer
 
 logger = logging.getLogger(__name__)
 
@@ -13,86 +14,20 @@ class BotBalanceConsumer(SyncConsumer):
     def calculate_usd_values(message):
         """
         This method is called when a bot_balance is saved.
-        It fetches the price closest to the time recorded for the bot_balance and updates the bot_balance instance
+        It values the pending bot_balances in batches, fetching each distinct aggregator price only once per batch
         """
         logger.info(
-            "Trying to get usd values for BotBalance {}".format(
+            "Valuing pending BotBalances for BotBalance {}".format(
                 message.get("bot_balance")
             )
         )
 
-        try:
-            bot_balance = BotBalance.objects.get(pk=message.get("bot_balance"))
-        except BotBalance.DoesNotExist:
-            logger.error("No BotBalance object found")
-            return
+        drain_pending(BotBalance)
 
-        if bot_balance.updated:
-            logger.warning("BotBalance already updated")
-            return
 
-        logger.info(
-            "Getting usd values for BotBalance: {} {}".format(
-                bot_balance.pk, bot_balance
-            )
-        )
-
-        # get the spot price at the time closest to the botbalance
-        quote_price_data = get_price_data(
-            bot_balance.bot.quote_price_url, bot_balance.bot.quote, bot_balance.time
-        )
-
-        if quote_price_data is None:
-            logger.error("No Quote Price Data")
-            return
-
-        quote_price_30_ma = quote_price_data.get("moving_averages", {}).get("30_minute")
-
-        if quote_price_30_ma is None:
-            logger.error("No 30 min MA found")
-            return
-
-        base_price_data = get_price_data(
-            bot_balance.bot.base_price_url, bot_balance.bot.base, bot_balance.time
-        )
-
-        if base_price_data is None:
-            logger.error("No Quote Price Data")
-            return
-
-        base_price_30_ma = base_price_data.get("moving_averages", {}).get("30_minute")
-
-        if base_price_30_ma is None:
-            logger.error("No 30 min MA found")
-            return
-
-        if bot_balance.bid_available is not None:
-            bot_balance.bid_available_usd = (
-                bot_balance.bid_available * quote_price_30_ma
-            )
-
-        if bot_balance.bid_available is not None:
-            nearest_price = BotPrice.objects.get_closest_to(
-                bot_balance.bot, bot_balance.time
-            )
-
-            if nearest_price:
-                bot_balance.bid_available_as_base = (
-                    bot_balance.bid_available / nearest_price.price
-                )
-
-        if bot_balance.bid_on_order is not None:
-            # bid_balance_on_order will be denominated in the 'base' currency
-            bot_balance.bid_on_order_usd = bot_balance.bid_on_order * base_price_30_ma
-
-        if bot_balance.ask_available is not None:
-            bot_balance.ask_available_usd = bot_balance.ask_available * base_price_30_ma
-
-        if bot_balance.ask_on_order is not None:
-            bot_balance.ask_on_order_usd = bot_balance.ask_on_order * base_price_30_ma
-
-        bot_balance.updated = True
-
-        bot_balance.save()
+class AsyncBotBalanceConsumer(AsyncValuationConsumer):
+    """
+    asyncio variant of the consumer above. Enable it for the channel with ASYNC_VALUATION_CHANNELS
+    """
 
-        logger.info("updated bot_balance")
+    model = BotBalance
@@ -1,8 +1,8 @@
-import ccxt
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import JsonWebsocketConsumer
 
 from overwatch.models import Bot, Exchange
+from overwatch.utils.exchange_clients import get_markets
 
 
 class BotFormConsumer(JsonWebsocketConsumer):
@@ -49,18 +49,16 @@ class BotFormConsumer(JsonWebsocketConsumer):
                 return
 
             try:
-                exchange = getattr(ccxt, exchange_account.exchange.lower())()
+                markets = get_markets(exchange_account.exchange)
             except Exception as e:
                 print("Bad stuff: {}".format(e))
                 return
 
-            exchange.load_markets()
-
             # first, clear the existing markets
             self.send_json({"message_type": "clear_markets"})
 
             # then send the available markets
-            for market in exchange.symbols:
+            for market in sorted(market["symbol"] for market in markets):
                 self.send_json({"message_type": "new_market", "text": market})
 
             # finally we send the selected market if there is one
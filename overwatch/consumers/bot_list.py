@@ -1,22 +1,41 @@
+import datetime
 import itertools
 from functools import reduce
 
-import ccxt
 import pygal
 from asgiref.sync import async_to_sync
 from channels.generic.websocket import JsonWebsocketConsumer
 from channels.layers import get_channel_layer
-from django.template import Template, Context
 from django.template.loader import render_to_string
+from django.utils.timezone import now
 from pygal.style import CleanStyle
 
-from overwatch.models import Bot, Exchange
+from overwatch.models import Bot, BotProfitRollup, Exchange
+from overwatch.utils import bot_updates
+from overwatch.utils.templates import render_fragment
+
+
+def get_bot_data_message(bot):
+    return {
+        "message_type": "data_update",
+        "bot": bot.pk,
+        "activity": render_fragment(
+            "{{ heartbeat | timesince }}", {"heartbeat": bot.latest_heartbeat}
+        ),
+        "price": bot.rendered_price(usd=False),
+        "price_usd": bot.rendered_price(usd=True),
+        "market_price": bot.rendered_market_price(usd=True),
+        "ask_balance": bot.rendered_ask_balance(on_order=True),
+        "bid_balance": bot.rendered_bid_balance(on_order=True),
+        "profit": bot.rendered_profit(),
+    }
 
 
 class BotListConsumer(JsonWebsocketConsumer):
     def connect(self):
         self.accept()
         async_to_sync(self.channel_layer.group_add)("bot_list", self.channel_name)
+        bot_updates.watch(bot_updates.BOT_LIST, self.channel_name)
         self.user = self.scope["user"]
 
         self.update_days(1)
@@ -24,7 +43,11 @@ class BotListConsumer(JsonWebsocketConsumer):
 
         self.get_bots_data()
 
+        self.send_balances()
+
     def disconnect(self, code):
+        async_to_sync(self.channel_layer.group_discard)("bot_list", self.channel_name)
+        bot_updates.watch(bot_updates.BOT_LIST, self.channel_name, False)
         self.close()
 
     def get_bots_data(self):
@@ -33,25 +56,21 @@ class BotListConsumer(JsonWebsocketConsumer):
 
     def send_bot_data(self, event):
         try:
-            bot = Bot.objects.get(pk=event["bot"])
+            bot = Bot.objects.with_state().get(pk=event["bot"])
         except Bot.DoesNotExist:
             return
 
-        self.send_json(
-            {
-                "message_type": "data_update",
-                "bot": bot.pk,
-                "activity": Template("{{ heartbeat | timesince }}").render(
-                    Context({"heartbeat": bot.latest_heartbeat})
-                ),
-                "price": bot.rendered_price(usd=False),
-                "price_usd": bot.rendered_price(usd=True),
-                "market_price": bot.rendered_market_price(usd=True),
-                "ask_balance": bot.rendered_ask_balance(on_order=True),
-                "bid_balance": bot.rendered_bid_balance(on_order=True),
-                "profit": bot.rendered_profit(),
-            }
-        )
+        self.send_json(get_bot_data_message(bot))
+
+    def send_rendered(self, event):
+        """
+        send messages rendered once for every viewer by the BotUpdateConsumer
+        """
+        if event.get("probe"):
+            bot_updates.watch(bot_updates.BOT_LIST, self.channel_name)
+
+        for message in event["messages"]:
+            self.send(message)
 
     def send_profits_chart(self):
         """
@@ -91,42 +110,10 @@ class BotListConsumer(JsonWebsocketConsumer):
             lambda a, b: a + b, [e.total_profit(days) for e in exchange_accounts]
         )
 
-        balances = {}
-
-        for exchange_account in exchange_accounts:
-            if exchange_account.exchange not in balances:
-                balances[exchange_account.identifier] = {}
-
-            for bot in exchange_account.bot_set.all():
-                print(exchange_account, bot)
-                balances[exchange_account.identifier][bot.base.upper()] = {
-                    "on_order": 0,
-                    "available": 0,
-                }
-                balances[exchange_account.identifier][bot.quote.upper()] = {
-                    "on_order": 0,
-                    "available": 0,
-                }
-
-            wrapper_class = getattr(ccxt, exchange_account.exchange.lower())
-            wrapper = wrapper_class(
-                {
-                    "apiKey": exchange_account.key,
-                    "secret": exchange_account.secret,
-                    "nonce": ccxt.Exchange.milliseconds,
-                }
-            )
-
-            exchange_balances = wrapper.fetchBalance()
-
-            for cur in exchange_balances:
-                if cur in set(balances[exchange_account.identifier].keys()):
-                    balances[exchange_account.identifier][cur][
-                        "on_order"
-                    ] += exchange_balances[cur]["used"]
-                    balances[exchange_account.identifier][cur][
-                        "available"
-                    ] += exchange_balances[cur]["free"]
+        # one grouped query for the profit of every bot rather than two per bot
+        bot_profits = BotProfitRollup.objects.get_profits_by_bot(
+            now() - datetime.timedelta(days=days), bot__owner=self.user
+        )
 
         self.send_json(
             {
@@ -139,21 +126,39 @@ class BotListConsumer(JsonWebsocketConsumer):
                 "contributing_bots": [
                     render_to_string(
                         "overwatch/fragments/bot_list/contributing_bot.html",
-                        {"bot": bot, "days": days},
+                        {"bot": bot, "days": days, "profit": bot_profits[bot.pk]},
                     )
                     for bot in sorted(
-                        list(Bot.objects.filter(owner=self.user)),
-                        key=lambda x: x.profit(days),
+                        Bot.objects.filter(pk__in=bot_profits).select_related(
+                            "exchange_account"
+                        ),
+                        key=lambda x: bot_profits[x.pk],
                         reverse=True,
                     )
-                    if bot.profit(days) != 0.0
+                    if bot_profits[bot.pk] != 0.0
                 ],
-                "balances": render_to_string(
-                    "overwatch/fragments/bot_list/funds.html", {"balances": balances}
-                ),
             }
         )
 
+    def send_balances(self):
+        """
+        Ask a worker to send the balances of the user's exchange accounts, as they can take a while to fetch
+        """
+        async_to_sync(get_channel_layer().send)(
+            "exchange-balances",
+            {
+                "type": "send.balances",
+                "user": self.user.pk,
+                "channel": self.channel_name,
+            },
+        )
+
+    def send_funds(self, event):
+        """
+        send the balances rendered by the ExchangeBalancesConsumer
+        """
+        self.send_json(event["message"])
+
     def receive_json(self, content, **kwargs):
         message_type = content.get("message_type")
 
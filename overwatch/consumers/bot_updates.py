@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from overwatch.consumers.bot import (
+    get_balance_info_messages,
+    get_heart_beats_messages,
+    get_price_info_messages,
+)
+from overwatch.consumers.bot_list import get_bot_data_message
+from overwatch.models import Bot
+from overwatch.utils.bot_updates import (
+    BALANCE_INFO,
+    BOT_LIST,
+    HEART_BEATS,
+    PRICE_INFO,
+)
+
+logger = logging.getLogger(__name__)
+
+BOT_PAGE_MESSAGES = {
+    HEART_BEATS: get_heart_beats_messages,
+    PRICE_INFO: get_price_info_messages,
+    BALANCE_INFO: get_balance_info_messages,
+}
+
+
+def get_group(bot_pk, update):
+    """
+    The websocket group an update of the bot is sent to
+    """
+    return BOT_LIST if update == BOT_LIST else "bot_{}".format(bot_pk)
+
+
+def render_updates(bot_pk, updates):
+    """
+    Render the updates of the bot as {group: [messages]}.
+    The bot list messages are serialized once for every page.
+    The bot page messages are left as dicts as each BotConsumer sends its page only the fields that changed
+    """
+    try:
+        bot = Bot.objects.with_state().get(pk=bot_pk)
+    except Bot.DoesNotExist:
+        return {}
+
+    rendered = {}
+
+    if BOT_LIST in updates:
+        rendered[BOT_LIST] = [json.dumps(get_bot_data_message(bot))]
+
+    bot_page_messages = []
+
+    for update, get_messages in BOT_PAGE_MESSAGES.items():
+        if update in updates:
+            bot_page_messages += get_messages(bot)
+
+    if bot_page_messages:
+        rendered["bot_{}".format(bot.pk)] = bot_page_messages
+
+    return rendered
+
+
+class BotUpdateConsumer(AsyncConsumer):
+    """
+    Merges the changes announced for each bot within BOT_UPDATE_COALESCE_SECONDS.
+    Each update is then rendered once and the same messages are sent to every websocket in the group,
+    however many changes were announced and however many pages are open.
+    Updates for groups no websocket is watching are dropped
+    """
+
+    def __init__(self, scope):
+        super().__init__(scope)
+        self.pending = {}
+        self.flush_task = None
+        # the websocket channels in each group, for the groups that have been heard from
+        self.viewers = {}
+
+    async def bot_watched(self, message):
+        viewers = self.viewers.setdefault(message["group"], set())
+
+        if message["watching"]:
+            viewers.add(message["channel"])
+        else:
+            viewers.discard(message["channel"])
+
+    def is_watched(self, group):
+        # a group that hasn't been heard from might have viewers
+        return group not in self.viewers or bool(self.viewers[group])
+
+    async def bot_changed(self, message):
+        self.pending.setdefault(message["bot_pk"], set()).update(message["updates"])
+
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        # changes announced while a flush is rendering are flushed in turn
+        while self.pending:
+            await asyncio.sleep(settings.BOT_UPDATE_COALESCE_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+
+        for bot_pk, updates in pending.items():
+            updates = {
+                update
+                for update in updates
+                if self.is_watched(get_group(bot_pk, update))
+            }
+
+            if not updates:
+                continue
+
+            try:
+                rendered = await database_sync_to_async(render_updates)(bot_pk, updates)
+            except Exception as e:
+                logger.exception(
+                    "Failed rendering updates for Bot {}: {}".format(bot_pk, e)
+                )
+                continue
+
+            for group, messages in rendered.items():
+                await self.channel_layer.group_send(
+                    group,
+                    {
+                        "type": "send.rendered",
+                        "messages": messages,
+                        # ask the websockets of a group that hasn't been heard from to say they are watching
+                        "probe": group not in self.viewers,
+                    },
+                )
+                self.viewers.setdefault(group, set())
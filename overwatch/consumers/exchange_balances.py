@@ -0,0 +1,66 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.consumer import SyncConsumer
+from django.template.loader import render_to_string
+
+from overwatch.models import Bot, Exchange
+from overwatch.utils.exchange_clients import iter_balances
+
+logger = logging.getLogger(__name__)
+
+
+def get_funds_message(balances):
+    return {
+        "message_type": "balances",
+        "balances": render_to_string(
+            "overwatch/fragments/bot_list/funds.html", {"balances": balances}
+        ),
+    }
+
+
+class ExchangeBalancesConsumer(SyncConsumer):
+    """
+    Fetches exchange balances for the bot list page in a worker,
+    so the websocket consumer isn't held up waiting on the exchanges
+    """
+
+    def send_balances(self, message):
+        """
+        Send the balances of the currencies the bots trade on each exchange account of the user
+        to the websocket channel. The exchanges are asked concurrently and the balances are sent again
+        as each one answers
+        """
+        exchange_accounts = list(Exchange.objects.filter(owner_id=message["user"]))
+        balances = {
+            exchange_account.identifier: {} for exchange_account in exchange_accounts
+        }
+
+        for bot in Bot.objects.filter(
+            exchange_account__in=exchange_accounts
+        ).select_related("exchange_account"):
+            for currency in [bot.base.upper(), bot.quote.upper()]:
+                balances[bot.exchange_account.identifier][currency] = {
+                    "on_order": 0,
+                    "available": 0,
+                }
+
+        self.send_funds(message["channel"], balances)
+
+        for exchange_account, exchange_balances in iter_balances(exchange_accounts):
+            if not exchange_balances:
+                continue
+
+            currencies = balances[exchange_account.identifier]
+
+            for cur in currencies:
+                if cur in exchange_balances:
+                    currencies[cur]["on_order"] += exchange_balances[cur]["used"]
+                    currencies[cur]["available"] += exchange_balances[cur]["free"]
+
+            self.send_funds(message["channel"], balances)
+
+    def send_funds(self, channel, balances):
+        async_to_sync(self.channel_layer.send)(
+            channel, {"type": "send.funds", "message": get_funds_message(balances)}
+        )
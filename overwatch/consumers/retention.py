@@ -0,0 +1,32 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.consumer import SyncConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from overwatch.utils.retention import apply_retention
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionConsumer(SyncConsumer):
+    def apply_retention(self, message):
+        """
+        Remove up to RETENTION_MAX_BATCHES batches of each table's expired telemetry.
+        If there is more, the run queues itself again so other messages on the channel aren't held up
+        """
+        removed, done = apply_retention(max_batches=settings.RETENTION_MAX_BATCHES)
+
+        logger.info(
+            "Removed expired telemetry: {}".format(
+                ", ".join(
+                    "{} {}".format(count, table) for table, count in removed.items()
+                )
+            )
+        )
+
+        if not done:
+            async_to_sync(get_channel_layer().send)(
+                "bot-retention", {"type": "apply.retention"}
+            )
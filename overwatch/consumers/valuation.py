@@ -0,0 +1,62 @@
+import asyncio
+import logging
+
+from channels.consumer import AsyncConsumer, SyncConsumer
+
+from overwatch.models import Bot
+from overwatch.utils.valuation import value_all_pending, drain_pending_async
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncValuationConsumer(AsyncConsumer):
+    """
+    Base for the asyncio valuation consumers.
+    Valuation runs as a background task so the consumer keeps draining its channel.
+    Messages that arrive while a run is in progress trigger one more run once it finishes
+    """
+
+    model = None
+
+    def __init__(self, scope):
+        super().__init__(scope)
+        self.valuation_task = None
+        self.rerun = False
+
+    async def calculate_usd_values(self, message):
+        if self.valuation_task is not None and not self.valuation_task.done():
+            self.rerun = True
+            return
+
+        self.valuation_task = asyncio.ensure_future(self.run_valuation())
+
+    async def run_valuation(self):
+        while True:
+            self.rerun = False
+
+            try:
+                await drain_pending_async(self.model)
+            except Exception as e:
+                logger.exception(
+                    "Failed valuing pending {} rows: {}".format(self.model.__name__, e)
+                )
+
+            if not self.rerun:
+                return
+
+
+class BotValuationConsumer(SyncConsumer):
+    @staticmethod
+    def value_batch(message):
+        """
+        This method is called when a bot reports a batch of data.
+        It values the pending rows of every model for the bot, prices first
+        """
+        try:
+            bot = Bot.objects.get(pk=message["bot_pk"])
+        except Bot.DoesNotExist:
+            return
+
+        logger.info("Valuing batch for Bot {}".format(bot))
+
+        value_all_pending(bot=bot)
@@ -0,0 +1,73 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from overwatch.utils.retention import TABLES, apply_retention, get_expired
+
+
+class Command(BaseCommand):
+    """
+    Archive, roll up and remove the telemetry that is older than RETENTION_POLICIES keeps
+    """
+
+    log = logging.getLogger(__name__)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-t",
+            "--table",
+            help="table to limit to, one of {}. Can be given more than once".format(
+                ", ".join(TABLES)
+            ),
+            dest="tables",
+            action="append",
+            choices=list(TABLES),
+            default=None,
+        )
+        parser.add_argument(
+            "-s",
+            "--batch-size",
+            help="number of rows to remove in each transaction",
+            dest="batch_size",
+            type=int,
+            default=None,
+        )
+        parser.add_argument(
+            "-m",
+            "--max-batches",
+            help="stop after this many batches of each table",
+            dest="max_batches",
+            type=int,
+            default=None,
+        )
+        parser.add_argument(
+            "-n",
+            "--dry-run",
+            help="only count the expired rows",
+            dest="dry_run",
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            now = timezone.now()
+
+            for table in options["tables"] or TABLES:
+                self.log.info(
+                    "{} expired {}".format(get_expired(table, now).count(), table)
+                )
+
+            return
+
+        removed, done = apply_retention(
+            tables=options["tables"],
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        )
+
+        for table, count in removed.items():
+            self.log.info("Removed {} expired {}".format(count, table))
+
+        if not done:
+            self.log.info("There are more expired rows to remove")
@@ -0,0 +1,96 @@
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from overwatch.models import Bot
+from overwatch.utils.templates import compile_template, render_fragment
+
+
+def render_list_row(bot):
+    """
+    Render the same fragments the bot list page receives for a bot
+    """
+    return [
+        render_fragment(
+            "{{ heartbeat | timesince }}", {"heartbeat": bot.latest_heartbeat}
+        ),
+        bot.rendered_price(usd=False),
+        bot.rendered_price(usd=True),
+        bot.rendered_market_price(usd=True),
+        bot.rendered_ask_balance(on_order=True),
+        bot.rendered_bid_balance(on_order=True),
+        bot.rendered_profit(),
+    ]
+
+
+class Command(BaseCommand):
+    """
+    Measure the cost of rendering the bot list fragments per bot,
+    with every template compiled on each render against templates compiled once
+    """
+
+    log = logging.getLogger(__name__)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-i",
+            "--iterations",
+            help="number of times to render each bot",
+            dest="iterations",
+            default=100,
+        )
+        parser.add_argument(
+            "-b", "--bot", help="pk of bot to limit to", dest="bot", default=None
+        )
+
+    @staticmethod
+    def time_renders(bot, iterations, compiled):
+        start = time.perf_counter()
+
+        for _ in range(iterations):
+            if not compiled:
+                compile_template.cache_clear()
+
+            render_list_row(bot)
+
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def handle(self, *args, **options):
+        bots = Bot.objects.filter(active=True).with_state()
+
+        if options["bot"]:
+            bots = bots.filter(pk=options["bot"])
+
+        iterations = int(options["iterations"])
+
+        uncompiled_total = 0
+        compiled_total = 0
+        bot_count = 0
+
+        for bot in bots:
+            # warm up so the state and database work isn't part of the timings
+            render_list_row(bot)
+
+            uncompiled = self.time_renders(bot, iterations, compiled=False)
+            compiled = self.time_renders(bot, iterations, compiled=True)
+
+            self.log.info(
+                "{}: {:.3f}ms per render compiling templates, {:.3f}ms with compiled templates".format(
+                    bot, uncompiled, compiled
+                )
+            )
+
+            uncompiled_total += uncompiled
+            compiled_total += compiled
+            bot_count += 1
+
+        if not bot_count:
+            self.log.info("No bots to render")
+            return
+
+        self.log.info(
+            "{} bots: {:.3f}ms per bot compiling templates, {:.3f}ms per bot with compiled templates".format(
+                bot_count, uncompiled_total / bot_count, compiled_total / bot_count
+            )
+        )
@@ -7,12 +7,13 @@ from django.core.management import BaseCommand
 from django.utils.timezone import make_aware
 
 from overwatch.models import BotTrade, Bot
+from overwatch.utils.aggregator_client import get_client
 
 
 class Command(BaseCommand):
     @staticmethod
     def get_price(cur, dt):
-        r = requests.get(
+        r = get_client().get(
             "https://price-aggregator.crypto-daio.co.uk/price/{}/{}".format(cur, dt)
         )
 
@@ -0,0 +1,33 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from overwatch.models import Bot, BotProfitRollup
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the daily profit rollups from the full trade history
+    """
+
+    log = logging.getLogger(__name__)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b", "--bot", help="pk of bot to limit to", dest="bot", default=None
+        )
+
+    def handle(self, *args, **options):
+        bot = None
+
+        if options["bot"]:
+            try:
+                bot = Bot.objects.get(pk=options["bot"])
+                self.log.info("Using bot {}".format(bot))
+            except Bot.DoesNotExist:
+                self.log.error("No bot found with pk {}".format(options["bot"]))
+                return
+
+        created = BotProfitRollup.objects.rebuild(bot=bot)
+
+        self.log.info("Created {} daily profit rollups".format(created))
@@ -2,6 +2,7 @@ import requests
 from django.core.management import BaseCommand
 
 from overwatch.models.bot import BotPrice
+from overwatch.utils.aggregator_client import get_client
 
 
 class Command(BaseCommand):
@@ -16,7 +17,7 @@ class Command(BaseCommand):
 
     def make_price_request(self, currency):
         # we've not see this unit yet so get the usd price
-        r = requests.get(
+        r = get_client().get(
             "https://price-aggregator.crypto-daio.co.uk/price/{}".format(currency)
         )
 
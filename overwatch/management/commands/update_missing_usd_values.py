@@ -2,12 +2,14 @@ import logging
 
 from django.core.management import BaseCommand
 
-from overwatch.models import BotBalance, BotPlacedOrder, BotPrice, BotTrade, Bot
+from overwatch.models import Bot
+from overwatch.utils.valuation import VALUERS, drain_pending
 
 
 class Command(BaseCommand):
     """
-    If there are missing usd calculations we can update them all by passing objects to the consumers
+    If there are missing usd calculations we can update them all by running them through the batch valuation.
+    Rows waiting to retry a failed valuation are skipped unless --retry is given
     """
 
     log = logging.getLogger(__name__)
@@ -16,13 +18,20 @@ class Command(BaseCommand):
         parser.add_argument(
             "-l",
             "--limit",
-            help="limit the number of blocks to process. useful in combination with -s",
+            help="limit the number of rows of each model to process in a batch",
             dest="limit",
             default=None,
         )
         parser.add_argument(
             "-b", "--bot", help="pk of bot to limit to", dest="bot", default=None
         )
+        parser.add_argument(
+            "-r",
+            "--retry",
+            help="value rows that are waiting to retry a failed valuation now",
+            dest="retry",
+            action="store_true",
+        )
 
     def handle(self, *args, **options):
         bot = None
@@ -34,64 +43,18 @@ class Command(BaseCommand):
             except Bot.DoesNotExist:
                 bot = None
 
-        limit = options["limit"]
-
-        # bot_balance
-        balances = BotBalance.objects.filter(updated=False).order_by("-time")
-
-        if bot:
-            balances.filter(bot=bot)
-
-        if limit:
-            balances = balances[: int(limit)]
-
-        self.log.info("Processing {} BotBalances".format(balances.count()))
-
-        for balance in balances:
-            self.log.info(balance)
-            balance.save()
-
-        # bot_price
-        prices = BotPrice.objects.filter(updated=False).order_by("-time")
-
-        if bot:
-            prices.filter(bot=bot)
-
-        if limit:
-            prices = prices[: int(limit)]
-
-        self.log.info("Processing {} BotPrices".format(prices.count()))
-
-        for price in prices:
-            self.log.info(price)
-            price.save()
-
-        # bot_order
-        orders = BotPlacedOrder.objects.filter(updated=False).order_by("-time")
-
-        if bot:
-            orders.filter(bot=bot)
-
-        if limit:
-            orders = orders[: int(limit)]
-
-        self.log.info("Processing {} BotPlacedOrders".format(orders.count()))
-
-        for order in orders:
-            self.log.info(order)
-            order.save()
+        limit = int(options["limit"]) if options["limit"] else None
 
-        # bot_trade
-        trades = BotTrade.objects.filter(updated=False).order_by("-time")
+        # BotPrices are valued first as the other models depend on them
+        for model in VALUERS:
+            if options["retry"]:
+                pending = model.objects.filter(updated=False)
 
-        if bot:
-            trades.filter(bot=bot)
+                if bot is not None:
+                    pending = pending.filter(bot=bot)
 
-        if limit:
-            trades = trades[: int(limit)]
+                pending.update(valuation_retry_at=None)
 
-        self.log.info("Processing {} BotTrades".format(trades.count()))
+            total = drain_pending(model, batch_size=limit, bot=bot)
 
-        for trade in trades:
-            self.log.info(trade)
-            trade.save()
+            self.log.info("Processed {} {}s".format(total, model.__name__))
@@ -2,11 +2,12 @@ import requests
 from django.core.management import BaseCommand
 
 from overwatch.models import BotTrade
+from overwatch.utils.aggregator_client import get_client
 
 
 class Command(BaseCommand):
     def get_price(self, cur):
-        r = requests.get(
+        r = get_client().get(
             "https://price-aggregator.crypto-daio.co.uk/price/{}".format(cur)
         )
 
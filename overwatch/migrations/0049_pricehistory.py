@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0048_auto_20191216_2305"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceHistory",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("currency", models.CharField(max_length=255)),
+                ("time", models.DateTimeField()),
+                ("data", models.TextField()),
+            ],
+            options={
+                "verbose_name_plural": "price history",
+                "ordering": ["-time"],
+                "unique_together": {("currency", "time")},
+            },
+        ),
+    ]
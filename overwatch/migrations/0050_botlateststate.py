@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0049_pricehistory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BotLatestState",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_heartbeat", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.DateTimeField(blank=True, null=True)),
+                ("profit", models.FloatField(default=0.0)),
+                ("profit_time", models.DateTimeField(blank=True, null=True)),
+                ("version", models.PositiveIntegerField(default=0)),
+                (
+                    "bot",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="latest_state",
+                        to="overwatch.Bot",
+                    ),
+                ),
+                (
+                    "last_balance",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="overwatch.BotBalance",
+                    ),
+                ),
+                (
+                    "last_price",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="overwatch.BotPrice",
+                    ),
+                ),
+            ],
+        ),
+    ]
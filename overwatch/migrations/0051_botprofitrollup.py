@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def build_rollups(apps, schema_editor):
+    BotTrade = apps.get_model("overwatch", "BotTrade")
+    BotProfitRollup = apps.get_model("overwatch", "BotProfitRollup")
+
+    days = (
+        BotTrade.objects.filter(profit_usd__isnull=False, bot_trade=True)
+        .annotate(day=TruncDate("time"))
+        .values("bot", "day")
+        .annotate(profit=Sum("profit_usd"), trades=Count("pk"))
+        .order_by()
+    )
+
+    BotProfitRollup.objects.bulk_create(
+        [
+            BotProfitRollup(
+                bot_id=day["bot"],
+                day=day["day"],
+                profit_usd=day["profit"],
+                trade_count=day["trades"],
+            )
+            for day in days
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0050_botlateststate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BotProfitRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(db_index=True)),
+                ("profit_usd", models.FloatField(default=0.0)),
+                ("trade_count", models.IntegerField(default=0)),
+                (
+                    "bot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="profit_rollups",
+                        to="overwatch.Bot",
+                    ),
+                ),
+            ],
+            options={"ordering": ["-day"], "unique_together": {("bot", "day")},},
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0051_botprofitrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="botlateststate",
+            name="trades_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0052_botlateststate_trades_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="botlateststate",
+            name="balances_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="botlateststate",
+            name="placed_orders_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="botlateststate",
+            name="prices_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
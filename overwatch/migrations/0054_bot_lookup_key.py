@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+def set_lookup_keys(apps, schema_editor):
+    Bot = apps.get_model("overwatch", "Bot")
+
+    for bot in Bot.objects.select_related("exchange_account"):
+        if bot.exchange_account is None:
+            continue
+
+        bot.lookup_key = "{}@{}".format(bot.name, bot.exchange_account.exchange).lower()
+        bot.save(update_fields=["lookup_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0053_botlateststate_data_versions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bot",
+            name="lookup_key",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=511
+            ),
+        ),
+        migrations.RunPython(set_lookup_keys, migrations.RunPython.noop),
+    ]
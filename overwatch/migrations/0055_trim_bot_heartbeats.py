@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:12
+
+from django.db import migrations
+
+# the HEARTBEAT_HISTORY setting when this was written, so the result doesn't depend on the settings it runs with
+HEARTBEAT_HISTORY = 15
+
+
+def trim_heartbeats(apps, schema_editor):
+    """
+    Delete all but the latest HEARTBEAT_HISTORY heartbeats of each bot
+    """
+    Bot = apps.get_model("overwatch", "Bot")
+    BotHeartBeat = apps.get_model("overwatch", "BotHeartBeat")
+
+    for bot_pk in Bot.objects.values_list("pk", flat=True):
+        keep = list(
+            BotHeartBeat.objects.filter(bot_id=bot_pk)
+            .order_by("-time")
+            .values_list("pk", flat=True)[:HEARTBEAT_HISTORY]
+        )
+        BotHeartBeat.objects.filter(bot_id=bot_pk).exclude(pk__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0054_bot_lookup_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(trim_heartbeats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0055_trim_bot_heartbeats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="botbalance",
+            name="valuation_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="botbalance",
+            name="valuation_retry_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="botplacedorder",
+            name="valuation_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="botplacedorder",
+            name="valuation_retry_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="botprice",
+            name="valuation_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="botprice",
+            name="valuation_retry_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="bottrade",
+            name="valuation_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="bottrade",
+            name="valuation_retry_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
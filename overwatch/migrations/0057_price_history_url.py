@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+def clear_price_history(apps, schema_editor):
+    # stored prices don't record which aggregator they came from, so they can't be served any more
+    apps.get_model("overwatch", "PriceHistory").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0056_bot_valuation_retry"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_price_history, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="pricehistory",
+            name="price_url",
+            field=models.URLField(default=""),
+        ),
+        migrations.AlterUniqueTogether(
+            name="pricehistory", unique_together={("price_url", "currency", "time")},
+        ),
+    ]
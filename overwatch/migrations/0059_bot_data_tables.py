@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+# the bot error DataTable searches title and message for a substring.
+# Django's icontains compares UPPER(column::text), so the trigram indexes are on that expression
+TRIGRAM_COLUMNS = ["title", "message"]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS overwatch_boterror_{0}_trgm "
+            "ON overwatch_boterror USING gin ((UPPER({0}::text)) gin_trgm_ops)".format(
+                column
+            )
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS overwatch_boterror_{}_trgm".format(column)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0058_bot_data_time_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="botlateststate",
+            name="errors_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="boterror",
+            index=models.Index(
+                fields=["bot", "time", "id"], name="overwatch_b_bot_id_ab443e_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="botplacedorder",
+            index=models.Index(
+                fields=["bot", "time", "id"], name="overwatch_b_bot_id_213a9d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bottrade",
+            index=models.Index(
+                fields=["bot", "time", "id"], name="overwatch_b_bot_id_c35457_idx"
+            ),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
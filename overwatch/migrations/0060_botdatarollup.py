@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0059_bot_data_tables"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BotDataRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("table", models.CharField(max_length=255)),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("time", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("data", models.TextField(default="{}")),
+                (
+                    "bot",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="data_rollups",
+                        to="overwatch.Bot",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-time"],
+                "unique_together": {("bot", "table", "period", "time")},
+            },
+        ),
+    ]
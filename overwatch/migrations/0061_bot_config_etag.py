@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("overwatch", "0060_botdatarollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bot",
+            name="config_etag",
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from .bot import Bot
+from .bot_latest_state import BotLatestState
 from .bot_additions import (
     BotError,
     BotHeartBeat,
@@ -7,18 +8,25 @@ from .bot_additions import (
     BotBalance,
     BotTrade,
 )
+from .bot_profit_rollup import BotProfitRollup
+from .bot_data_rollup import BotDataRollup
 from .accounts import Exchange, AWS
 from .user import ApiProfile
+from .price_history import PriceHistory
 
 __all__ = [
     "ApiProfile",
     "AWS",
     "Bot",
     "BotHeartBeat",
+    "BotLatestState",
+    "BotProfitRollup",
+    "BotDataRollup",
     "BotError",
     "BotPlacedOrder",
     "BotPrice",
     "BotBalance",
     "BotTrade",
     "Exchange",
+    "PriceHistory",
 ]
@@ -3,10 +3,11 @@ import datetime
 import ccxt
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models import Sum
 from django.utils.timezone import now
 from encrypted_model_fields.fields import EncryptedCharField
 
+from overwatch.models import Bot, BotProfitRollup
+
 
 class Exchange(models.Model):
     identifier = models.CharField(max_length=255, unique=True)
@@ -32,60 +33,50 @@ class Exchange(models.Model):
     def __str__(self):
         return "{} @ {}".format(self.identifier, self.exchange.title())
 
-    def total_profit(self, days=1):
-        total_profit = 0
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
 
+        # the bots are identified by the exchange name, so update their lookup keys
         for bot in self.bot_set.all():
-            profit = (
-                bot.bottrade_set.filter(
-                    time__gte=now() - datetime.timedelta(days=days),
-                    profit_usd__isnull=False,
-                    bot_trade=True,
-                ).aggregate(profit=Sum("profit_usd"))["profit"]
-                or 0
-            )
+            bot.save(update_fields=["lookup_key"])
 
-            total_profit += profit
+    def delete(self, *args, **kwargs):
+        bot_pks = list(self.bot_set.values_list("pk", flat=True))
 
-        return total_profit
+        deleted = super().delete(*args, **kwargs)
 
-    def days_profit(self, start_day=0):
-        profit = 0
+        # the bots have lost their exchange account and can no longer be found from API requests
+        for bot in Bot.objects.filter(pk__in=bot_pks):
+            bot.save(update_fields=["lookup_key"])
 
-        for bot in self.bot_set.all():
-            profit = (
-                bot.bottrade_set.filter(
-                    time__lte=now() - datetime.timedelta(days=start_day),
-                    time__gte=now() - datetime.timedelta(days=start_day + 1),
-                    profit_usd__isnull=False,
-                    bot_trade=True,
-                ).aggregate(profit=Sum("profit_usd"))["profit"]
-                or 0
-            )
+        return deleted
 
-            profit += profit
+    def total_profit(self, days=1):
+        return BotProfitRollup.objects.get_profit(
+            now() - datetime.timedelta(days=days), bot__exchange_account=self
+        )
 
-        return profit
+    def days_profit(self, start_day=0):
+        return BotProfitRollup.objects.get_profit(
+            now() - datetime.timedelta(days=start_day + 1),
+            now() - datetime.timedelta(days=start_day),
+            bot__exchange_account=self,
+        )
 
     def most_profitable_bot(self, days=1):
-        most_profitable_bot = None
-        max_profit = 0
+        profits = BotProfitRollup.objects.get_profits_by_bot(
+            now() - datetime.timedelta(days=days), bot__exchange_account=self
+        )
 
-        for bot in self.bot_set.all():
-            profit = (
-                bot.bottrade_set.filter(
-                    time__gte=now() - datetime.timedelta(days=days),
-                    profit_usd__isnull=False,
-                    bot_trade=True,
-                ).aggregate(profit=Sum("profit_usd"))["profit"]
-                or 0
-            )
-
-            if profit > max_profit:
-                max_profit = profit
-                most_profitable_bot = bot
-
-        return most_profitable_bot, max_profit
+        if not profits:
+            return None, 0
+
+        bot_pk, max_profit = max(profits.items(), key=lambda profit: profit[1])
+
+        if max_profit <= 0:
+            return None, 0
+
+        return self.bot_set.get(pk=bot_pk), max_profit
 
 
 class AWS(models.Model):
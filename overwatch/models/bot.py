@@ -1,20 +1,25 @@
 import hashlib
 import hmac
+import json
 import uuid
 import datetime
+from collections import OrderedDict
 
 import pygal
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db import models
-from django.db.models import Sum
-from django.template import Template, Context
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncHour
 from django.template.loader import render_to_string
 from django.utils.timezone import now
 from pygal.style import CleanStyle
 
-from overwatch.utils.price_aggregator import get_price_movement
+from overwatch.utils.chart_cache import get_chart
+from overwatch.utils.price_aggregator import get_cached_price_movement
+from overwatch.utils.templates import render_fragment
 from encrypted_model_fields.fields import EncryptedCharField
 
 
@@ -23,6 +28,58 @@ def no_slash(value):
         raise ValidationError('Name cannot contain the "/" character')
 
 
+def make_lookup_key(name, exchange):
+    """
+    The normalised name@exchange a bot is identified by in API requests
+    """
+    return "{}@{}".format(name, exchange).lower()
+
+
+def get_identity_cache_key(lookup_key):
+    return "bot_identity:{}".format(hashlib.md5(lookup_key.encode("utf-8")).hexdigest())
+
+
+# the fields an API request is authenticated with, which are all that is cached of a bot
+API_IDENTITY_FIELDS = ["id", "name", "lookup_key", "api_secret", "last_nonce"]
+
+
+class BotQuerySet(models.QuerySet):
+    def with_state(self):
+        """
+        Fetch the latest state of each bot in the same query
+        """
+        return self.select_related(
+            "latest_state", "latest_state__last_price", "latest_state__last_balance"
+        )
+
+    def get_for_api(self, name, exchange):
+        """
+        Return the bot an API request identifies by name and exchange, case insensitively.
+        Only the fields needed to authenticate the request are cached, for BOT_IDENTITY_CACHE_SECONDS.
+        The rest are deferred and loaded if they are used, so the config a bot is sent is never stale.
+        Bot.auth checks the cached secret and name against the database as it advances the nonce,
+        so a cached copy that another process hasn't cleared can't authenticate a request either.
+        Raises Bot.DoesNotExist
+        """
+        lookup_key = make_lookup_key(name, exchange)
+        cache_key = get_identity_cache_key(lookup_key)
+        cached = cache.get(cache_key)
+
+        if cached is None:
+            cached = (
+                self.filter(lookup_key=lookup_key).values(*API_IDENTITY_FIELDS).get()
+            )
+            cache.set(cache_key, cached, settings.BOT_IDENTITY_CACHE_SECONDS)
+
+        # from_db expects the values in the order of the model fields
+        fields = [
+            field.attname
+            for field in self.model._meta.concrete_fields
+            if field.attname in cached
+        ]
+        return self.model.from_db(self.db, fields, [cached[field] for field in fields])
+
+
 class Bot(models.Model):
     # operational config options
     name = models.CharField(
@@ -77,6 +134,12 @@ class Bot(models.Model):
     )
     api_secret = models.UUIDField(default=uuid.uuid4)
     last_nonce = models.BigIntegerField(default=0)
+    # name@exchange in lower case. Set on save and used to find the bot from API requests
+    lookup_key = models.CharField(
+        max_length=511, db_index=True, editable=False, blank=True
+    )
+    # a hash of the config the bot is sent. Set on save and sent as the ETag of the config
+    config_etag = models.CharField(max_length=32, editable=False, blank=True)
     base_price_url = models.URLField(
         default="https://price-aggregator.crypto-daio.co.uk/price"
     )
@@ -122,6 +185,8 @@ class Bot(models.Model):
         default=2, help_text="How often the bot should run (Minutes)"
     )
 
+    objects = BotQuerySet.as_manager()
+
     def __str__(self):
         return "{}{}".format(
             self.name,
@@ -133,6 +198,31 @@ class Bot(models.Model):
     class Meta:
         ordering = ["name", "exchange_account__identifier", "active"]
 
+    def save(self, *args, **kwargs):
+        previous_lookup_key = self.lookup_key
+        self.lookup_key = (
+            make_lookup_key(self.name, self.exchange_account.exchange)
+            if self.exchange_account
+            else ""
+        )
+
+        self.config_etag = self.get_config_etag()
+
+        # saves of only some fields, such as the lookup key when the exchange is renamed, can change the config
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"config_etag"}
+
+        super().save(*args, **kwargs)
+
+        # the bot may have been cached under its previous name too
+        cache.delete_many(
+            [
+                get_identity_cache_key(lookup_key)
+                for lookup_key in {previous_lookup_key, self.lookup_key}
+                if lookup_key
+            ]
+        )
+
     def serialize(self):
         return {
             "name": self.name,
@@ -153,6 +243,17 @@ class Bot(models.Model):
             "peg_price_url": self.peg_price_url,
         }
 
+    def get_config_etag(self):
+        """
+        The hash of the serialized config. A bot without an exchange account has no config to send
+        """
+        if not self.exchange_account:
+            return ""
+
+        return hashlib.md5(
+            json.dumps(self.serialize(), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
     def auth(self, supplied_hash, name, exchange, nonce):
         # check that the supplied nonce is an integer
         # and is greater than the last supplied nonce to prevent reuse
@@ -174,13 +275,33 @@ class Bot(models.Model):
             hashlib.sha256,
         ).hexdigest()
 
-        # update the last nonce value
-        self.last_nonce = nonce
-        self.save()
-
-        if calculated_hash != supplied_hash:
+        if not hmac.compare_digest(calculated_hash, str(supplied_hash)):
             return False, "supplied hash does not match calculated hash"
 
+        # advance the last nonce in a single conditional update.
+        # if a concurrent request has already used this nonce or a later one nothing is updated.
+        # Nor is it if this is a cached copy of the bot and its secret or name have changed since
+        updated = (
+            type(self)
+            .objects.filter(
+                pk=self.pk,
+                last_nonce__lt=nonce,
+                api_secret=self.api_secret,
+                lookup_key=self.lookup_key,
+            )
+            .update(last_nonce=nonce)
+        )
+
+        if not updated:
+            cache.delete(get_identity_cache_key(self.lookup_key))
+
+            return (
+                False,
+                "n parameter needs to be a positive integer and greater than the previous nonce",
+            )
+
+        self.last_nonce = nonce
+
         return True, "authenticated"
 
     @property
@@ -192,30 +313,41 @@ class Bot(models.Model):
         return self.market.split("/")[1] if self.market else None
 
     @property
-    def latest_heartbeat(self):
-        latest_heartbeat = self.botheartbeat_set.first()
+    def state(self):
+        """
+        The BotLatestState of the bot, built on first access if the bot doesn't have one yet
+        """
+        try:
+            return self.latest_state
+        except ObjectDoesNotExist:
+            state_model = self._meta.get_field("latest_state").related_model
+            self.latest_state = state_model.objects.get_for_bot(self)
+            return self.latest_state
 
-        if latest_heartbeat:
-            return latest_heartbeat.time
+    def refresh_state(self):
+        """
+        Drop the cached state so the next access reads the current one
+        """
+        latest_state = self._meta.get_field("latest_state")
 
-        return ""
+        if latest_state.is_cached(self):
+            latest_state.delete_cached_value(self)
 
     @property
-    def last_error(self):
-        latest_error = self.boterror_set.first()
-
-        if latest_error:
-            return latest_error.time
+    def latest_heartbeat(self):
+        return self.state.last_heartbeat or ""
 
-        return ""
+    @property
+    def last_error(self):
+        return self.state.last_error or ""
 
     @property
     def last_price(self):
-        return self.botprice_set.exclude(price_usd__isnull=True).first()
+        return self.state.last_price
 
     @property
     def last_balance(self):
-        return self.botbalance_set.first()
+        return self.state.last_balance
 
     @property
     def spread(self):
@@ -233,18 +365,24 @@ class Bot(models.Model):
             dp = str(self.base_decimal_places)
             template = "{{ last_price.price|floatformat:" + dp + " }} {{ currency }}"
 
-        return Template(template).render(
-            Context(
-                {
-                    "last_price": self.last_price if self.last_price else 0,
-                    "currency": ("USD" if usd else self.quote)
-                    if self.last_price
-                    else "",
-                }
-            )
+        return render_fragment(
+            template,
+            {
+                "last_price": self.last_price if self.last_price else 0,
+                "currency": ("USD" if usd else self.quote) if self.last_price else "",
+            },
         )
 
     def price_sparkline(self):
+        return get_chart(
+            self,
+            "price_sparkline",
+            None,
+            self.state.prices_version,
+            self.render_price_sparkline,
+        )
+
+    def render_price_sparkline(self):
         prices = self.botprice_set.exclude(price_usd__isnull=True)[:30].values_list(
             "price", flat=True
         )
@@ -265,13 +403,9 @@ class Bot(models.Model):
                 "{{ last_price.bid_price|floatformat:" + dp + " }} {{ currency }}"
             )
 
-        return Template(template).render(
-            Context(
-                {
-                    "last_price": self.last_price,
-                    "currency": "USD" if usd else self.quote,
-                }
-            )
+        return render_fragment(
+            template,
+            {"last_price": self.last_price, "currency": "USD" if usd else self.quote,},
         )
 
     def rendered_ask_price(self, usd=True):
@@ -286,13 +420,9 @@ class Bot(models.Model):
                 "{{ last_price.ask_price|floatformat:" + dp + " }} {{ currency }}"
             )
 
-        return Template(template).render(
-            Context(
-                {
-                    "last_price": self.last_price,
-                    "currency": "USD" if usd else self.quote,
-                }
-            )
+        return render_fragment(
+            template,
+            {"last_price": self.last_price, "currency": "USD" if usd else self.quote,},
         )
 
     def rendered_market_price(self, usd=True):
@@ -309,13 +439,9 @@ class Bot(models.Model):
                 "{{ last_price.market_price|floatformat:" + dp + " }} {{ currency }}"
             )
 
-        market_price_value = Template(template).render(
-            Context(
-                {
-                    "last_price": self.last_price,
-                    "currency": "USD" if usd else self.quote,
-                }
-            )
+        market_price_value = render_fragment(
+            template,
+            {"last_price": self.last_price, "currency": "USD" if usd else self.quote,},
         )
 
         return render_to_string(
@@ -361,13 +487,12 @@ class Bot(models.Model):
                     + " }} {{ currency }}"
                 )
 
-        return Template(template).render(
-            Context(
-                {
-                    "last_balance": self.last_balance if self.last_balance else 0,
-                    "currency": currency,
-                }
-            )
+        return render_fragment(
+            template,
+            {
+                "last_balance": self.last_balance if self.last_balance else 0,
+                "currency": currency,
+            },
         )
 
     def rendered_ask_balance(self, on_order=True, usd=True):
@@ -405,31 +530,41 @@ class Bot(models.Model):
                     + " }} {{ currency }}"
                 )
 
-        return Template(template).render(
-            Context(
-                {
-                    "last_balance": self.last_balance if self.last_balance else 0,
-                    "currency": currency,
-                }
-            )
+        return render_fragment(
+            template,
+            {
+                "last_balance": self.last_balance if self.last_balance else 0,
+                "currency": currency,
+            },
         )
 
-    def profit(self, days=1):
-        return float(
-            self.bottrade_set.filter(
-                time__gte=now() - datetime.timedelta(days=days),
-                profit_usd__isnull=False,
-                bot_trade=True,
-            ).aggregate(profit=Sum("profit_usd"))["profit"]
-            or 0.0
+    def calculate_profit(self, days=1):
+        rollup_model = self._meta.get_field("profit_rollups").related_model
+        return rollup_model.objects.get_profit(
+            now() - datetime.timedelta(days=days), bot=self
         )
 
+    def profit(self, days=1):
+        if days == 1:
+            return self.state.get_profit()
+
+        return self.calculate_profit(days)
+
     def rendered_profit(self, days=1):
         return render_to_string(
             "overwatch/fragments/bot_list/profit.html", {"profit": self.profit(days)}
         )
 
     def get_placed_orders_chart(self, hours=48):
+        return get_chart(
+            self,
+            "placed_orders",
+            hours,
+            self.state.placed_orders_version,
+            lambda: self.render_placed_orders_chart(hours),
+        )
+
+    def render_placed_orders_chart(self, hours):
         bid_points = []
         ask_points = []
 
@@ -463,12 +598,18 @@ class Bot(models.Model):
         return datetimeline.render_data_uri()
 
     def get_trades_chart(self, days=None):
-        trades = self.bottrade_set.filter(
-            time__gte=now() - datetime.timedelta(days=60),
-            profit_usd__isnull=False,
-            bot_trade=True,
+        if days is None:
+            days = [1, 3, 7, 14, 30]
+
+        return get_chart(
+            self,
+            "trades",
+            days,
+            self.state.trades_version,
+            lambda: self.render_trades_chart(days),
         )
 
+    def render_trades_chart(self, days):
         chart = pygal.StackedBar(
             x_title="Days",
             y_title="Value in USD",
@@ -479,27 +620,47 @@ class Bot(models.Model):
         chart.value_formatter = lambda x: "$%.2f USD" % x
         chart.title = "Aggregated profits over time"
 
-        if days is None:
-            days = [1, 3, 7, 14, 30]
-
         chart.x_labels = days
         profits = {"buy": [], "sell": []}
 
         if not self.base:
             return chart.render_data_uri()
 
-        movements = get_price_movement(self.base_price_url, self.base)
+        movements = get_cached_price_movement(self.base_price_url, self.base)
+
+        # sum every side and day bucket in a single query
+        current_time = now()
+        buckets = []
+        previous_day = 0
+
+        for day in days:
+            buckets.append((previous_day, day))
+            previous_day = day
+
+        bucket_profits = self.bottrade_set.filter(
+            time__gte=current_time - datetime.timedelta(days=max(days)),
+            profit_usd__isnull=False,
+            bot_trade=True,
+        ).aggregate(
+            **{
+                "{}_{}".format(side, day): Sum(
+                    "profit_usd",
+                    filter=Q(
+                        trade_type=side,
+                        time__lt=current_time - datetime.timedelta(days=previous_day),
+                        time__gte=current_time - datetime.timedelta(days=day),
+                    ),
+                )
+                for side in profits
+                for previous_day, day in buckets
+            }
+        )
 
         for side in ["buy", "sell"]:
             running_total = 0
-            previous_day = 0
 
             for day in days:
-                profit = trades.filter(
-                    trade_type=side,
-                    time__lt=now() - datetime.timedelta(days=previous_day),
-                    time__gte=now() - datetime.timedelta(days=day),
-                ).aggregate(profit=Sum("profit_usd"))["profit"]
+                profit = bucket_profits["{}_{}".format(side, day)]
 
                 movement_factor = 1
 
@@ -518,53 +679,72 @@ class Bot(models.Model):
                 running_total += adjusted_profit
                 profits[side].append(running_total)
 
-                previous_day = day
-
         chart.add("Buy", profits["buy"])
         chart.add("Sell", profits["sell"])
         return chart.render_data_uri()
 
     def get_balances_chart(self):
-        balances = self.botbalance_set.filter(
-            time__gte=now() - datetime.timedelta(days=30),
-        ).order_by("time")
-
-        bid_balances = []
-        ask_balances = []
-
-        earliest = balances.first()
-
-        if earliest is None:
-            return ""
+        days = settings.BALANCE_CHART_DAYS
+        bucket_hours = settings.BALANCE_CHART_BUCKET_HOURS
+
+        return get_chart(
+            self,
+            "balances",
+            (days, bucket_hours),
+            self.state.balances_version,
+            lambda: self.render_balances_chart(days, bucket_hours),
+        )
 
-        bid_balances.append(earliest.bid_available_usd + earliest.bid_on_order_usd)
-        ask_balances.append(earliest.ask_available_usd + earliest.ask_on_order_usd)
+    def get_balance_history(self, days, bucket_hours):
+        """
+        The average USD bid and ask balance of the bot in buckets of bucket_hours, oldest first.
+        The database averages each hour so the rows returned don't depend on how often the bot reports.
+        Balances that haven't been valued yet are left out
+        """
+        hours = (
+            self.botbalance_set.filter(
+                time__gte=now() - datetime.timedelta(days=days),
+                bid_available_usd__isnull=False,
+                bid_on_order_usd__isnull=False,
+                ask_available_usd__isnull=False,
+                ask_on_order_usd__isnull=False,
+            )
+            .annotate(hour=TruncHour("time"))
+            .values("hour")
+            .annotate(
+                bid=Sum(F("bid_available_usd") + F("bid_on_order_usd")),
+                ask=Sum(F("ask_available_usd") + F("ask_on_order_usd")),
+                count=Count("pk"),
+            )
+            .order_by("hour")
+        )
 
-        next_time = earliest.time + datetime.timedelta(hours=6)
+        buckets = OrderedDict()
+        bucket_seconds = bucket_hours * 60 * 60
 
-        for balance in balances:
-            if balance.time < next_time:
-                continue
+        for hour in hours:
+            timestamp = int(hour["hour"].timestamp())
+            bucket = hour["hour"] - datetime.timedelta(
+                seconds=timestamp % bucket_seconds
+            )
+            totals = buckets.setdefault(bucket, [0.0, 0.0, 0])
+            totals[0] += hour["bid"]
+            totals[1] += hour["ask"]
+            totals[2] += hour["count"]
 
-            all_attributes = True
+        return [
+            (bucket, bid / count, ask / count)
+            for bucket, (bid, ask, count) in buckets.items()
+        ]
 
-            for attribute in [
-                balance.bid_available_usd,
-                balance.bid_on_order_usd,
-                balance.ask_available_usd,
-                balance.ask_on_order_usd,
-            ]:
-                if attribute is None:
-                    balance.updated = False
-                    balance.save()
-                    all_attributes = False
+    def render_balances_chart(self, days, bucket_hours):
+        history = self.get_balance_history(days, bucket_hours)
 
-            if not all_attributes:
-                continue
+        if not history:
+            return ""
 
-            bid_balances.append(balance.bid_available_usd + balance.bid_on_order_usd)
-            ask_balances.append(balance.ask_available_usd + balance.ask_on_order_usd)
-            next_time = next_time + datetime.timedelta(hours=6)
+        bid_balances = [bid for _, bid, _ in history]
+        ask_balances = [ask for _, _, ask in history]
 
         line = pygal.Line(
             y_title="Amount in USD",
@@ -1,39 +1,110 @@
+import datetime
+
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 
-from overwatch.models import Bot
+from overwatch.models import Bot, BotLatestState
+from overwatch.utils import bot_updates
+
+
+def first_in_window(key, seconds):
+    """
+    True for the first call with the key in each window of seconds.
+    Used to debounce messages that don't need sending for every row
+    """
+    return cache.add(key, True, seconds)
+
+
+def queue_valuation(row, channel, message):
+    """
+    Ask the valuation consumer of the channel to value the new row.
+    Nothing is sent while a recent pending row of the same bot is still unclaimed:
+    the valuation run queued for that row claims this one too, so a burst of rows sends one message
+    """
+    if (
+        type(row)
+        .objects.filter(
+            bot_id=row.bot_id,
+            updated=False,
+            valuation_retry_at__isnull=True,
+            time__gte=timezone.now()
+            - datetime.timedelta(seconds=settings.VALUATION_QUEUE_SECONDS),
+        )
+        .exclude(pk=row.pk)
+        .exists()
+    ):
+        return
+
+    async_to_sync(get_channel_layer().send)(channel, message)
+
+
+class BotHeartBeatManager(models.Manager):
+    def get_recycled_pk(self, bot):
+        """
+        The pk of the oldest heartbeat of the bot once it holds HEARTBEAT_HISTORY of them, otherwise None
+        """
+        return (
+            self.filter(bot=bot)
+            .order_by("-time")
+            .values_list("pk", flat=True)[
+                settings.HEARTBEAT_HISTORY - 1 : settings.HEARTBEAT_HISTORY
+            ]
+            .first()
+        )
 
 
 class BotHeartBeat(models.Model):
+    """
+    Only the latest HEARTBEAT_HISTORY heartbeats of each bot are kept.
+    Once a bot has that many, a new heartbeat overwrites the oldest so the table doesn't grow
+    """
+
     bot = models.ForeignKey(Bot, on_delete=models.CASCADE)
     time = models.DateTimeField(auto_now_add=True)
 
+    objects = BotHeartBeatManager()
+
     def __str__(self):
         return "{}".format(self.time)
 
     class Meta:
         ordering = ["-time"]
 
-    def save(self, **kwargs):
-        super().save(kwargs)
+    def save(self, *args, **kwargs):
+        if self.pk is None:
+            self.pk = BotHeartBeat.objects.get_recycled_pk(self.bot)
 
-        # update the heartbeat list on the bot page
-        async_to_sync(get_channel_layer().group_send)(
-            "bot_{}".format(self.bot.pk), {"type": "get.heart.beats"}
-        )
+            if self.pk is not None:
+                self.time = timezone.now()
+                kwargs.update(force_insert=False, force_update=True)
 
-        # stream the cloudwatch logs
-        async_to_sync(get_channel_layer().send)(
-            "cloudwatch-logs",
-            {"type": "get.cloudwatch.logs", "bot_pk": self.bot.pk, "sleep": 30},
-        )
+        super().save(*args, **kwargs)
 
-        # update the main list page
-        async_to_sync(get_channel_layer().group_send)(
-            "bot_list", {"type": "send.bot.data", "bot": self.bot.pk}
-        )
+        BotLatestState.objects.record_heartbeat(self)
+
+        # stream the cloudwatch logs of the run.
+        # A run normally sends one heartbeat, but one sent again within the run (e.g. a retried request)
+        # doesn't need to fetch the same logs again
+        if first_in_window(
+            "heartbeat_logs:{}".format(self.bot.pk), settings.HEARTBEAT_LOGS_SECONDS
+        ):
+            async_to_sync(get_channel_layer().send)(
+                "cloudwatch-logs",
+                {"type": "get.cloudwatch.logs", "bot_pk": self.bot.pk, "sleep": 30},
+            )
+
+        # heartbeats arrive around the clock, so they schedule the removal of expired telemetry
+        if first_in_window("retention", settings.RETENTION_INTERVAL_SECONDS):
+            async_to_sync(get_channel_layer().send)(
+                "bot-retention", {"type": "apply.retention"}
+            )
+
+        # update the heartbeat list on the bot page and the main list page
+        bot_updates.announce(self.bot.pk, bot_updates.HEART_BEATS, bot_updates.BOT_LIST)
 
 
 class BotError(models.Model):
@@ -47,11 +118,21 @@ class BotError(models.Model):
 
     class Meta:
         ordering = ["-time"]
+        # the DataTables page through a bot's rows by time
+        indexes = [models.Index(fields=["bot", "time", "id"])]
+
+    def save(self, **kwargs):
+        super().save(kwargs)
+
+        BotLatestState.objects.record_error(self)
 
 
 class BotPlacedOrder(models.Model):
     bot = models.ForeignKey(Bot, on_delete=models.CASCADE, db_index=True)
-    time = models.DateTimeField(auto_now_add=True, db_index=True)
+    time = models.DateTimeField(
+        default=timezone.now,  # batched rows keep the time the bot recorded them
+        db_index=True,
+    )
     base = models.CharField(max_length=255,)
     quote = models.CharField(max_length=255,)
     order_type = models.CharField(max_length=255,)
@@ -59,6 +140,8 @@ class BotPlacedOrder(models.Model):
     price_usd = models.FloatField(blank=True, null=True, db_index=True)
     amount = models.FloatField()
     updated = models.BooleanField(default=False, db_index=True)
+    valuation_attempts = models.PositiveSmallIntegerField(default=0)
+    valuation_retry_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
     def __str__(self):
         return "{} {:.4f} {}@{:.4f} {}".format(
@@ -67,13 +150,23 @@ class BotPlacedOrder(models.Model):
 
     class Meta:
         ordering = ["-time"]
+        # the DataTables page through a bot's rows by time
+        indexes = [models.Index(fields=["bot", "time", "id"])]
 
     def save(self, **kwargs):
+        adding = self._state.adding
+
         super().save(kwargs)
 
+        if adding:
+            # the placed orders table shows the new order before it is valued
+            BotLatestState.objects.touch(self.bot, data="placed_orders")
+
         if not self.updated:
-            async_to_sync(get_channel_layer().send)(
-                "bot-order", {"type": "calculate.usd.values", "bot_order": self.pk,},
+            queue_valuation(
+                self,
+                "bot-order",
+                {"type": "calculate.usd.values", "bot_order": self.pk,},
             )
 
 
@@ -110,7 +203,10 @@ class BotPriceManager(models.Manager):
 
 class BotPrice(models.Model):
     bot = models.ForeignKey(Bot, on_delete=models.CASCADE, db_index=True)
-    time = models.DateTimeField(auto_now_add=True, db_index=True)
+    time = models.DateTimeField(
+        default=timezone.now,  # batched rows keep the time the bot recorded them
+        db_index=True,
+    )
     price = models.FloatField(null=True, blank=True)
     price_usd = models.FloatField(null=True, blank=True)
     bid_price = models.FloatField(null=True, blank=True)
@@ -123,6 +219,8 @@ class BotPrice(models.Model):
     quote_price = models.FloatField(null=True, blank=True)
     unit = models.CharField(max_length=255, null=True, blank=True)
     updated = models.BooleanField(default=False, db_index=True)
+    valuation_attempts = models.PositiveSmallIntegerField(default=0)
+    valuation_retry_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
     objects = BotPriceManager()
 
@@ -135,15 +233,22 @@ class BotPrice(models.Model):
     def save(self, **kwargs):
         super().save(kwargs)
 
+        BotLatestState.objects.record_price(self)
+
         if not self.updated:
-            async_to_sync(get_channel_layer().send)(
-                "bot-price", {"type": "calculate.usd.values", "bot_price": self.pk,},
+            queue_valuation(
+                self,
+                "bot-price",
+                {"type": "calculate.usd.values", "bot_price": self.pk,},
             )
 
 
 class BotBalance(models.Model):
     bot = models.ForeignKey(Bot, on_delete=models.CASCADE, db_index=True)
-    time = models.DateTimeField(auto_now_add=True, db_index=True)
+    time = models.DateTimeField(
+        default=timezone.now,  # batched rows keep the time the bot recorded them
+        db_index=True,
+    )
     bid_available = models.FloatField()
     bid_available_as_base = models.FloatField(null=True, blank=True)
     ask_available = models.FloatField()
@@ -155,6 +260,8 @@ class BotBalance(models.Model):
     ask_on_order_usd = models.FloatField(null=True, blank=True)
     unit = models.CharField(max_length=255,)
     updated = models.BooleanField(default=False, db_index=True)
+    valuation_attempts = models.PositiveSmallIntegerField(default=0)
+    valuation_retry_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
     def __str__(self):
         return "{}@{}".format(self.bot, self.time)
@@ -165,8 +272,11 @@ class BotBalance(models.Model):
     def save(self, **kwargs):
         super().save(kwargs)
 
+        BotLatestState.objects.record_balance(self)
+
         if not self.updated:
-            async_to_sync(get_channel_layer().send)(
+            queue_valuation(
+                self,
                 "bot-balance",
                 {"type": "calculate.usd.values", "bot_balance": self.pk,},
             )
@@ -190,6 +300,8 @@ class BotTrade(models.Model):
     difference_usd = models.FloatField(null=True, blank=True)
     profit_usd = models.FloatField(null=True, blank=True, db_index=True)
     updated = models.BooleanField(default=False, db_index=True)
+    valuation_attempts = models.PositiveSmallIntegerField(default=0)
+    valuation_retry_at = models.DateTimeField(blank=True, null=True, db_index=True)
 
     def __str__(self):
         if self.profit_usd:
@@ -203,11 +315,18 @@ class BotTrade(models.Model):
 
     class Meta:
         ordering = ["-time"]
+        # the DataTables page through a bot's rows by time
+        indexes = [models.Index(fields=["bot", "time", "id"])]
         unique_together = ("bot", "trade_id")
 
     def save(self, **kwargs):
+        adding = self._state.adding
+
         super().save(kwargs)
 
+        if adding:
+            BotLatestState.objects.touch(self.bot, data="trades")
+
         # async_to_sync(get_channel_layer().group_send)(
         #     'bot_{}'.format(self.bot.pk),
         #     {
@@ -215,7 +334,22 @@ class BotTrade(models.Model):
         #     }
         # )
 
+        if self.profit_usd is not None:
+            # trades saved with a profit (e.g. by the import commands) skip the batch valuation,
+            # which keeps the rollups up to date for the trades it values
+            self.bot.profit_rollups.refresh_for_trades([self])
+
         if not self.updated:
-            async_to_sync(get_channel_layer().send)(
-                "bot-trade", {"type": "calculate.usd.values", "bot_trade": self.pk},
+            queue_valuation(
+                self,
+                "bot-trade",
+                {"type": "calculate.usd.values", "bot_trade": self.pk},
             )
+
+    def delete(self, **kwargs):
+        result = super().delete(**kwargs)
+
+        if self.profit_usd is not None:
+            self.bot.profit_rollups.refresh_for_trades([self])
+
+        return result
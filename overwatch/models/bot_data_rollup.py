@@ -0,0 +1,86 @@
+import json
+
+from django.db import IntegrityError, models, transaction
+
+from overwatch.models import Bot
+
+
+def merge_stats(stats, other):
+    """
+    Combine two {field: [count, sum, min, max]} summaries
+    """
+    merged = dict(stats)
+
+    for field, (count, total, low, high) in other.items():
+        if field not in merged:
+            merged[field] = [count, total, low, high]
+            continue
+
+        merged_count, merged_total, merged_low, merged_high = merged[field]
+        merged[field] = [
+            merged_count + count,
+            merged_total + total,
+            min(merged_low, low),
+            max(merged_high, high),
+        ]
+
+    return merged
+
+
+class BotDataRollupManager(models.Manager):
+    def add(self, bot_id, table, period, time, count, stats):
+        """
+        Add the summary of count rows to the rollup of the bot's table for the period starting at time.
+        stats is {field: [count, sum, min, max]} of the values that aren't null
+        """
+        keys = {"bot_id": bot_id, "table": table, "period": period, "time": time}
+
+        with transaction.atomic():
+            rollup = self.select_for_update().filter(**keys).first()
+
+            if rollup is None:
+                try:
+                    with transaction.atomic():
+                        self.create(count=count, data=json.dumps(stats), **keys)
+                    return
+                except IntegrityError:
+                    # another run created the same rollup at the same time
+                    rollup = self.select_for_update().get(**keys)
+
+            rollup.count += count
+            rollup.data = json.dumps(merge_stats(rollup.get_data(), stats))
+            rollup.save(update_fields=["count", "data"])
+
+
+class BotDataRollup(models.Model):
+    """
+    Hourly or daily summary of a bot's telemetry that is older than the retention policy keeps (see utils.retention).
+    data holds [count, sum, min, max] of each numeric field
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    PERIOD_CHOICES = ((HOUR, "Hour"), (DAY, "Day"))
+
+    bot = models.ForeignKey(Bot, on_delete=models.CASCADE, related_name="data_rollups")
+    table = models.CharField(max_length=255)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    time = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    data = models.TextField(default="{}")
+
+    objects = BotDataRollupManager()
+
+    def __str__(self):
+        return "{} {} {} {}".format(self.bot, self.table, self.period, self.time)
+
+    class Meta:
+        ordering = ["-time"]
+        unique_together = ("bot", "table", "period", "time")
+
+    def get_data(self):
+        return json.loads(self.data)
+
+    def get_average(self, field):
+        count, total, low, high = self.get_data().get(field, [0, 0, None, None])
+        return total / count if count else None
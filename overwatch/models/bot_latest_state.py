@@ -0,0 +1,192 @@
+import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, models
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from overwatch.models import Bot
+
+
+class BotLatestStateManager(models.Manager):
+    def get_for_bot(self, bot):
+        """
+        Return the state row for the bot, building it from the raw tables if it doesn't exist yet
+        """
+        try:
+            return self.select_related("last_price", "last_balance").get(bot=bot)
+        except self.model.DoesNotExist:
+            return self.rebuild(bot)
+
+    def rebuild(self, bot):
+        """
+        Calculate the state of the bot from scratch
+        """
+        heartbeat = bot.botheartbeat_set.first()
+        error = bot.boterror_set.first()
+
+        values = {
+            "last_price": bot.botprice_set.exclude(price_usd__isnull=True).first(),
+            "last_balance": bot.botbalance_set.first(),
+            "last_heartbeat": heartbeat.time if heartbeat else None,
+            "last_error": error.time if error else None,
+            "profit": bot.calculate_profit(days=1),
+            "profit_time": now(),
+        }
+
+        try:
+            state, created = self.update_or_create(bot=bot, defaults=values)
+        except IntegrityError:
+            # another worker built the row at the same time
+            state = self.get(bot=bot)
+            created = False
+
+        if not created:
+            self.filter(pk=state.pk).update(version=F("version") + 1)
+            state.refresh_from_db()
+
+        return state
+
+    def _advance(self, bot, time_field, time, data=None, **values):
+        """
+        Apply the values to the bot state, but only if they are newer than what it already holds.
+        The check happens in the UPDATE so concurrent writers can't move the state backwards.
+        data names the data version to bump, which happens even if the values are older
+        """
+        versions = {"version": F("version") + 1}
+
+        if data is not None:
+            versions["{}_version".format(data)] = F("{}_version".format(data)) + 1
+
+        updated = (
+            self.filter(bot=bot)
+            .filter(
+                Q(**{"{}__isnull".format(time_field): True})
+                | Q(**{"{}__lte".format(time_field): time})
+            )
+            .update(**versions, **values)
+        )
+
+        if updated:
+            return
+
+        if not self.filter(bot=bot).exists():
+            self.rebuild(bot)
+        elif data is not None:
+            self.filter(bot=bot).update(**versions)
+
+    def record_heartbeat(self, heartbeat):
+        self._advance(
+            heartbeat.bot,
+            "last_heartbeat",
+            heartbeat.time,
+            last_heartbeat=heartbeat.time,
+        )
+
+    def record_error(self, error):
+        self._advance(
+            error.bot, "last_error", error.time, data="errors", last_error=error.time
+        )
+
+    def record_price(self, bot_price):
+        if bot_price.price_usd is None:
+            return
+
+        self._advance(
+            bot_price.bot,
+            "last_price__time",
+            bot_price.time,
+            data="prices",
+            last_price=bot_price,
+        )
+
+    def record_balance(self, bot_balance):
+        self._advance(
+            bot_balance.bot,
+            "last_balance__time",
+            bot_balance.time,
+            data="balances",
+            last_balance=bot_balance,
+        )
+
+    def record_profit(self, bot, new_trades=False):
+        """
+        Recalculate the rolling 24 hour profit.
+        new_trades marks the trade data as changed too
+        """
+        values = {
+            "profit": bot.calculate_profit(days=1),
+            "profit_time": now(),
+            "version": F("version") + 1,
+        }
+
+        if new_trades:
+            values["trades_version"] = F("trades_version") + 1
+
+        if not self.filter(bot=bot).update(**values):
+            self.rebuild(bot)
+
+    def touch(self, bot, data=None):
+        """
+        Mark the bot data as changed without changing the state.
+        data names the data version to bump as well
+        """
+        versions = {"version": F("version") + 1}
+
+        if data is not None:
+            versions["{}_version".format(data)] = F("{}_version".format(data)) + 1
+
+        if not self.filter(bot=bot).update(**versions):
+            self.rebuild(bot)
+
+
+class BotLatestState(models.Model):
+    """
+    The latest data of a bot, maintained as the data is written.
+    Saves the dashboard from querying every telemetry table for the newest row
+    """
+
+    bot = models.OneToOneField(
+        Bot, on_delete=models.CASCADE, related_name="latest_state"
+    )
+    last_price = models.ForeignKey(
+        "BotPrice", on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    last_balance = models.ForeignKey(
+        "BotBalance",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_heartbeat = models.DateTimeField(null=True, blank=True)
+    last_error = models.DateTimeField(null=True, blank=True)
+    profit = models.FloatField(default=0.0)
+    profit_time = models.DateTimeField(null=True, blank=True)
+    # incremented on every change to the bot data
+    version = models.PositiveIntegerField(default=0)
+    # versions of each kind of bot data, used as the cache keys of the charts drawn from them.
+    # incremented when rows of that kind are inserted or valued
+    prices_version = models.PositiveIntegerField(default=0)
+    balances_version = models.PositiveIntegerField(default=0)
+    placed_orders_version = models.PositiveIntegerField(default=0)
+    trades_version = models.PositiveIntegerField(default=0)
+    errors_version = models.PositiveIntegerField(default=0)
+
+    objects = BotLatestStateManager()
+
+    def __str__(self):
+        return "{} v{}".format(self.bot, self.version)
+
+    def get_profit(self):
+        """
+        The rolling 24 hour profit. Recalculated once it is older than BOT_STATE_PROFIT_MAX_AGE seconds
+        as trades leave the window without anything being written
+        """
+        if self.profit_time is None or now() - self.profit_time > datetime.timedelta(
+            seconds=settings.BOT_STATE_PROFIT_MAX_AGE
+        ):
+            BotLatestState.objects.record_profit(self.bot)
+            self.refresh_from_db(fields=["profit", "profit_time", "version"])
+
+        return self.profit
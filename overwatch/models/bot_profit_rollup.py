@@ -0,0 +1,177 @@
+import datetime
+
+from django.db import IntegrityError, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils.timezone import now, utc
+
+from overwatch.models import Bot, BotTrade
+
+
+def day_start(day):
+    return datetime.datetime.combine(day, datetime.time.min, tzinfo=utc)
+
+
+class BotProfitRollupManager(models.Manager):
+    @staticmethod
+    def get_trades(**filters):
+        """
+        The trades that count towards profit.
+        filters are applied to the bot of the trade, e.g. bot=bot or bot__exchange_account=exchange
+        """
+        return BotTrade.objects.filter(
+            profit_usd__isnull=False, bot_trade=True, **filters
+        )
+
+    def refresh(self, bot, day):
+        """
+        Recalculate the rollup of the bot for the day from its trades
+        """
+        totals = (
+            self.get_trades(bot=bot)
+            .filter(
+                time__gte=day_start(day),
+                time__lt=day_start(day + datetime.timedelta(days=1)),
+            )
+            .aggregate(profit=Sum("profit_usd"), trades=Count("pk"))
+        )
+
+        if not totals["trades"]:
+            self.filter(bot=bot, day=day).delete()
+            return
+
+        try:
+            self.update_or_create(
+                bot=bot,
+                day=day,
+                defaults={
+                    "profit_usd": totals["profit"],
+                    "trade_count": totals["trades"],
+                },
+            )
+        except IntegrityError:
+            # another worker created the same day at the same time
+            self.filter(bot=bot, day=day).update(
+                profit_usd=totals["profit"], trade_count=totals["trades"]
+            )
+
+    def refresh_for_trades(self, trades):
+        """
+        Recalculate the rollups of each (bot, day) the trades fall in
+        """
+        days = {(trade.bot, trade.time.astimezone(utc).date()) for trade in trades}
+
+        for bot, day in days:
+            self.refresh(bot, day)
+
+    def rebuild(self, bot=None):
+        """
+        Rebuild the rollups from scratch. Returns the number of rollups created.
+        Days are truncated in the current time zone, which is UTC
+        """
+        rollups = self.all()
+        trades = self.get_trades()
+
+        if bot is not None:
+            rollups = rollups.filter(bot=bot)
+            trades = trades.filter(bot=bot)
+
+        rollups.delete()
+
+        return len(
+            self.bulk_create(
+                [
+                    self.model(
+                        bot_id=day["bot"],
+                        day=day["day"],
+                        profit_usd=day["profit"],
+                        trade_count=day["trades"],
+                    )
+                    for day in trades.annotate(day=TruncDate("time"))
+                    .values("bot", "day")
+                    .annotate(profit=Sum("profit_usd"), trades=Count("pk"))
+                    .order_by()
+                ],
+                batch_size=1000,
+            )
+        )
+
+    def get_profits_by_bot(self, start, end=None, **filters):
+        """
+        The profit of each bot between start and end (default now) as {bot pk: profit}.
+        Whole days come from the rollups and only the partial days at either end are summed from the trades,
+        so the cost doesn't grow with the length of the window
+        """
+        if end is None:
+            end = now()
+
+        profits = {}
+
+        def add(rows, key, value):
+            for row in rows:
+                profits[row[key]] = profits.get(row[key], 0.0) + (row[value] or 0.0)
+
+        def add_trades(trade_start, trade_end):
+            add(
+                self.get_trades(**filters)
+                .filter(time__gte=trade_start, time__lt=trade_end)
+                .values("bot")
+                .annotate(profit=Sum("profit_usd"))
+                .order_by(),
+                "bot",
+                "profit",
+            )
+
+        first_day = start.astimezone(utc).date()
+
+        if day_start(first_day) < start:
+            first_day += datetime.timedelta(days=1)
+
+        last_day = end.astimezone(utc).date()
+
+        if first_day > last_day:
+            # the window lies within a single day
+            add_trades(start, end)
+            return profits
+
+        if start < day_start(first_day):
+            add_trades(start, day_start(first_day))
+
+        add(
+            self.filter(day__gte=first_day, day__lt=last_day, **filters)
+            .values("bot")
+            .annotate(profit=Sum("profit_usd"))
+            .order_by(),
+            "bot",
+            "profit",
+        )
+
+        if day_start(last_day) < end:
+            add_trades(day_start(last_day), end)
+
+        return profits
+
+    def get_profit(self, start, end=None, **filters):
+        return float(sum(self.get_profits_by_bot(start, end, **filters).values()))
+
+
+class BotProfitRollup(models.Model):
+    """
+    The profit of a bot's valued trades for each (UTC) day
+    """
+
+    bot = models.ForeignKey(
+        Bot, on_delete=models.CASCADE, related_name="profit_rollups"
+    )
+    day = models.DateField(db_index=True)
+    profit_usd = models.FloatField(default=0.0)
+    trade_count = models.IntegerField(default=0)
+
+    objects = BotProfitRollupManager()
+
+    def __str__(self):
+        return "{} {}={:.2f} USD".format(self.bot, self.day, self.profit_usd)
+
+    class Meta:
+        ordering = ["-day"]
+        unique_together = ("bot", "day")
@@ -0,0 +1,72 @@
+import json
+
+from django.db import IntegrityError, models
+
+
+class PriceHistoryManager(models.Manager):
+    def get_closest_to(self, price_url, currency, target, tolerance):
+        """
+        Return the stored price for the currency from the aggregator at price_url closest to target,
+        as long as it lies within tolerance.
+        Returns None if there is no stored price close enough
+        """
+        window = self.filter(
+            price_url=price_url,
+            currency=currency.lower(),
+            time__gte=target - tolerance,
+            time__lte=target + tolerance,
+        )
+
+        closest_greater = window.filter(time__gte=target).order_by("time").first()
+        closest_less = window.filter(time__lt=target).order_by("-time").first()
+
+        if closest_greater is None:
+            return closest_less
+
+        if closest_less is None:
+            return closest_greater
+
+        if closest_greater.time - target > target - closest_less.time:
+            return closest_less
+        else:
+            return closest_greater
+
+    def record(self, price_url, currency, dt, data):
+        """
+        Store the aggregator data for the currency against the minute it was requested for
+        """
+        try:
+            self.update_or_create(
+                price_url=price_url,
+                currency=currency.lower(),
+                time=dt.replace(second=0, microsecond=0),
+                defaults={"data": json.dumps(data)},
+            )
+        except IntegrityError:
+            # another worker stored the same minute at the same time
+            pass
+
+
+class PriceHistory(models.Model):
+    """
+    Local copy of the price-aggregator responses, keyed by aggregator url, currency and minute.
+    Bots can use different aggregators, which don't have to agree on a price
+    """
+
+    price_url = models.URLField(default="")
+    currency = models.CharField(max_length=255)
+    time = models.DateTimeField()
+    data = models.TextField()
+
+    objects = PriceHistoryManager()
+
+    def __str__(self):
+        return "{}@{}".format(self.currency, self.time)
+
+    class Meta:
+        ordering = ["-time"]
+        unique_together = ("price_url", "currency", "time")
+        verbose_name_plural = "price history"
+
+    def get_data(self):
+        return json.loads(self.data)
@@ -34,11 +34,23 @@ class ApiProfile(models.Model):
             hashlib.sha256,
         ).hexdigest()
 
-        # update the last nonce value
-        self.last_nonce = nonce
-        self.save()
-
-        if calculated_hash != supplied_hash:
+        if not hmac.compare_digest(calculated_hash, str(supplied_hash)):
             return False, "supplied hash does not match calculated hash"
 
+        # advance the last nonce in a single conditional update.
+        # if a concurrent request has already used this nonce or a later one nothing is updated
+        updated = (
+            type(self)
+            .objects.filter(pk=self.pk, last_nonce__lt=nonce)
+            .update(last_nonce=nonce)
+        )
+
+        if not updated:
+            return (
+                False,
+                "n parameter needs to be a positive integer and greater than the previous nonce",
+            )
+
+        self.last_nonce = nonce
+
         return True, "authenticated"
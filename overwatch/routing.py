@@ -1,10 +1,21 @@
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter, ChannelNameRouter
+from django.conf import settings
 from django.conf.urls import url
 
 from .consumers import *
 
 
+def valuation_consumer(channel, sync_consumer, async_consumer):
+    """
+    Valuation channels listed in ASYNC_VALUATION_CHANNELS are served by the asyncio consumer
+    """
+    if channel in settings.ASYNC_VALUATION_CHANNELS:
+        return async_consumer
+
+    return sync_consumer
+
+
 application = ProtocolTypeRouter(
     {
         # http->django views is added by default
@@ -20,10 +31,22 @@ application = ProtocolTypeRouter(
         ),
         "channel": ChannelNameRouter(
             {
-                "bot-price": BotPriceConsumer,
-                "bot-balance": BotBalanceConsumer,
-                "bot-order": BotOrderConsumer,
-                "bot-trade": BotTradeConsumer,
+                "bot-price": valuation_consumer(
+                    "bot-price", BotPriceConsumer, AsyncBotPriceConsumer
+                ),
+                "bot-balance": valuation_consumer(
+                    "bot-balance", BotBalanceConsumer, AsyncBotBalanceConsumer
+                ),
+                "bot-order": valuation_consumer(
+                    "bot-order", BotOrderConsumer, AsyncBotOrderConsumer
+                ),
+                "bot-trade": valuation_consumer(
+                    "bot-trade", BotTradeConsumer, AsyncBotTradeConsumer
+                ),
+                "bot-valuation": BotValuationConsumer,
+                "bot-updates": BotUpdateConsumer,
+                "exchange-balances": ExchangeBalancesConsumer,
+                "bot-retention": RetentionConsumer,
                 "cloudwatch-logs": CloudWatchLogsConsumer,
                 "bot-deploy": BotDeployConsumer,
             }
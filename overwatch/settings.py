@@ -171,6 +171,108 @@ BOT_TYPES = [
 ]
 BOT_PREFIX = ""
 
+# the rolling 24 hour profit held in BotLatestState is recalculated once older than this (seconds)
+BOT_STATE_PROFIT_MAX_AGE = 300
+
+# USD valuation
+# pending rows are valued in batches and each distinct (currency, time bucket) price is fetched once
+VALUATION_BATCH_SIZE = 500
+VALUATION_BUCKET_MINUTES = 5
+# A valuation run claims its batch for VALUATION_CLAIM_SECONDS so concurrent runs value different rows.
+# Rows that can't be valued are retried after VALUATION_RETRY_SECONDS, doubling with each attempt
+# up to VALUATION_RETRY_MAX_SECONDS.
+# A saved row only queues a valuation run if no pending row of its bot from the last VALUATION_QUEUE_SECONDS
+# is still waiting for one
+VALUATION_CLAIM_SECONDS = 5 * 60
+VALUATION_RETRY_SECONDS = 60
+VALUATION_RETRY_MAX_SECONDS = 6 * 60 * 60
+VALUATION_QUEUE_SECONDS = 60
+# valuation channels (bot-price, bot-balance, bot-order, bot-trade) listed here use the asyncio consumers.
+# Their blocking network and ORM work runs in a thread pool of VALUATION_THREAD_POOL_SIZE threads
+ASYNC_VALUATION_CHANNELS = []
+VALUATION_THREAD_POOL_SIZE = 20
+
+# Price aggregator responses are stored locally in PriceHistory.
+# A stored price within the tolerance of a requested time is served without contacting the aggregator.
+# While the aggregator is failing, a stored price within the fallback window is used instead
+PRICE_CACHE_TOLERANCE_MINUTES = 5
+PRICE_CACHE_FALLBACK_MINUTES = 60
+
+# Price aggregator HTTP client.
+# Timeout is (connect, read) seconds for each attempt and a call gives up retrying after DEADLINE seconds.
+# Backoff values are the base and cap of the jittered retry delay in seconds.
+# After CIRCUIT_FAILURES consecutive failed calls requests fail fast for CIRCUIT_COOL_DOWN seconds
+PRICE_AGGREGATOR_TIMEOUT = (3.05, 10)
+PRICE_AGGREGATOR_POOL_SIZE = 10
+PRICE_AGGREGATOR_MAX_CONCURRENCY = 10
+PRICE_AGGREGATOR_RETRIES = 3
+PRICE_AGGREGATOR_DEADLINE = 20
+PRICE_AGGREGATOR_BACKOFF = 0.5
+PRICE_AGGREGATOR_BACKOFF_MAX = 8
+PRICE_AGGREGATOR_CIRCUIT_FAILURES = 5
+PRICE_AGGREGATOR_CIRCUIT_COOL_DOWN = 60
+
+# Rendered charts are cached against the bot data version for up to CHART_CACHE_SECONDS
+# and redrawn at least every CHART_TIME_BUCKET_SECONDS as their time window moves on.
+# Price movements used to adjust the trades chart are refreshed from the aggregator every PRICE_MOVEMENT_CACHE_SECONDS
+CHART_CACHE_SECONDS = 60 * 60
+CHART_TIME_BUCKET_SECONDS = 5 * 60
+PRICE_MOVEMENT_CACHE_SECONDS = 15 * 60
+
+# The bot DataTables serve at most DATA_TABLES_MAX_LENGTH rows a page.
+# Their row counts are cached for DATA_TABLES_COUNT_SECONDS and the count of a search stops at DATA_TABLES_COUNT_LIMIT.
+# Where each page ends is kept for DATA_TABLES_PAGE_SECONDS so the next page can seek to it
+DATA_TABLES_MAX_LENGTH = 100
+DATA_TABLES_COUNT_SECONDS = 60
+DATA_TABLES_COUNT_LIMIT = 10000
+DATA_TABLES_PAGE_SECONDS = 10 * 60
+
+# The balances chart shows the average balance in buckets of BALANCE_CHART_BUCKET_HOURS over BALANCE_CHART_DAYS
+BALANCE_CHART_DAYS = 30
+BALANCE_CHART_BUCKET_HOURS = 6
+
+# API requests find their bot from a cached copy of its identity (pk, name, secret and last nonce),
+# cleared when the bot is saved. Configure a shared CACHES backend to clear it in every process;
+# until then a stale copy is only slower, as requests are still checked against the bot row
+BOT_IDENTITY_CACHE_SECONDS = 60 * 60
+
+# Each bot keeps its latest HEARTBEAT_HISTORY heartbeats.
+# A heartbeat fetches the bot logs at most once every HEARTBEAT_LOGS_SECONDS.
+# Keep it below the shortest bot schedule (1 minute) so the logs of every run are fetched
+HEARTBEAT_HISTORY = 15
+HEARTBEAT_LOGS_SECONDS = 45
+
+# Websocket updates announced for a bot within BOT_UPDATE_COALESCE_SECONDS are merged and rendered once
+BOT_UPDATE_COALESCE_SECONDS = 1
+
+# Exchange account clients are long lived and time out after EXCHANGE_TIMEOUT seconds.
+# Requests to several exchanges run concurrently in EXCHANGE_THREAD_POOL_SIZE threads.
+# Account balances are cached for EXCHANGE_BALANCE_CACHE_SECONDS
+EXCHANGE_TIMEOUT = 10
+EXCHANGE_THREAD_POOL_SIZE = 10
+EXCHANGE_BALANCE_CACHE_SECONDS = 30
+# Exchange market metadata is cached in memory and in EXCHANGE_MARKETS_CACHE_DIR for EXCHANGE_MARKETS_CACHE_SECONDS
+EXCHANGE_MARKETS_CACHE_DIR = os.path.join(BASE_DIR, "cache", "markets")
+EXCHANGE_MARKETS_CACHE_SECONDS = 6 * 60 * 60
+
+# Telemetry older than RETENTION_POLICIES[table]["days"] is removed in batches of RETENTION_BATCH_SIZE,
+# after being written to RETENTION_ARCHIVE_DIR if "archive" is set
+# and summarised into hourly or daily BotDataRollups if "rollup" is "hour" or "day".
+# Tables without a policy are kept forever.
+# A heartbeat queues a retention run at most every RETENTION_INTERVAL_SECONDS,
+# which removes up to RETENTION_MAX_BATCHES batches of each table before queueing itself again
+RETENTION_POLICIES = {
+    "prices": {"days": 90, "rollup": "hour", "archive": True},
+    "balances": {"days": 90, "rollup": "hour", "archive": True},
+    "placed_orders": {"days": 30, "rollup": "hour", "archive": True},
+    "heartbeats": {"days": 30, "rollup": None, "archive": False},
+    "errors": {"days": 90, "rollup": "day", "archive": True},
+}
+RETENTION_ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+RETENTION_BATCH_SIZE = 1000
+RETENTION_MAX_BATCHES = 10
+RETENTION_INTERVAL_SECONDS = 60 * 60
+
 # Load local_settings
 try:
     from overwatch.local_settings import *  # noqa
@@ -1,26 +1,24 @@
-import ccxt
 from django.core.exceptions import ValidationError
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 
 from overwatch.models import Bot
+from overwatch.utils.exchange_clients import get_markets
 
 
 @receiver(pre_save, sender=Bot)
 def check_currencies(sender, instance, **kwargs):
     # we should make sure this pair exists at the exchange
 
-    exchange = getattr(ccxt, instance.exchange)()
-
-    for market in exchange.fetch_markets():
+    for market in get_markets(instance.exchange_account.exchange):
         if (
-            market["base"].upper() == instance.base.upper
+            market["base"].upper() == instance.base.upper()
             and market["quote"].upper() == instance.quote.upper()
         ):
             return
 
         if (
-            market["base"].upper() == instance.quote.upper
+            market["base"].upper() == instance.quote.upper()
             and market["quote"].upper() == instance.base.upper()
         ):
             # raise ValidationError(
@@ -0,0 +1,74 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from overwatch.utils.aggregator_client import AggregatorClient, CircuitOpenError
+
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+@override_settings(
+    PRICE_AGGREGATOR_RETRIES=2,
+    PRICE_AGGREGATOR_BACKOFF=0,
+    PRICE_AGGREGATOR_CIRCUIT_FAILURES=3,
+    PRICE_AGGREGATOR_CIRCUIT_COOL_DOWN=60,
+)
+class TestAggregatorClient(SimpleTestCase):
+    def setUp(self):
+        self.client = AggregatorClient()
+
+    def test_retries_temporary_failures(self):
+        with mock.patch.object(
+            self.client.session,
+            "get",
+            side_effect=[requests.ConnectionError(), make_response(200)],
+        ) as get:
+            r = self.client.get("https://aggregator/price/btc")
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(self.client.stats()["retries"], 1)
+
+    def test_does_not_retry_not_found(self):
+        with mock.patch.object(
+            self.client.session, "get", return_value=make_response(404)
+        ) as get:
+            r = self.client.get("https://aggregator/price/xyz")
+
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(get.call_count, 1)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        with mock.patch.object(
+            self.client.session, "get", return_value=make_response(503)
+        ) as get:
+            for _ in range(3):
+                r = self.client.get("https://aggregator/price/btc")
+                self.assertEqual(r.status_code, 503)
+
+            with self.assertRaises(CircuitOpenError):
+                self.client.get("https://aggregator/price/btc")
+
+        # each call made every attempt but counted as a single failure
+        self.assertEqual(get.call_count, 9)
+        self.assertEqual(self.client.stats()["errors"], 3)
+        self.assertTrue(self.client.stats()["circuit_open"])
+
+    @override_settings(PRICE_AGGREGATOR_DEADLINE=1, PRICE_AGGREGATOR_TIMEOUT=(3.05, 10))
+    def test_retries_stop_at_the_deadline(self):
+        with mock.patch.object(
+            self.client.session, "get", side_effect=requests.ConnectionError()
+        ) as get, mock.patch.object(self.client, "_backoff", return_value=5):
+            with self.assertRaises(requests.ConnectionError):
+                self.client.get("https://aggregator/price/btc")
+
+        # the attempt's timeout is cut to the deadline and there is no time left to retry
+        self.assertEqual(get.call_count, 1)
+        connect_timeout, read_timeout = get.call_args[1]["timeout"]
+        self.assertLessEqual(connect_timeout, 1)
+        self.assertLessEqual(read_timeout, 1)
@@ -1,6 +1,138 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import uuid
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from overwatch.models import ApiProfile, Bot, BotHeartBeat
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
 
 
 class TestBot(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+
+        cache.clear()
+
+    def get_hash(self, nonce):
+        return hmac.new(
+            self.bot.api_secret.bytes,
+            "{}{}{}".format("btc-usnbt", "bittrex", nonce).encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
     def test_bot_serialize(self):
         self.assertTrue(True)
+
+    def test_auth(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.bot.auth(self.get_hash(10), "btc-usnbt", "bittrex", 10),
+                (True, "authenticated"),
+            )
+
+        self.bot.refresh_from_db()
+        self.assertEqual(self.bot.last_nonce, 10)
+
+    def test_auth_bad_hash_does_not_write(self):
+        with self.assertNumQueries(0):
+            success, reason = self.bot.auth("bad", "btc-usnbt", "bittrex", 10)
+
+        self.assertFalse(success)
+        self.bot.refresh_from_db()
+        self.assertEqual(self.bot.last_nonce, 0)
+
+    def test_auth_nonce_used_concurrently(self):
+        # another request has used the nonce since this instance was loaded
+        stale_bot = Bot.objects.get(pk=self.bot.pk)
+        self.assertTrue(self.bot.auth(self.get_hash(10), "btc-usnbt", "bittrex", 10)[0])
+
+        self.assertFalse(
+            stale_bot.auth(self.get_hash(10), "btc-usnbt", "bittrex", 10)[0]
+        )
+
+    def test_lookup_key(self):
+        self.assertEqual(self.bot.lookup_key, "btc-usnbt@bittrex")
+
+        self.bot.exchange_account.exchange = "binance"
+        self.bot.exchange_account.save()
+
+        self.bot.refresh_from_db()
+        self.assertEqual(self.bot.lookup_key, "btc-usnbt@binance")
+
+        self.bot.exchange_account.delete()
+
+        self.bot.refresh_from_db()
+        self.assertEqual(self.bot.lookup_key, "")
+
+    def test_get_for_api(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Bot.objects.get_for_api("BTC-USNBT", "Bittrex"), self.bot)
+
+        with self.assertNumQueries(0):
+            bot = Bot.objects.get_for_api("btc-usnbt", "bittrex")
+            self.assertEqual(bot.pk, self.bot.pk)
+            self.assertEqual(bot.api_secret, self.bot.api_secret)
+
+        # config isn't cached, it is loaded from the row
+        Bot.objects.filter(pk=self.bot.pk).update(order_amount=20)
+        self.assertEqual(bot.order_amount, 20)
+
+        with self.assertRaises(Bot.DoesNotExist):
+            Bot.objects.get_for_api("btc-usnbt", "binance")
+
+    def test_stale_cached_secret_is_rejected(self):
+        Bot.objects.get_for_api("btc-usnbt", "bittrex")
+
+        # the secret is changed in another process, which can't clear this one's cache
+        Bot.objects.filter(pk=self.bot.pk).update(api_secret=uuid.uuid4())
+
+        bot = Bot.objects.get_for_api("btc-usnbt", "bittrex")
+        self.assertFalse(bot.auth(self.get_hash(10), "btc-usnbt", "bittrex", 10)[0])
+
+        # the stale copy is dropped
+        with self.assertNumQueries(1):
+            Bot.objects.get_for_api("btc-usnbt", "bittrex")
+
+    def test_get_for_api_cleared_on_save(self):
+        Bot.objects.get_for_api("btc-usnbt", "bittrex")
+
+        self.bot.name = "btc-nbt"
+        self.bot.save()
+
+        with self.assertRaises(Bot.DoesNotExist):
+            Bot.objects.get_for_api("btc-usnbt", "bittrex")
+
+        self.assertEqual(Bot.objects.get_for_api("btc-nbt", "bittrex"), self.bot)
+
+    @override_settings(
+        CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, HEARTBEAT_HISTORY=3,
+    )
+    def test_heartbeats_are_capped(self):
+        heartbeats = [BotHeartBeat.objects.create(bot=self.bot) for _ in range(5)]
+
+        self.assertEqual(self.bot.botheartbeat_set.count(), 3)
+        # the oldest rows were reused
+        self.assertEqual(
+            {heartbeat.pk for heartbeat in heartbeats},
+            set(self.bot.botheartbeat_set.values_list("pk", flat=True)),
+        )
+        self.assertEqual(self.bot.botheartbeat_set.first().time, heartbeats[-1].time)
+
+        self.bot.refresh_state()
+        self.assertEqual(self.bot.state.last_heartbeat, heartbeats[-1].time)
+
+
+class TestApiProfile(TestCase):
+    def test_auth(self):
+        api_profile = ApiProfile.objects.create()
+        supplied_hash = hmac.new(
+            api_profile.api_secret.bytes,
+            "{}{}".format(api_profile.api_user.hex, 5).encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
+        self.assertFalse(api_profile.auth("bad", 5)[0])
+        self.assertTrue(api_profile.auth(supplied_hash, 5)[0])
+        self.assertFalse(api_profile.auth(supplied_hash, 5)[0])
@@ -0,0 +1,221 @@
+import hashlib
+import hmac
+import json
+import time
+
+from django.test import TestCase, override_settings
+
+from overwatch.models import (
+    Bot,
+    BotBalance,
+    BotPlacedOrder,
+    BotPrice,
+    BotTrade,
+    Exchange,
+)
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BotApiTestCase(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+
+    def sign(self, data):
+        # nonces have to increase, even for requests sent within the same millisecond
+        nonce = self.nonce = max(int(time.time() * 1000), getattr(self, "nonce", 0) + 1)
+        data.update(
+            {
+                "name": self.bot.name,
+                "exchange": "bittrex",
+                "n": nonce,
+                "h": hmac.new(
+                    self.bot.api_secret.bytes,
+                    "{}{}{}".format(self.bot.name, "bittrex", nonce).encode("utf-8"),
+                    hashlib.sha256,
+                ).hexdigest(),
+            }
+        )
+        return data
+
+
+class TestBotApiBatch(BotApiTestCase):
+    def post_batch(self, batch):
+        return self.client.post(
+            "/bot/batch",
+            data=json.dumps(self.sign(batch)),
+            content_type="application/json",
+        )
+
+    def test_batch(self):
+        trade = {
+            "trade_time": "2020-01-01T12:00:00Z",
+            "trade_id": "1",
+            "trade_type": "buy",
+            "price": 1,
+            "amount": 1,
+            "total": 1,
+            "age": 0,
+        }
+        batch = {
+            "prices": [
+                {
+                    "price": 1,
+                    "bid_price": 0.9,
+                    "ask_price": 1.1,
+                    "market_price": 1,
+                    "base_price": 1,
+                    "quote_price": 1,
+                }
+            ],
+            "balances": [
+                {
+                    "bid_available": 1,
+                    "ask_available": 1,
+                    "bid_on_order": 1,
+                    "ask_on_order": 1,
+                    "unit": "NBT",
+                }
+            ],
+            "placed_orders": [
+                {
+                    "base": "USNBT",
+                    "quote": "BTC",
+                    "order_type": "buy",
+                    "price": 1,
+                    "amount": 1,
+                }
+            ],
+            "trades": [trade],
+        }
+
+        response = self.post_batch(batch)
+
+        self.assertEqual(
+            response.json(),
+            {
+                "success": True,
+                "created": {
+                    "prices": 1,
+                    "balances": 1,
+                    "placed_orders": 1,
+                    "trades": 1,
+                },
+            },
+        )
+        self.assertEqual(BotPrice.objects.filter(bot=self.bot).count(), 1)
+        self.assertEqual(BotBalance.objects.get(bot=self.bot).unit, "USNBT")
+        self.assertEqual(BotPlacedOrder.objects.filter(bot=self.bot).count(), 1)
+        self.assertEqual(self.bot.last_balance, BotBalance.objects.get(bot=self.bot))
+
+        # bulk_create skips save() so the view bumps the table versions itself
+        self.bot.refresh_state()
+        self.assertEqual(self.bot.state.placed_orders_version, 1)
+        self.assertEqual(self.bot.state.trades_version, 1)
+
+        # trades that were already reported are skipped
+        response = self.post_batch({"trades": [trade]})
+        self.assertEqual(response.json()["created"]["trades"], 0)
+        self.assertEqual(BotTrade.objects.filter(bot=self.bot).count(), 1)
+
+    def test_batch_missing_key(self):
+        response = self.post_batch({"prices": [{"price": 1}]})
+
+        self.assertFalse(response.json()["success"])
+        self.assertFalse(BotPrice.objects.exists())
+
+    def test_batch_rows_keep_their_time_and_are_sent_once(self):
+        recorded = "2020-01-01T12:00:00.123456+00:00"
+        batch = {
+            "placed_orders": [
+                {
+                    "base": "USNBT",
+                    "quote": "BTC",
+                    "order_type": "buy",
+                    "price": 1,
+                    "amount": 1,
+                    "time": recorded,
+                }
+            ],
+        }
+
+        response = self.post_batch(json.loads(json.dumps(batch)))
+        self.assertEqual(response.json()["created"]["placed_orders"], 1)
+        self.assertEqual(
+            BotPlacedOrder.objects.get(bot=self.bot).time.isoformat(), recorded
+        )
+
+        # a batch sent again after a lost response isn't stored twice
+        response = self.post_batch(batch)
+        self.assertEqual(response.json()["created"]["placed_orders"], 0)
+        self.assertEqual(BotPlacedOrder.objects.filter(bot=self.bot).count(), 1)
+
+    def test_batch_invalid_time(self):
+        response = self.post_batch(
+            {
+                "placed_orders": [
+                    {
+                        "base": "USNBT",
+                        "quote": "BTC",
+                        "order_type": "buy",
+                        "price": 1,
+                        "amount": 1,
+                        "time": "yesterday",
+                    }
+                ]
+            }
+        )
+
+        self.assertFalse(response.json()["success"])
+        self.assertFalse(BotPlacedOrder.objects.exists())
+
+
+class TestBotApiConfig(BotApiTestCase):
+    def get_config(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get("/bot/config", self.sign({}), **headers)
+
+    def test_unchanged_config_is_not_modified(self):
+        response = self.get_config()
+        etag = response["ETag"]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["market"], "USNBT/BTC")
+
+        response = self.get_config(etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        # saving without changing the config keeps the ETag
+        self.bot.last_nonce = self.nonce
+        self.bot.save()
+        self.assertEqual(self.get_config(etag).status_code, 304)
+
+        self.bot.order_amount = 20
+        self.bot.save()
+        response = self.get_config(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["order_amount"], 20)
+
+    def test_exchange_change_changes_the_etag(self):
+        etag = self.get_config()["ETag"]
+
+        Exchange.objects.filter(pk=self.bot.exchange_account.pk).update(
+            exchange="binance"
+        )
+        self.bot.exchange_account.refresh_from_db()
+        self.bot.exchange_account.save()
+
+        self.bot.refresh_from_db()
+        self.assertNotEqual('"{}"'.format(self.bot.config_etag), etag)
+
+    def test_config_etag_is_set_for_bots_saved_before_it(self):
+        Bot.objects.filter(pk=self.bot.pk).update(config_etag="")
+
+        response = self.get_config()
+
+        self.bot.refresh_from_db()
+        self.assertEqual(response["ETag"], '"{}"'.format(self.bot.config_etag))
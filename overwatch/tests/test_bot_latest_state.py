@@ -0,0 +1,53 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from overwatch.models import Bot, BotBalance, BotHeartBeat, BotLatestState, BotPrice
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestBotLatestState(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+
+    def test_state_is_built_on_first_access(self):
+        self.assertFalse(BotLatestState.objects.filter(bot=self.bot).exists())
+        self.assertIsNone(self.bot.last_price)
+        self.assertEqual(self.bot.latest_heartbeat, "")
+        self.assertTrue(BotLatestState.objects.filter(bot=self.bot).exists())
+
+    def test_state_is_maintained_on_write(self):
+        heartbeat = BotHeartBeat.objects.create(bot=self.bot)
+        BotPrice.objects.create(bot=self.bot, price=1, updated=False)
+        bot_price = BotPrice.objects.create(
+            bot=self.bot, price=2, price_usd=20, updated=True
+        )
+        bot_balance = BotBalance.objects.create(
+            bot=self.bot,
+            bid_available=1,
+            ask_available=1,
+            bid_on_order=1,
+            ask_on_order=1,
+            updated=True,
+        )
+
+        bot = Bot.objects.with_state().get(pk=self.bot.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(bot.last_price, bot_price)
+            self.assertEqual(bot.last_balance, bot_balance)
+            self.assertEqual(bot.latest_heartbeat, heartbeat.time)
+
+    def test_state_does_not_move_backwards(self):
+        heartbeat = BotHeartBeat.objects.create(bot=self.bot)
+        older = BotHeartBeat(bot=self.bot, time=heartbeat.time.replace(year=2000))
+
+        BotLatestState.objects.record_heartbeat(older)
+
+        self.assertEqual(
+            BotLatestState.objects.get(bot=self.bot).last_heartbeat, heartbeat.time
+        )
+
+    def test_benchmark_bot_rendering(self):
+        BotPrice.objects.create(bot=self.bot, price=2, price_usd=20, updated=True)
+        call_command("benchmark_bot_rendering", iterations=2)
@@ -0,0 +1,74 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils.timezone import utc
+
+from overwatch.models import BotProfitRollup, BotTrade
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestBotProfitRollup(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+        self.exchange_account = self.bot.exchange_account
+        self.now = datetime.datetime(2020, 1, 10, 12, tzinfo=utc)
+
+        # one trade every 6 hours for 5 days, each with a profit of 1 USD
+        for hours in range(0, 120, 6):
+            BotTrade.objects.create(
+                bot=self.bot,
+                time=self.now - datetime.timedelta(hours=hours),
+                trade_id=str(hours),
+                trade_type="buy",
+                price=1,
+                amount=1,
+                total=1,
+                profit_usd=1,
+                updated=True,
+            )
+
+        BotProfitRollup.objects.rebuild()
+
+    def test_rebuild(self):
+        self.assertEqual(BotProfitRollup.objects.count(), 6)
+        self.assertEqual(
+            sum(BotProfitRollup.objects.values_list("trade_count", flat=True)), 20
+        )
+
+    def test_window_profit_matches_trades(self):
+        for hours in [1, 7, 24, 36, 72, 200]:
+            start = self.now - datetime.timedelta(hours=hours)
+            self.assertEqual(
+                BotProfitRollup.objects.get_profit(start, self.now, bot=self.bot),
+                BotTrade.objects.filter(time__gte=start, time__lt=self.now).count(),
+            )
+
+    def test_exchange_profit(self):
+        with mock.patch("overwatch.models.accounts.now", return_value=self.now):
+            self.assertEqual(self.exchange_account.total_profit(days=2), 9)
+            self.assertEqual(
+                self.exchange_account.most_profitable_bot(days=2), (self.bot, 9)
+            )
+
+    def test_saved_and_deleted_trades_update_rollups(self):
+        day = (self.now + datetime.timedelta(days=1)).date()
+        trade = BotTrade.objects.create(
+            bot=self.bot,
+            time=self.now + datetime.timedelta(days=1),
+            trade_id="imported",
+            trade_type="sell",
+            price=1,
+            amount=1,
+            total=1,
+            profit_usd=2,
+            updated=True,
+        )
+
+        rollup = BotProfitRollup.objects.get(bot=self.bot, day=day)
+        self.assertEqual((rollup.profit_usd, rollup.trade_count), (2, 1))
+
+        trade.delete()
+
+        self.assertFalse(BotProfitRollup.objects.filter(bot=self.bot, day=day).exists())
@@ -0,0 +1,160 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from overwatch.consumers import BotConsumer, BotUpdateConsumer
+from overwatch.models import BotPrice
+from overwatch.utils import bot_updates
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, BOT_UPDATE_COALESCE_SECONDS=0,
+)
+class TestBotUpdates(TransactionTestCase):
+    def setUp(self):
+        self.bot = create_bot()
+        BotPrice.objects.create(bot=self.bot, price=2, price_usd=20, updated=True)
+
+    def test_updates_are_coalesced(self):
+        channel_layer = get_channel_layer()
+        consumer = BotUpdateConsumer({"type": "channel"})
+        consumer.channel_layer = channel_layer
+
+        async def run():
+            list_channel = await channel_layer.new_channel()
+            bot_channel = await channel_layer.new_channel()
+            await channel_layer.group_add("bot_list", list_channel)
+            await channel_layer.group_add("bot_{}".format(self.bot.pk), bot_channel)
+
+            for _ in range(3):
+                await consumer.bot_changed(
+                    {
+                        "bot_pk": self.bot.pk,
+                        "updates": [bot_updates.BOT_LIST, bot_updates.PRICE_INFO],
+                    }
+                )
+
+            await consumer.flush_task
+
+            received = {
+                "list": await channel_layer.receive(list_channel),
+                "bot": await channel_layer.receive(bot_channel),
+            }
+
+            # one message for each group, whatever the number of changes
+            for channel in [list_channel, bot_channel]:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(channel_layer.receive(channel), 0.1)
+
+            return received
+
+        received = async_to_sync(run)()
+
+        self.assertEqual(received["list"]["type"], "send.rendered")
+        self.assertEqual(
+            json.loads(received["list"]["messages"][0])["bot"], self.bot.pk
+        )
+        self.assertEqual(
+            [message["message_type"] for message in received["bot"]["messages"]],
+            ["price_info"],
+        )
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, BOT_UPDATE_COALESCE_SECONDS=0,
+)
+@mock.patch("overwatch.consumers.bot_updates.render_updates", return_value={})
+class TestBotUpdateConsumer(SimpleTestCase):
+    def setUp(self):
+        self.consumer = BotUpdateConsumer({"type": "channel"})
+        self.consumer.channel_layer = get_channel_layer()
+
+        # render_updates is mocked so no database connection is needed
+        patcher = mock.patch(
+            "overwatch.consumers.bot_updates.database_sync_to_async", sync_to_async
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def announce(self, *updates):
+        async def run():
+            await self.consumer.bot_changed({"bot_pk": 1, "updates": updates})
+            await self.consumer.flush_task
+
+        async_to_sync(run)()
+
+    def test_unwatched_updates_are_not_rendered(self, render_updates):
+        async_to_sync(self.consumer.bot_watched)(
+            {"group": "bot_1", "channel": "page", "watching": True}
+        )
+        async_to_sync(self.consumer.bot_watched)(
+            {"group": "bot_1", "channel": "page", "watching": False}
+        )
+        async_to_sync(self.consumer.bot_watched)(
+            {"group": "bot_list", "channel": "list", "watching": True}
+        )
+
+        self.announce(bot_updates.PRICE_INFO, bot_updates.BOT_LIST)
+        render_updates.assert_called_once_with(1, {bot_updates.BOT_LIST})
+
+        self.announce(bot_updates.PRICE_INFO)
+        render_updates.assert_called_once()
+
+    def test_changes_announced_during_a_flush_are_flushed(self, render_updates):
+        def announce_during_render(bot_pk, updates):
+            if render_updates.call_count == 1:
+                self.consumer.pending[bot_pk] = {bot_updates.HEART_BEATS}
+
+            return {}
+
+        render_updates.side_effect = announce_during_render
+
+        self.announce(bot_updates.PRICE_INFO)
+
+        self.assertEqual(
+            [call[0][1] for call in render_updates.call_args_list],
+            [{bot_updates.PRICE_INFO}, {bot_updates.HEART_BEATS}],
+        )
+
+
+class TestBotConsumerDeltas(SimpleTestCase):
+    def setUp(self):
+        self.consumer = BotConsumer({"type": "websocket"})
+        self.consumer.sent = {}
+        self.sent = []
+        self.consumer.send = lambda text_data: self.sent.append(json.loads(text_data))
+
+    def test_only_changes_are_sent(self):
+        message = {"message_type": "price_info", "version": 1, "price": "1", "bid": "2"}
+
+        self.consumer.send_messages([message])
+        self.consumer.send_messages([message])
+        self.consumer.send_messages([dict(message, version=2, price="3")])
+
+        self.assertEqual(
+            self.sent,
+            [message, {"message_type": "price_info", "version": 2, "price": "3"}],
+        )
+
+    def test_only_new_heartbeats_are_sent(self):
+        # as held by the page when it reconnected
+        self.consumer.sent = {"price_info": {"version": 1}}
+        self.consumer.heartbeat_time = "2020-01-02"
+
+        self.consumer.send_messages(
+            [
+                {"message_type": "price_info", "version": 1, "price": "1"},
+                {"message_type": "heartbeat", "time": "2020-01-01", "heartbeat": ""},
+                {"message_type": "heartbeat", "time": "2020-01-03", "heartbeat": ""},
+            ]
+        )
+
+        self.assertEqual(
+            self.sent,
+            [{"message_type": "heartbeat", "time": "2020-01-03", "heartbeat": ""}],
+        )
@@ -0,0 +1,139 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils.timezone import utc
+
+from overwatch.models import Bot, BotBalance, BotPlacedOrder, BotTrade
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+    BALANCE_CHART_DAYS=30,
+    BALANCE_CHART_BUCKET_HOURS=6,
+)
+@mock.patch("overwatch.models.bot.get_cached_price_movement", return_value=None)
+class TestCharts(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.bot = create_bot()
+
+        for trade_id, trade_type in enumerate(["buy", "sell", "buy"]):
+            BotTrade.objects.create(
+                bot=self.bot,
+                trade_id=str(trade_id),
+                trade_type=trade_type,
+                price=1,
+                amount=1,
+                total=1,
+                profit_usd=1,
+                updated=True,
+            )
+
+    def test_trades_chart_is_one_query(self, get_cached_price_movement):
+        with self.assertNumQueries(1):
+            self.bot.render_trades_chart([1, 3, 7, 14, 30])
+
+    def test_trades_chart_is_cached(self, get_cached_price_movement):
+        chart = self.bot.get_trades_chart()
+
+        with mock.patch.object(Bot, "render_trades_chart") as render_trades_chart:
+            self.assertEqual(self.bot.get_trades_chart(), chart)
+            render_trades_chart.assert_not_called()
+
+    def test_chart_cache_is_invalidated_by_new_data(self, get_cached_price_movement):
+        self.bot.get_balances_chart()
+
+        BotBalance.objects.create(
+            bot=self.bot,
+            bid_available=1,
+            ask_available=1,
+            bid_on_order=1,
+            ask_on_order=1,
+            bid_available_usd=1,
+            ask_available_usd=1,
+            bid_on_order_usd=1,
+            ask_on_order_usd=1,
+            updated=True,
+        )
+        self.bot.refresh_state()
+
+        with mock.patch.object(
+            Bot, "render_balances_chart", return_value="chart"
+        ) as render_balances_chart:
+            self.assertEqual(self.bot.get_balances_chart(), "chart")
+            self.assertEqual(self.bot.get_balances_chart(), "chart")
+            render_balances_chart.assert_called_once_with(30, 6)
+
+    def test_inserted_rows_bump_versions(self, get_cached_price_movement):
+        self.bot.refresh_state()
+        trades_version = self.bot.state.trades_version
+        placed_orders_version = self.bot.state.placed_orders_version
+
+        # unvalued rows already show in the tables so they count as new data
+        BotTrade.objects.create(
+            bot=self.bot, trade_id="new", trade_type="buy", price=1, amount=1, total=1,
+        )
+        BotPlacedOrder.objects.create(
+            bot=self.bot,
+            base="btc",
+            quote="usnbt",
+            order_type="buy",
+            price=1,
+            amount=1,
+        )
+        self.bot.refresh_state()
+
+        self.assertEqual(self.bot.state.trades_version, trades_version + 1)
+        self.assertEqual(
+            self.bot.state.placed_orders_version, placed_orders_version + 1
+        )
+
+    @override_settings(CHART_TIME_BUCKET_SECONDS=300)
+    def test_chart_cache_expires_with_time_bucket(self, get_cached_price_movement):
+        with mock.patch("overwatch.utils.chart_cache.time.time", return_value=600):
+            self.bot.get_placed_orders_chart()
+
+        with mock.patch.object(
+            Bot, "render_placed_orders_chart", return_value="chart"
+        ) as render_placed_orders_chart:
+            with mock.patch("overwatch.utils.chart_cache.time.time", return_value=899):
+                self.assertNotEqual(self.bot.get_placed_orders_chart(), "chart")
+
+            with mock.patch("overwatch.utils.chart_cache.time.time", return_value=900):
+                self.assertEqual(self.bot.get_placed_orders_chart(), "chart")
+
+            render_placed_orders_chart.assert_called_once_with(48)
+
+    def test_balance_history_is_bucketed(self, get_cached_price_movement):
+        bucket = datetime.datetime(2020, 1, 1, 6, tzinfo=utc)
+
+        for minutes, usd in [(0, 1), (90, 3), (200, None), (400, 10)]:
+            balance = BotBalance.objects.create(
+                bot=self.bot,
+                bid_available=1,
+                ask_available=1,
+                bid_on_order=1,
+                ask_on_order=1,
+                bid_available_usd=usd,
+                ask_available_usd=usd,
+                bid_on_order_usd=usd,
+                ask_on_order_usd=0,
+                updated=True,
+            )
+            BotBalance.objects.filter(pk=balance.pk).update(
+                time=bucket + datetime.timedelta(minutes=minutes)
+            )
+
+        with mock.patch(
+            "overwatch.models.bot.now",
+            return_value=bucket + datetime.timedelta(days=1),
+        ):
+            with self.assertNumQueries(1):
+                history = self.bot.get_balance_history(30, 6)
+
+        self.assertEqual(
+            history, [(bucket, 4, 2), (bucket + datetime.timedelta(hours=6), 20, 10),],
+        )
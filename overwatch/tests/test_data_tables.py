@@ -0,0 +1,153 @@
+import datetime
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from overwatch.models import BotError, BotPlacedOrder
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+PLACED_ORDER_COLUMNS = ["time", "order_type", "price", "price_usd", "amount"]
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestDataTables(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+        self.client.force_login(self.bot.owner)
+        cache.clear()
+
+        start = timezone.now() - datetime.timedelta(days=1)
+        self.orders = [
+            BotPlacedOrder.objects.create(
+                bot=self.bot,
+                time=start + datetime.timedelta(minutes=index),
+                base="BTC",
+                quote="USNBT",
+                order_type="buy" if index % 2 else "sell",
+                price=1 + index / 100,
+                price_usd=None,
+                amount=10,
+                updated=True,
+            )
+            for index in range(25)
+        ]
+
+    def get_placed_orders(self, **params):
+        query = {
+            "draw": 1,
+            "start": 0,
+            "length": 10,
+            "order[0][column]": 0,
+            "order[0][dir]": "desc",
+        }
+
+        for index, name in enumerate(PLACED_ORDER_COLUMNS):
+            query["columns[{}][name]".format(index)] = name
+            query["columns[{}][searchable]".format(index)] = "true"
+
+        query.update(params)
+        return self.client.get(
+            reverse("bot_placed_orders_datatables", kwargs={"pk": self.bot.pk}), query
+        ).json()
+
+    def test_pages_follow_on(self):
+        pages = [
+            self.get_placed_orders(start=start)["data"] for start in range(0, 30, 10)
+        ]
+
+        self.assertEqual(
+            [row[2] for page in pages for row in page],
+            [round(order.price, 8) for order in reversed(self.orders)],
+        )
+
+    def test_next_page_seeks_past_the_last_row_served(self):
+        self.get_placed_orders()
+
+        with self.assertNumQueries(4):
+            # the session, the user, the bot with its state and the page. The counts are cached
+            data = self.get_placed_orders(start=10)
+
+        self.assertEqual(data["data"][0][2], round(self.orders[14].price, 8))
+
+    def test_jumping_to_a_page_uses_its_offset(self):
+        data = self.get_placed_orders(start=20)
+
+        self.assertEqual(
+            [row[2] for row in data["data"]],
+            [round(order.price, 8) for order in reversed(self.orders[:5])],
+        )
+
+    def test_ascending_order(self):
+        data = self.get_placed_orders(**{"order[0][column]": 2, "order[0][dir]": "asc"})
+
+        self.assertEqual(data["data"][0][2], round(self.orders[0].price, 8))
+
+    def test_counts(self):
+        data = self.get_placed_orders(**{"search[value]": "sell"})
+
+        self.assertEqual(data["recordsTotal"], 25)
+        self.assertEqual(data["recordsFiltered"], 13)
+        self.assertEqual({row[1] for row in data["data"]}, {"sell"})
+
+    @override_settings(DATA_TABLES_COUNT_LIMIT=5)
+    def test_filtered_count_is_capped(self):
+        data = self.get_placed_orders(**{"search[value]": "buy"})
+
+        self.assertEqual(data["recordsFiltered"], 5)
+
+    def test_number_matches_the_value_shown(self):
+        data = self.get_placed_orders(**{"search[value]": "1.1"})
+
+        # 1.05 to 1.14
+        self.assertEqual(data["recordsFiltered"], 10)
+
+    def test_number_range(self):
+        data = self.get_placed_orders(**{"columns[2][search][value]": "1.2..1.225"})
+
+        self.assertEqual(
+            [row[2] for row in data["data"]], [1.22, 1.21, 1.2],
+        )
+
+    def test_column_searches_all_match(self):
+        data = self.get_placed_orders(
+            **{
+                "columns[1][search][value]": "BUY",
+                "columns[2][search][value]": "1.2..1.225",
+            }
+        )
+
+        self.assertEqual([row[2] for row in data["data"]], [1.21])
+
+    def test_day(self):
+        day = self.orders[-1].time.date()
+        data = self.get_placed_orders(**{"search[value]": day.isoformat()})
+
+        self.assertEqual(
+            data["recordsFiltered"],
+            len([order for order in self.orders if order.time.date() == day]),
+        )
+
+    def test_word_against_numbers_matches_nothing(self):
+        data = self.get_placed_orders(**{"columns[2][search][value]": "abc"})
+
+        self.assertEqual(data["recordsFiltered"], 0)
+        self.assertEqual(data["data"], [])
+
+    def test_error_text_search(self):
+        BotError.objects.create(bot=self.bot, title="Insufficient funds", message="")
+        BotError.objects.create(bot=self.bot, title="Timeout", message="no answer")
+
+        data = self.client.get(
+            reverse("bot_error_datatables", kwargs={"pk": self.bot.pk}),
+            {
+                "columns[0][name]": "time",
+                "columns[1][name]": "title",
+                "columns[2][name]": "message",
+                "search[value]": "FUNDS",
+            },
+        ).json()
+
+        self.assertEqual(data["recordsTotal"], 2)
+        self.assertEqual([row[1] for row in data["data"]], ["Insufficient funds"])
@@ -0,0 +1,202 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import ccxt
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from overwatch.bots.spread_bot.market_cache import MarketCache
+from overwatch.consumers import ExchangeBalancesConsumer
+from overwatch.models import Exchange
+from overwatch.utils import exchange_clients
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS
+
+
+def mock_exchange(exchange_class, exchange_id, markets=None):
+    exchange_class.return_value.id = exchange_id
+    exchange_class.return_value.fetch_markets.return_value = markets or []
+    return exchange_class.return_value
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestExchangeClients(TestCase):
+    def setUp(self):
+        owner = User.objects.create(username="owner")
+        self.exchange_account = Exchange.objects.create(
+            identifier="test", owner=owner, exchange="kraken", key="key", secret="s"
+        )
+        self.failing_account = Exchange.objects.create(
+            identifier="failing", owner=owner, exchange="binance"
+        )
+        cache.clear()
+        exchange_clients._clients.clear()
+        exchange_clients._public_clients.clear()
+        exchange_clients._market_caches.clear()
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        markets_settings = self.settings(EXCHANGE_MARKETS_CACHE_DIR=cache_dir.name)
+        markets_settings.enable()
+        self.addCleanup(markets_settings.disable)
+
+    @mock.patch.object(ccxt, "kraken")
+    def test_clients_are_reused(self, kraken):
+        mock_exchange(kraken, "kraken")
+        client, lock = exchange_clients.get_account_client(self.exchange_account)
+
+        self.assertEqual(
+            exchange_clients.get_account_client(self.exchange_account), (client, lock)
+        )
+        # the account client and the public client the markets are fetched with
+        self.assertEqual(kraken.call_count, 2)
+        # the client isn't left locked after getting its markets
+        self.assertFalse(lock.locked())
+
+        # changed credentials get a new client
+        self.exchange_account.secret = "new"
+        exchange_clients.get_account_client(self.exchange_account)
+        self.assertEqual(kraken.call_count, 3)
+
+    @mock.patch.object(ccxt, "binance")
+    @mock.patch.object(ccxt, "kraken")
+    def test_balances(self, kraken, binance):
+        mock_exchange(kraken, "kraken").fetch_balance.return_value = {
+            "info": {},
+            "BTC": {"used": 1.0, "free": 2.0, "total": 3.0},
+            "total": {"BTC": 3.0},
+        }
+        mock_exchange(
+            binance, "binance"
+        ).fetch_balance.side_effect = ccxt.NetworkError()
+
+        for _ in range(2):
+            balances = dict(
+                exchange_clients.iter_balances(
+                    [self.exchange_account, self.failing_account]
+                )
+            )
+
+            self.assertEqual(
+                balances,
+                {
+                    self.exchange_account: {"BTC": {"used": 1.0, "free": 2.0}},
+                    self.failing_account: None,
+                },
+            )
+
+        # the second fetch was served from the cache
+        kraken.return_value.fetch_balance.assert_called_once()
+
+    @mock.patch.object(ccxt, "binance")
+    @mock.patch.object(ccxt, "kraken")
+    def test_balances_time_out_from_when_they_start(self, kraken, binance):
+        mock_exchange(kraken, "kraken").fetch_balance.side_effect = lambda: time.sleep(
+            0.3
+        )
+        mock_exchange(binance, "binance").fetch_balance.return_value = {
+            "BTC": {"used": 1.0, "free": 2.0}
+        }
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+
+        with mock.patch.object(exchange_clients, "_executor", executor), self.settings(
+            EXCHANGE_TIMEOUT=0.1, EXCHANGE_THREAD_POOL_SIZE=1
+        ):
+            balances = list(
+                exchange_clients.iter_balances(
+                    [self.exchange_account, self.failing_account]
+                )
+            )
+
+        # the second account waited for the only thread for longer than the timeout but still answered
+        self.assertEqual(
+            balances,
+            [
+                (self.exchange_account, None),
+                (self.failing_account, {"BTC": {"used": 1.0, "free": 2.0}}),
+            ],
+        )
+
+    def test_balances_consumer(self):
+        channel_layer = get_channel_layer()
+        consumer = ExchangeBalancesConsumer({"type": "channel"})
+        consumer.channel_layer = channel_layer
+        channel = async_to_sync(channel_layer.new_channel)()
+
+        with mock.patch(
+            "overwatch.consumers.exchange_balances.iter_balances",
+            return_value=[(self.exchange_account, {"BTC": {"used": 1, "free": 2}})],
+        ):
+            consumer.send_balances(
+                {"user": self.exchange_account.owner_id, "channel": channel}
+            )
+
+        # the empty table first, then again once the exchange answered
+        for _ in range(2):
+            message = async_to_sync(channel_layer.receive)(channel)
+            self.assertEqual(message["type"], "send.funds")
+            self.assertEqual(message["message"]["message_type"], "balances")
+
+    @mock.patch.object(ccxt, "kraken")
+    def test_markets(self, kraken):
+        markets = [{"symbol": "BTC/USD", "base": "BTC", "quote": "USD"}]
+        client = mock_exchange(kraken, "kraken", markets)
+
+        self.assertEqual(exchange_clients.get_markets("Kraken"), markets)
+        self.assertEqual(exchange_clients.get_markets("kraken"), markets)
+
+        # account clients are given them
+        exchange_clients.get_account_client(self.exchange_account)
+
+        client.fetch_markets.assert_called_once()
+        client.set_markets.assert_called_once_with(markets)
+
+
+class TestMarketCache(SimpleTestCase):
+    markets = [{"symbol": "BTC/USD", "base": "BTC", "quote": "USD"}]
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        self.fetch_markets = mock.Mock(return_value=self.markets)
+
+    def test_markets_are_read_from_disk(self):
+        MarketCache(self.cache_dir, 60).get_markets("kraken", self.fetch_markets)
+
+        # a new process reads them from disk
+        self.assertEqual(
+            MarketCache(self.cache_dir, 60).get_markets("kraken", self.fetch_markets),
+            self.markets,
+        )
+        self.fetch_markets.assert_called_once()
+
+    def test_expired_markets_are_fetched(self):
+        market_cache = MarketCache(self.cache_dir, 60)
+        market_cache.get_markets("kraken", self.fetch_markets)
+
+        # written before the max age
+        old = time.time() - 120
+        os.utime(market_cache.get_path("kraken"), (old, old))
+
+        MarketCache(self.cache_dir, 60).get_markets("kraken", self.fetch_markets)
+        self.assertEqual(self.fetch_markets.call_count, 2)
+
+    def test_stale_markets_are_used_while_the_exchange_fails(self):
+        MarketCache(self.cache_dir, 60).get_markets("kraken", self.fetch_markets)
+        self.fetch_markets.side_effect = ccxt.NetworkError()
+
+        self.assertEqual(
+            MarketCache(self.cache_dir, 0).get_markets("kraken", self.fetch_markets),
+            self.markets,
+        )
+
+        # with nothing cached the error is raised
+        with self.assertRaises(ccxt.NetworkError):
+            MarketCache(self.cache_dir, 0).get_markets("binance", self.fetch_markets)
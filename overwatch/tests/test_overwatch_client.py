@@ -0,0 +1,76 @@
+import json
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from overwatch.bots.spread_bot.overwatch import Overwatch
+
+API_SECRET = "1e8c5f2c-7c1e-4b9a-8c3c-0e5a8a1d2f3b"
+
+
+def make_response(status_code, data, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(data).encode("utf-8")
+    response.headers.update(headers or {})
+    return response
+
+
+@mock.patch("overwatch.bots.spread_bot.overwatch.requests.post")
+class TestOverwatchClient(SimpleTestCase):
+    def setUp(self):
+        with mock.patch.object(Overwatch, "setup_logging"):
+            self.overwatch = Overwatch(
+                API_SECRET, "btc-usnbt", "bittrex", buffered=True
+            )
+
+        self.overwatch.logger = mock.Mock()
+        self.overwatch.record_price(1, 0.9, 1.1, 1, 1, 1)
+
+    def test_buffered_data_is_timestamped(self, post):
+        self.assertIn("time", self.overwatch.buffer["prices"][0])
+
+    def test_unanswered_batch_is_kept_not_sent_individually(self, post):
+        post.side_effect = requests.Timeout()
+
+        self.assertFalse(self.overwatch.flush())
+
+        # sent twice to the batch endpoint, which skips rows it already holds, and never to /prices
+        self.assertEqual(post.call_count, Overwatch.batch_attempts)
+        for call in post.call_args_list:
+            self.assertTrue(call[1]["url"].endswith("/batch"))
+
+        self.assertEqual(len(self.overwatch.buffer["prices"]), 1)
+
+    def test_rejected_batch_is_sent_individually(self, post):
+        post.side_effect = [
+            make_response(200, {"success": False}),
+            make_response(200, {"success": True}),
+        ]
+
+        self.assertFalse(self.overwatch.flush())
+
+        self.assertTrue(post.call_args_list[1][1]["url"].endswith("/prices"))
+        self.assertEqual(self.overwatch.buffer["prices"], [])
+
+    @mock.patch("overwatch.bots.spread_bot.overwatch.requests.get")
+    def test_unchanged_config_is_not_fetched_again(self, get, post):
+        config = {"market": "USNBT/BTC"}
+        get.side_effect = [
+            make_response(200, config, {"ETag": '"abc"'}),
+            make_response(304, {}),
+            make_response(200, {"market": "NBT/BTC"}, {"ETag": '"def"'}),
+        ]
+
+        self.assertEqual(self.overwatch.get_config(), config)
+        self.assertTrue(self.overwatch.config_changed)
+        self.assertEqual(get.call_args[1]["headers"], {})
+
+        self.assertEqual(self.overwatch.get_config(), config)
+        self.assertFalse(self.overwatch.config_changed)
+        self.assertEqual(get.call_args[1]["headers"], {"If-None-Match": '"abc"'})
+
+        self.assertEqual(self.overwatch.get_config(), {"market": "NBT/BTC"})
+        self.assertTrue(self.overwatch.config_changed)
+        self.assertEqual(self.overwatch.config_etag, '"def"')
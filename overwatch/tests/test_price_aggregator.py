@@ -0,0 +1,75 @@
+import datetime
+import json
+from unittest import mock
+
+import requests
+from django.test import TestCase, override_settings
+
+from overwatch.models import PriceHistory
+from overwatch.utils.price_aggregator import get_price_data
+
+PRICE_URL = "https://aggregator/price"
+TARGET = datetime.datetime(2020, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def make_response(data):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(data).encode("utf-8")
+    return response
+
+
+@override_settings(PRICE_CACHE_TOLERANCE_MINUTES=5, PRICE_CACHE_FALLBACK_MINUTES=60)
+class TestPriceAggregator(TestCase):
+    def setUp(self):
+        patcher = mock.patch("overwatch.utils.price_aggregator.get_client")
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_stored_price_within_tolerance_is_served(self):
+        PriceHistory.objects.record(
+            PRICE_URL, "BTC", TARGET + datetime.timedelta(minutes=3), {"price": 1}
+        )
+
+        self.assertEqual(get_price_data(PRICE_URL, "btc", TARGET), {"price": 1})
+        self.client.get.assert_not_called()
+
+    def test_miss_stores_the_response(self):
+        PriceHistory.objects.record(
+            PRICE_URL, "btc", TARGET + datetime.timedelta(minutes=10), {"price": 1}
+        )
+        self.client.get.return_value = make_response({"price": 2})
+
+        self.assertEqual(get_price_data(PRICE_URL, "btc", TARGET), {"price": 2})
+        self.client.get.assert_called_once_with(
+            "{}/btc/2020-01-01T12:00:00".format(PRICE_URL)
+        )
+        self.assertEqual(
+            PriceHistory.objects.get(
+                price_url=PRICE_URL, currency="btc", time=TARGET
+            ).get_data(),
+            {"price": 2},
+        )
+
+    def test_prices_are_kept_per_aggregator(self):
+        PriceHistory.objects.record(
+            "https://other-aggregator/price", "btc", TARGET, {"price": 1}
+        )
+        self.client.get.return_value = make_response({"price": 2})
+
+        self.assertEqual(get_price_data(PRICE_URL, "btc", TARGET), {"price": 2})
+        self.client.get.assert_called_once()
+
+    def test_falls_back_to_stored_price_when_the_aggregator_fails(self):
+        PriceHistory.objects.record(
+            PRICE_URL, "btc", TARGET - datetime.timedelta(minutes=30), {"price": 1}
+        )
+        self.client.get.side_effect = requests.ConnectionError()
+
+        self.assertEqual(get_price_data(PRICE_URL, "btc", TARGET), {"price": 1})
+
+    def test_failure_without_stored_price_raises(self):
+        self.client.get.side_effect = requests.ConnectionError()
+
+        with self.assertRaises(requests.ConnectionError):
+            get_price_data(PRICE_URL, "btc", TARGET)
@@ -0,0 +1,175 @@
+import datetime
+import gzip
+import json
+import os
+import tempfile
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from overwatch.models import (
+    BotDataRollup,
+    BotError,
+    BotHeartBeat,
+    BotLatestState,
+    BotPlacedOrder,
+    BotPrice,
+)
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+from overwatch.utils.retention import apply_retention
+
+NOW = datetime.datetime(2020, 6, 1, tzinfo=datetime.timezone.utc)
+OLD = datetime.datetime(2020, 1, 1, 10, tzinfo=datetime.timezone.utc)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestRetention(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+
+        settings_override = override_settings(RETENTION_ARCHIVE_DIR=self.archive_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_price(self, time, price):
+        return BotPrice.objects.create(
+            bot=self.bot, time=time, price=price, price_usd=price * 10, updated=True
+        )
+
+    def test_expired_prices_are_archived_rolled_up_and_removed(self):
+        old = [
+            self.create_price(OLD + datetime.timedelta(minutes=minutes), price)
+            for minutes, price in ((0, 1), (10, 3), (70, 5))
+        ]
+        recent = self.create_price(NOW - datetime.timedelta(days=1), 7)
+        version = self.bot.state.prices_version
+
+        removed, done = apply_retention(tables=["prices"], now=NOW)
+
+        self.assertEqual(removed, {"prices": 3})
+        self.assertTrue(done)
+        self.assertEqual(list(BotPrice.objects.all()), [recent])
+        self.assertGreater(
+            BotLatestState.objects.get(bot=self.bot).prices_version, version
+        )
+
+        rollups = BotDataRollup.objects.filter(
+            bot=self.bot, table="prices", period=BotDataRollup.HOUR
+        ).order_by("time")
+        self.assertEqual(
+            [rollup.time for rollup in rollups], [OLD, OLD.replace(hour=11)]
+        )
+        self.assertEqual([rollup.count for rollup in rollups], [2, 1])
+        self.assertEqual(rollups[0].get_average("price"), 2)
+        self.assertEqual(rollups[0].get_data()["price_usd"], [2, 40, 10, 30])
+
+        (path,) = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(self.archive_dir)
+            for name in names
+        ]
+
+        with gzip.open(path) as archive_file:
+            archived = json.load(archive_file)
+
+        self.assertEqual(archived["table"], "prices")
+        self.assertEqual(archived["columns"]["id"], [price.pk for price in old])
+        self.assertEqual(archived["columns"]["price"], [1, 3, 5])
+
+    def test_latest_price_is_kept(self):
+        latest = self.create_price(OLD, 1)
+
+        apply_retention(tables=["prices"], now=NOW)
+
+        self.assertEqual(list(BotPrice.objects.all()), [latest])
+
+    def test_batches_are_bounded(self):
+        for minutes in range(5):
+            self.create_price(OLD + datetime.timedelta(minutes=minutes), 1)
+
+        self.create_price(NOW, 1)
+
+        removed, done = apply_retention(
+            tables=["prices"], batch_size=2, max_batches=1, now=NOW
+        )
+
+        self.assertEqual(removed, {"prices": 2})
+        self.assertFalse(done)
+
+        removed, done = apply_retention(tables=["prices"], batch_size=2, now=NOW)
+
+        self.assertEqual(removed, {"prices": 3})
+        self.assertTrue(done)
+
+        # the batches were merged into one rollup of the hour
+        self.assertEqual(BotDataRollup.objects.get(table="prices").count, 5)
+
+    def test_placed_orders_are_summarised_by_type(self):
+        for order_type, price in (("buy", 1), ("sell", 2), ("sell", 4)):
+            BotPlacedOrder.objects.create(
+                bot=self.bot,
+                time=OLD,
+                base="BTC",
+                quote="USNBT",
+                order_type=order_type,
+                price=price,
+                amount=1,
+                updated=True,
+            )
+
+        apply_retention(tables=["placed_orders"], now=NOW)
+
+        rollup = BotDataRollup.objects.get(table="placed_orders")
+        self.assertEqual(rollup.count, 3)
+        self.assertEqual(rollup.get_average("sell.price"), 3)
+        self.assertIsNone(rollup.get_average("sell.price_usd"))
+
+    @override_settings(
+        RETENTION_POLICIES={"errors": {"days": 30, "rollup": "day", "archive": False}}
+    )
+    def test_tables_without_a_policy_are_kept(self):
+        BotHeartBeat.objects.filter(
+            pk=BotHeartBeat.objects.create(bot=self.bot).pk
+        ).update(time=OLD)
+        BotError.objects.filter(
+            pk=BotError.objects.create(bot=self.bot, title="", message="").pk
+        ).update(time=OLD)
+
+        removed, done = apply_retention(now=NOW)
+
+        self.assertEqual(removed, {"errors": 1})
+        self.assertTrue(BotHeartBeat.objects.exists())
+        self.assertEqual(
+            BotDataRollup.objects.get(table="errors").time, OLD.replace(hour=0)
+        )
+        self.assertEqual(os.listdir(self.archive_dir), [])
+
+    def test_heartbeats_queue_a_retention_run(self):
+        cache.clear()
+
+        BotHeartBeat.objects.create(bot=self.bot)
+        BotHeartBeat.objects.create(bot=self.bot)
+
+        channel_layer = get_channel_layer()
+        self.assertEqual(
+            async_to_sync(channel_layer.receive)("bot-retention"),
+            {"type": "apply.retention"},
+        )
+        self.assertEqual(channel_layer.channels.get("bot-retention", []), [])
+
+    def test_command(self):
+        self.create_price(OLD, 1)
+        self.create_price(NOW, 1)
+
+        call_command("apply_retention", dry_run=True)
+        self.assertEqual(BotPrice.objects.count(), 2)
+
+        call_command("apply_retention", tables=["prices"], max_batches=1)
+        self.assertEqual(BotPrice.objects.count(), 1)
@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from overwatch.bots.spread_bot.executor import OrderExecutor, TokenBucket
+
+
+def get_wrapper(rate_limit=1, **has):
+    wrapper = mock.Mock()
+    wrapper.rateLimit = rate_limit
+    wrapper.has = has
+    return wrapper
+
+
+class TestOrderExecutor(SimpleTestCase):
+    def test_token_bucket_paces_requests(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+
+        for x in range(5):
+            bucket.acquire()
+
+        # the first token is there already, the other 4 take 20ms each
+        self.assertGreaterEqual(time.monotonic() - start, 0.075)
+
+    def test_requests_overlap_and_keep_their_order(self):
+        def slow_order(symbol, amount, price):
+            time.sleep(0.1)
+            return {"id": str(price)}
+
+        wrapper = get_wrapper()
+        wrapper.create_limit_buy_order.side_effect = slow_order
+        executor = OrderExecutor(wrapper, workers=4)
+        start = time.monotonic()
+
+        results = executor.create_orders(
+            "USNBT/BTC", [("buy", price, 1) for price in range(4)]
+        )
+
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(
+            [result.value["id"] for result in results], ["0", "1", "2", "3"]
+        )
+        self.assertEqual(len(executor.latencies), 4)
+
+    def test_errors_are_returned(self):
+        wrapper = get_wrapper()
+        wrapper.cancel_order.side_effect = [{"id": "1"}, Exception("not found")]
+
+        results = OrderExecutor(wrapper, workers=1).cancel_orders(
+            "USNBT/BTC", ["1", "2"]
+        )
+
+        self.assertIsNone(results[0].error)
+        self.assertEqual(str(results[1].error), "not found")
+
+    def test_batch_endpoints_are_used_where_supported(self):
+        wrapper = get_wrapper(createOrders=True, cancelOrders=True)
+        wrapper.create_orders.side_effect = lambda orders: [
+            {"id": order["price"]} for order in orders
+        ]
+        executor = OrderExecutor(wrapper, batch_size=2)
+
+        results = executor.create_orders(
+            "USNBT/BTC", [("sell", price, 1) for price in range(3)]
+        )
+        executor.cancel_orders("USNBT/BTC", ["1", "2"])
+
+        self.assertEqual([result.value["id"] for result in results], [0, 1, 2])
+        self.assertEqual(wrapper.create_orders.call_count, 2)
+        wrapper.create_orders.assert_any_call(
+            [
+                {
+                    "symbol": "USNBT/BTC",
+                    "type": "limit",
+                    "side": "sell",
+                    "amount": 1,
+                    "price": 2,
+                }
+            ]
+        )
+        wrapper.cancel_orders.assert_called_once_with(["1", "2"], "USNBT/BTC")
+        wrapper.create_limit_sell_order.assert_not_called()
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from overwatch.bots.spread_bot.price_manager import PriceManager
+
+URL = "https://prices.example.com/price"
+
+
+def response(price):
+    return mock.Mock(status_code=200, json=mock.Mock(return_value={"usd_price": price}))
+
+
+@mock.patch("overwatch.bots.spread_bot.price_manager.time.monotonic")
+@mock.patch("overwatch.bots.spread_bot.price_manager.requests.get")
+class TestPriceManager(SimpleTestCase):
+    def test_rates_are_kept_without_a_max_age(self, get, monotonic):
+        get.return_value = response("2.5")
+        monotonic.return_value = 0
+        price_manager = PriceManager()
+
+        self.assertEqual(price_manager.get_price("btc", URL), 2.5)
+
+        monotonic.return_value = 10 ** 6
+        self.assertEqual(price_manager.get_price("BTC", URL), 2.5)
+        get.assert_called_once_with(url="{}/BTC".format(URL))
+
+    def test_rates_are_fetched_again_after_max_age(self, get, monotonic):
+        get.return_value = response("2.5")
+        monotonic.return_value = 0
+        price_manager = PriceManager(max_age=300)
+
+        self.assertEqual(price_manager.get_price("BTC", URL), 2.5)
+
+        get.return_value = response("3")
+        monotonic.return_value = 299
+        self.assertEqual(price_manager.get_price("BTC", URL), 2.5)
+
+        monotonic.return_value = 300
+        self.assertEqual(price_manager.get_price("BTC", URL), 3)
+        self.assertEqual(get.call_count, 2)
+
+    def test_usd_is_never_fetched(self, get, monotonic):
+        monotonic.return_value = 10 ** 6
+        price_manager = PriceManager(max_age=1)
+
+        self.assertEqual(price_manager.get_price("usd", URL), 1)
+        get.assert_not_called()
@@ -0,0 +1,182 @@
+from unittest import mock
+
+import ccxt
+from django.test import SimpleTestCase
+
+from overwatch.bots.spread_bot.reconcile import Account, Snapshot, plan_side
+
+
+def no_jitter(price, side):
+    return price
+
+
+def order(order_id, side, price, amount=10, symbol="USNBT/BTC"):
+    return {
+        "id": order_id,
+        "symbol": symbol,
+        "side": side,
+        "price": price,
+        "amount": amount,
+    }
+
+
+class TestReconcile(SimpleTestCase):
+    def get_snapshot(self, orders, base=1000, quote=1000):
+        return Snapshot(
+            orders,
+            {"USNBT": {"free": base}, "BTC": {"free": quote}, "free": {}},
+            "USNBT",
+            "BTC",
+        )
+
+    def plan(self, snapshot, side, price=1.0, target=30, tolerance=0.1):
+        return plan_side(snapshot, side, price, target, 10, tolerance, no_jitter)
+
+    def test_snapshot_is_fetched_once(self):
+        wrapper = mock.Mock()
+        wrapper.fetch_open_orders.return_value = [order("1", "buy", 1)]
+        wrapper.fetch_balance.return_value = {"BTC": {"free": 5}}
+
+        snapshot = Snapshot.fetch(wrapper, "USNBT/BTC", "USNBT", "BTC")
+
+        self.assertEqual(snapshot.get_on_order("buy"), 10)
+        self.assertEqual(snapshot.get_free("BTC"), 5)
+        self.assertEqual(snapshot.get_free("USNBT"), 0)
+        wrapper.fetch_open_orders.assert_called_once_with("USNBT/BTC")
+        wrapper.fetch_balance.assert_called_once_with()
+
+    def test_book_at_target_is_left_alone(self):
+        snapshot = self.get_snapshot([order(str(x), "buy", 0.99) for x in range(3)])
+
+        plan = self.plan(snapshot, "buy")
+
+        self.assertEqual((plan.cancels, plan.resets, plan.places), ([], [], []))
+
+    def test_orders_through_the_price_are_cancelled_and_replaced(self):
+        snapshot = self.get_snapshot(
+            [
+                order("1", "sell", 0.9),
+                order("2", "sell", 1.05),
+                order("3", "sell", 1.05),
+            ]
+        )
+
+        plan = self.plan(snapshot, "sell")
+
+        self.assertEqual(plan.cancels, [(snapshot.orders[0], "price")])
+        self.assertEqual(plan.places, [(1.0, 10)])
+
+    def test_orders_over_target_are_cancelled_furthest_first(self):
+        snapshot = self.get_snapshot(
+            [
+                order(str(x), "buy", price)
+                for x, price in enumerate((0.99, 0.95, 0.98, 0.97, 0.96, 0.94))
+            ]
+        )
+
+        plan = self.plan(snapshot, "buy")
+
+        # 60 on order against a target of 30 and one order of slack
+        self.assertEqual(
+            [(o["price"], reason) for o, reason in plan.cancels],
+            [(0.94, "target"), (0.95, "target")],
+        )
+        self.assertEqual(plan.places, [])
+
+    def test_orders_outside_tolerance_are_reset(self):
+        snapshot = self.get_snapshot(
+            [
+                order("1", "buy", 0.5, amount=5),
+                order("2", "buy", 0.99),
+                order("3", "buy", 0.99),
+            ]
+        )
+
+        plan = self.plan(snapshot, "buy")
+
+        self.assertEqual(plan.resets, [(snapshot.orders[0], 1.0, 10)])
+        self.assertEqual(plan.places, [])
+
+    def test_placements_are_limited_by_the_balance(self):
+        # 15 BTC buys 15 USNBT at a price of 1
+        snapshot = self.get_snapshot([], quote=15)
+
+        plan = self.plan(snapshot, "buy")
+
+        self.assertEqual(plan.shortfall, (30, 0, 15))
+        self.assertEqual(plan.places, [(1.0, 10), (1.0, 10)])
+
+    def test_cancelled_orders_free_their_balance(self):
+        snapshot = self.get_snapshot([order("1", "sell", 0.5)], base=0)
+
+        plan = self.plan(snapshot, "sell", target=10)
+
+        self.assertIsNone(plan.shortfall)
+        self.assertEqual(plan.places, [(1.0, 10)])
+
+    def test_snapshot_follows_the_actions_taken(self):
+        snapshot = self.get_snapshot([order("1", "buy", 0.5)], quote=100)
+
+        snapshot.cancelled(snapshot.orders[0])
+        snapshot.placed("2", "buy", 2, 10)
+
+        self.assertEqual(
+            snapshot.get_orders("buy"),
+            [{"id": "2", "side": "buy", "price": 2, "amount": 10}],
+        )
+        self.assertEqual(snapshot.get_free("BTC"), 100 + 5 - 20)
+
+
+class TestAccount(SimpleTestCase):
+    def setUp(self):
+        self.wrapper = mock.Mock()
+        self.wrapper.fetch_balance.return_value = {"BTC": {"free": 100}}
+        self.account = Account(self.wrapper)
+        self.account.start_tick(["USNBT/BTC", "NBT/BTC"])
+
+    def test_account_is_fetched_once_for_all_symbols(self):
+        self.wrapper.fetch_open_orders.return_value = [
+            order("1", "buy", 1),
+            order("2", "sell", 2, symbol="NBT/BTC"),
+        ]
+
+        usnbt = self.account.get_snapshot("USNBT/BTC", "USNBT", "BTC")
+        nbt = self.account.get_snapshot("NBT/BTC", "NBT", "BTC")
+
+        self.assertEqual([o["id"] for o in usnbt.orders], ["1"])
+        self.assertEqual([o["id"] for o in nbt.orders], ["2"])
+        self.wrapper.fetch_open_orders.assert_called_once_with()
+        self.wrapper.fetch_balance.assert_called_once_with()
+
+        self.account.start_tick(["USNBT/BTC", "NBT/BTC"])
+        self.account.get_snapshot("USNBT/BTC", "USNBT", "BTC")
+
+        self.assertEqual(self.wrapper.fetch_open_orders.call_count, 2)
+
+    def test_orders_are_fetched_by_symbol_if_the_exchange_requires_it(self):
+        def fetch_open_orders(symbol=None):
+            if symbol is None:
+                raise ccxt.ArgumentsRequired("symbol required")
+
+            return [order(symbol, "buy", 1, symbol=symbol)]
+
+        self.wrapper.fetch_open_orders.side_effect = fetch_open_orders
+
+        snapshot = self.account.get_snapshot("NBT/BTC", "NBT", "BTC")
+        self.assertEqual([o["id"] for o in snapshot.orders], ["NBT/BTC"])
+
+        self.account.start_tick(["USNBT/BTC", "NBT/BTC"])
+        self.account.get_snapshot("NBT/BTC", "NBT", "BTC")
+
+        # the symbol-less request is not tried again
+        self.assertEqual(self.wrapper.fetch_open_orders.call_count, 1 + 2 + 2)
+
+    def test_snapshots_share_the_free_balance(self):
+        self.wrapper.fetch_open_orders.return_value = []
+
+        usnbt = self.account.get_snapshot("USNBT/BTC", "USNBT", "BTC")
+        usnbt.placed("1", "buy", 1, 30)
+        nbt = self.account.get_snapshot("NBT/BTC", "NBT", "BTC")
+
+        self.assertEqual(nbt.get_free("BTC"), 70)
+        self.assertEqual(nbt.get_free("NBT"), 0)
@@ -0,0 +1,19 @@
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from overwatch.utils.templates import compile_template, render_fragment
+
+
+class TestTemplates(SimpleTestCase):
+    def test_template_is_compiled_once(self):
+        template = "{{ value|floatformat:4 }} {{ currency }}"
+        self.assertIs(compile_template(template), compile_template(template))
+
+    def test_render_fragment_matches_template(self):
+        template = "{{ value|floatformat:6 }} {{ currency }}"
+        context = {"value": 1.23456789, "currency": "USD"}
+
+        self.assertEqual(
+            render_fragment(template, context),
+            Template(template).render(Context(context)),
+        )
@@ -0,0 +1,136 @@
+import asyncio
+import datetime
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from overwatch.models import BotPrice
+from overwatch.utils.valuation import (
+    claim_pending,
+    drain_pending,
+    fetch_prices_async,
+    get_time_bucket,
+    value_pending,
+)
+from overwatch.tests.utils import IN_MEMORY_CHANNEL_LAYERS, create_bot
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, VALUATION_BUCKET_MINUTES=5,
+)
+class TestValuation(TestCase):
+    def setUp(self):
+        self.bot = create_bot()
+
+    def test_get_time_bucket(self):
+        dt = datetime.datetime(2020, 1, 1, 12, 7, 31, 123, tzinfo=datetime.timezone.utc)
+        self.assertEqual(
+            get_time_bucket(dt),
+            datetime.datetime(2020, 1, 1, 12, 5, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_value_pending_fetches_each_price_once(self):
+        bucket = get_time_bucket(timezone.now())
+
+        for seconds in range(5):
+            bot_price = BotPrice.objects.create(bot=self.bot, price=2, bid_price=1)
+            bot_price.time = bucket + datetime.timedelta(seconds=seconds)
+            bot_price.save()
+
+        with mock.patch(
+            "overwatch.utils.valuation.get_price_data",
+            return_value={"moving_averages": {"30_minute": 10}},
+        ) as get_price_data:
+            valued = value_pending(BotPrice)
+
+        self.assertEqual(len(valued), 5)
+        get_price_data.assert_called_once_with(self.bot.quote_price_url, "btc", bucket)
+        self.assertFalse(BotPrice.objects.filter(updated=False).exists())
+        self.assertEqual(
+            set(BotPrice.objects.values_list("price_usd", flat=True)), {20}
+        )
+
+    def test_claimed_rows_are_skipped(self):
+        BotPrice.objects.create(bot=self.bot, price=2, bid_price=1)
+
+        self.assertEqual(len(claim_pending(BotPrice)), 1)
+        self.assertEqual(claim_pending(BotPrice), [])
+
+    def test_failed_rows_back_off(self):
+        bot_price = BotPrice.objects.create(bot=self.bot, price=2, bid_price=1)
+
+        with mock.patch(
+            "overwatch.utils.valuation.get_price_data", return_value=None
+        ) as get_price_data:
+            self.assertEqual(drain_pending(BotPrice), 0)
+            self.assertEqual(drain_pending(BotPrice), 0)
+
+        get_price_data.assert_called_once()
+        bot_price.refresh_from_db()
+        self.assertFalse(bot_price.updated)
+        self.assertEqual(bot_price.valuation_attempts, 1)
+        self.assertGreater(bot_price.valuation_retry_at, timezone.now())
+
+        # once due the row is tried again
+        BotPrice.objects.update(valuation_retry_at=timezone.now())
+
+        with mock.patch(
+            "overwatch.utils.valuation.get_price_data",
+            return_value={"moving_averages": {"30_minute": 10}},
+        ):
+            self.assertEqual(drain_pending(BotPrice), 1)
+
+    def test_drain_pages_past_failed_rows(self):
+        bucket = get_time_bucket(timezone.now())
+        failing_bucket = bucket - datetime.timedelta(minutes=5)
+
+        for dt in [bucket, failing_bucket]:
+            bot_price = BotPrice.objects.create(bot=self.bot, price=2, bid_price=1)
+            bot_price.time = dt
+            bot_price.save()
+
+        with mock.patch(
+            "overwatch.utils.valuation.get_price_data",
+            side_effect=lambda url, currency, dt: None
+            if dt == failing_bucket
+            else {"moving_averages": {"30_minute": 10}},
+        ):
+            self.assertEqual(drain_pending(BotPrice, batch_size=1), 1)
+
+        self.assertEqual(BotPrice.objects.get(time=bucket).price_usd, 20)
+        self.assertEqual(
+            BotPrice.objects.get(time=failing_bucket).valuation_attempts, 1
+        )
+
+    def test_burst_of_rows_queues_one_valuation(self):
+        with mock.patch("overwatch.models.bot_additions.async_to_sync") as send:
+            for _ in range(3):
+                BotPrice.objects.create(bot=self.bot, price=2, bid_price=1)
+
+        self.assertEqual(send.return_value.call_count, 1)
+
+        # a claimed batch no longer holds back the next row
+        claim_pending(BotPrice)
+
+        with mock.patch("overwatch.models.bot_additions.async_to_sync") as send:
+            BotPrice.objects.create(bot=self.bot, price=2, bid_price=1)
+
+        self.assertEqual(send.return_value.call_count, 1)
+
+    def test_fetch_prices_async(self):
+        bucket = get_time_bucket(timezone.now())
+        keys = {("https://aggregator", currency, bucket) for currency in ["btc", "eth"]}
+
+        with mock.patch(
+            "overwatch.utils.valuation.get_price_data",
+            side_effect=lambda url, currency, dt: {
+                "moving_averages": {"30_minute": len(currency)}
+            },
+        ) as get_price_data:
+            prices = asyncio.get_event_loop().run_until_complete(
+                fetch_prices_async(keys)
+            )
+
+        self.assertEqual(get_price_data.call_count, 2)
+        self.assertEqual(prices, {key: 3 for key in keys})
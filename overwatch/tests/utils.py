@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+
+from overwatch.models import Bot, Exchange
+
+# channel layer for tests, so no redis server is needed
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+}
+
+
+def create_bot(**kwargs):
+    """
+    Create the btc-usnbt bot on a bittrex exchange account, along with its owner.
+    kwargs override the bot's fields
+    """
+    owner = User.objects.create(username="owner")
+    exchange_account = Exchange.objects.create(
+        identifier="test", owner=owner, exchange="bittrex"
+    )
+    fields = {
+        "name": "btc-usnbt",
+        "exchange_account": exchange_account,
+        "owner": owner,
+        "market": "USNBT/BTC",
+        "tolerance": 1,
+        "fee": 0.2,
+        "bid_spread": 0.1,
+        "ask_spread": 0.1,
+        "order_amount": 10,
+        "total_bid": 100,
+        "total_ask": 100,
+    }
+    fields.update(kwargs)
+
+    return Bot.objects.create(**fields)
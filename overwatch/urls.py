@@ -46,6 +46,7 @@ urlpatterns = [
     path("bot/prices", views.BotApiPricesView.as_view(), name="bot_prices"),
     path("bot/balances", views.BotApiBalancesView.as_view(), name="bot_balance"),
     path("bot/trades", views.BotApiTradeView.as_view(), name="bot_trade"),
+    path("bot/batch", views.BotApiBatchView.as_view(), name="bot_batch"),
     # Display DataTables
     path(
         "bot/<int:pk>/error/datatables",
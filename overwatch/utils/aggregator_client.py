@@ -0,0 +1,238 @@
+"""
+A single pooled HTTP session shared by everything that talks to the price-aggregator service.
+Requests are retried with jittered exponential backoff within a deadline for the whole call
+and a circuit breaker fails fast while the aggregator is down
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of making a request while the circuit breaker is open
+    """
+
+
+class AggregatorClient(object):
+    # status codes that indicate a temporary problem with the aggregator
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.PRICE_AGGREGATOR_POOL_SIZE,
+            pool_maxsize=settings.PRICE_AGGREGATOR_POOL_SIZE,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # bound the number of requests in flight at once from this process
+        self.semaphore = threading.BoundedSemaphore(
+            settings.PRICE_AGGREGATOR_MAX_CONCURRENCY
+        )
+
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+        self.counters = {
+            # requests counts attempts, errors counts calls that failed after their retries
+            "requests": 0,
+            "errors": 0,
+            "retries": 0,
+            "rejected": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+        }
+
+    def stats(self):
+        """
+        Return a copy of the latency and error counters
+        """
+        with self.lock:
+            stats = dict(self.counters)
+
+        stats["mean_latency"] = (
+            stats["total_latency"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        stats["circuit_open"] = self.opened_at is not None
+        return stats
+
+    def _allow_request(self):
+        """
+        Check the circuit breaker.
+        Once the cool down has passed a single trial request is let through to test the aggregator
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            cool_down = settings.PRICE_AGGREGATOR_CIRCUIT_COOL_DOWN
+
+            if time.monotonic() - self.opened_at < cool_down or self.trial_in_flight:
+                self.counters["rejected"] += 1
+                return False
+
+            self.trial_in_flight = True
+            return True
+
+    def _record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info("Price aggregator has recovered. Closing circuit")
+
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def _record_failure(self):
+        with self.lock:
+            self.counters["errors"] += 1
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+
+            if self.opened_at is not None:
+                # the trial request failed so start a new cool down
+                self.opened_at = time.monotonic()
+                return
+
+            if self.consecutive_failures >= settings.PRICE_AGGREGATOR_CIRCUIT_FAILURES:
+                logger.error(
+                    "Price aggregator failed {} times in a row. Opening circuit. {}".format(
+                        self.consecutive_failures, self.counters
+                    )
+                )
+                self.opened_at = time.monotonic()
+
+    def _record_latency(self, latency):
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["total_latency"] += latency
+            self.counters["max_latency"] = max(self.counters["max_latency"], latency)
+
+    @staticmethod
+    def _backoff(attempt):
+        """
+        Exponential backoff with full jitter
+        """
+        backoff = min(
+            settings.PRICE_AGGREGATOR_BACKOFF_MAX,
+            settings.PRICE_AGGREGATOR_BACKOFF * (2 ** attempt),
+        )
+        return random.uniform(0, backoff)
+
+    @staticmethod
+    def _cap_timeout(timeout, remaining):
+        """
+        Shorten the (connect, read) or single request timeout so it ends by the deadline
+        """
+        if timeout is None:
+            return remaining
+
+        if isinstance(timeout, tuple):
+            return tuple(min(part, remaining) for part in timeout)
+
+        return min(timeout, remaining)
+
+    def get(self, url, **kwargs):
+        """
+        GET the url, retrying temporary failures until PRICE_AGGREGATOR_DEADLINE seconds have passed.
+        However many attempts it takes, a call counts once towards the circuit breaker.
+        Returns the Response which may still have an error status.
+        Raises CircuitOpenError while the aggregator is marked as down
+        """
+        if not self._allow_request():
+            raise CircuitOpenError(
+                "Price aggregator circuit is open. Not requesting {}".format(url)
+            )
+
+        try:
+            r = self._get_with_retries(url, **kwargs)
+        except Exception:
+            self._record_failure()
+            raise
+
+        if r.status_code in self.retry_statuses:
+            self._record_failure()
+        else:
+            # anything else is an answer from a working aggregator, even a 404
+            self._record_success()
+
+        return r
+
+    def _get_with_retries(self, url, **kwargs):
+        timeout = kwargs.pop("timeout", settings.PRICE_AGGREGATOR_TIMEOUT)
+        deadline = time.monotonic() + settings.PRICE_AGGREGATOR_DEADLINE
+        retries = settings.PRICE_AGGREGATOR_RETRIES
+        attempt = 0
+
+        while True:
+            # bound the number of requests in flight at once from this process
+            if not self.semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise requests.Timeout("Timed out waiting to request {}".format(url))
+
+            start = time.monotonic()
+            error = None
+
+            try:
+                r = self.session.get(
+                    url,
+                    timeout=self._cap_timeout(timeout, max(deadline - start, 0.001)),
+                    **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                self.semaphore.release()
+                self._record_latency(time.monotonic() - start)
+
+            if error is None and r.status_code not in self.retry_statuses:
+                return r
+
+            backoff = self._backoff(attempt)
+
+            if attempt >= retries or time.monotonic() + backoff >= deadline:
+                if error is not None:
+                    raise error
+
+                return r
+
+            logger.warning(
+                "Request to {} failed: {}. Retrying".format(
+                    url, error if error is not None else r.status_code
+                )
+            )
+
+            with self.lock:
+                self.counters["retries"] += 1
+
+            time.sleep(backoff)
+            attempt += 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process wide AggregatorClient
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AggregatorClient()
+
+    return _client
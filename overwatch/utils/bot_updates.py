@@ -0,0 +1,42 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+"""
+Changes to a bot are announced to the "bot-updates" channel rather than straight to the websocket groups.
+The BotUpdateConsumer merges the announcements it receives within BOT_UPDATE_COALESCE_SECONDS,
+renders each update once and sends the same message to every websocket in the group.
+
+updates are any of:
+    "bot_list" - the bot row on the bot list page
+    "heart_beats", "price_info", "balance_info" - the sections of the bot detail page
+
+Websockets tell the BotUpdateConsumer when they join or leave a group, so updates for pages nobody has open
+aren't rendered. Until it has heard from a group, e.g. after a restart, the consumer renders its updates
+and asks the websockets that receive them to say they are watching
+"""
+
+BOT_LIST = "bot_list"
+HEART_BEATS = "heart_beats"
+PRICE_INFO = "price_info"
+BALANCE_INFO = "balance_info"
+
+
+def announce(bot_pk, *updates):
+    async_to_sync(get_channel_layer().send)(
+        "bot-updates", {"type": "bot.changed", "bot_pk": bot_pk, "updates": updates}
+    )
+
+
+def watch(group, channel_name, watching=True):
+    """
+    Tell the BotUpdateConsumer that the websocket channel has joined (or left) the group
+    """
+    async_to_sync(get_channel_layer().send)(
+        "bot-updates",
+        {
+            "type": "bot.watched",
+            "group": group,
+            "channel": channel_name,
+            "watching": watching,
+        },
+    )
@@ -0,0 +1,36 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+"""
+Rendered pygal charts are cached against the data version of the bot they were drawn from (see BotLatestState).
+A new version means a new key so stale charts are never served, they just expire.
+Charts also cover a window ending now, so the key changes every CHART_TIME_BUCKET_SECONDS as well
+and a chart is never more than that out of date even if the bot sends no new data.
+Every viewer of a bot, and every update pushed to them, reuses the same rendered chart until the data changes.
+Configure a shared CACHES backend to share the charts between processes
+"""
+
+
+def get_chart_key(bot, chart, params, version):
+    params_hash = hashlib.md5(repr(params).encode("utf-8")).hexdigest()
+    time_bucket = int(time.time() // settings.CHART_TIME_BUCKET_SECONDS)
+    return "chart:{}:{}:{}:{}:{}".format(
+        bot.pk, chart, params_hash, version, time_bucket
+    )
+
+
+def get_chart(bot, chart, params, version, render):
+    """
+    Return the cached chart or render and cache it
+    """
+    key = get_chart_key(bot, chart, params, version)
+    rendered = cache.get(key)
+
+    if rendered is None:
+        rendered = render()
+        cache.set(key, rendered, settings.CHART_CACHE_SECONDS)
+
+    return rendered
@@ -0,0 +1,291 @@
+import datetime
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+"""
+Server side processing for the DataTables of the bot_detail page.
+
+Each table declares its columns as {DataTables column name: (model field, kind)}.
+The kind decides how a search term matches the column, so a search never casts a column to text:
+TEXT columns match a substring (backed by a trigram index on PostgreSQL, see migration 0059),
+EXACT columns match the whole value case insensitively (ids, order types),
+NUMBER columns match the values that round to the number typed, or a "min..max" range,
+TIME columns match a day typed as YYYY-MM-DD, or a "from..to" range of days.
+A term that can't apply to a column (a word against a number) skips that column.
+
+Rows are paged by keyset rather than OFFSET when the order column is never null.
+The last row of every page served is cached as the start of the next one, against the data version
+of the table (see BotLatestState) for DATA_TABLES_PAGE_SECONDS,
+so paging forward through a table seeks straight to the next page.
+Jumping to a page that hasn't been served yet still uses OFFSET.
+
+Counts are cached for DATA_TABLES_COUNT_SECONDS. A filtered count stops at DATA_TABLES_COUNT_LIMIT rows,
+which is shown as the number of matches when a search matches more
+"""
+
+TEXT = "text"
+EXACT = "exact"
+NUMBER = "number"
+TIME = "time"
+
+
+def get_int(request, name, default):
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def split_range(value):
+    """
+    Return the (low, high) ends of a "low..high" term, either of which may be empty, or None
+    """
+    if ".." not in value:
+        return None
+
+    low, high = value.split("..", 1)
+    return low.strip(), high.strip()
+
+
+def get_number(value):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        return None
+
+    return number if number.is_finite() else None
+
+
+def get_number_filter(field, value):
+    bounds = split_range(value)
+
+    if bounds is None:
+        number = get_number(value)
+
+        if number is None:
+            return None
+
+        # the values that are shown as the number typed, 1.5 matches 1.45 up to 1.55
+        half_step = Decimal(1).scaleb(number.as_tuple().exponent) / 2
+        return Q(
+            **{
+                "{}__gte".format(field): float(number - half_step),
+                "{}__lt".format(field): float(number + half_step),
+            }
+        )
+
+    low, high = bounds
+    lookups = {}
+
+    for bound, lookup in ((low, "gte"), (high, "lte")):
+        if not bound:
+            continue
+
+        number = get_number(bound)
+
+        if number is None:
+            return None
+
+        lookups["{}__{}".format(field, lookup)] = float(number)
+
+    return Q(**lookups) if lookups else None
+
+
+def get_day(value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        return None
+
+    if day is None:
+        return None
+
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+def get_time_filter(field, value):
+    low, high = split_range(value) or (value, value)
+    lookups = {}
+
+    for bound, lookup, days in ((low, "gte", 0), (high, "lt", 1)):
+        if not bound:
+            continue
+
+        day = get_day(bound)
+
+        if day is None:
+            return None
+
+        lookups["{}__{}".format(field, lookup)] = day + datetime.timedelta(days=days)
+
+    return Q(**lookups) if lookups else None
+
+
+def get_column_filter(field, kind, value):
+    """
+    Return the Q object matching the search value against the column, or None if it can't match
+    """
+    if kind == TEXT:
+        return Q(**{"{}__icontains".format(field): value})
+
+    if kind == EXACT:
+        return Q(**{"{}__iexact".format(field): value})
+
+    if kind == NUMBER:
+        return get_number_filter(field, value)
+
+    if kind == TIME:
+        return get_time_filter(field, value)
+
+    raise ValueError("Unknown column kind {}".format(kind))
+
+
+def get_search_filter(request, columns):
+    """
+    Return the Q object of the global and column searches of the request, or None if there are none.
+    The global search matches a row if it matches any searchable column, column searches must all match
+    """
+    searchable = []
+    index = 0
+
+    while "columns[{}][name]".format(index) in request.GET:
+        name = request.GET["columns[{}][name]".format(index)]
+
+        if (
+            name in columns
+            and request.GET.get("columns[{}][searchable]".format(index)) != "false"
+        ):
+            searchable.append((index, name))
+
+        index += 1
+
+    search_filter = None
+
+    value = request.GET.get("search[value]", "").strip()
+
+    if value:
+        # a term no column can match matches nothing
+        search_filter = Q(pk__in=[])
+
+        for index, name in searchable:
+            column_filter = get_column_filter(*columns[name], value)
+
+            if column_filter is not None:
+                search_filter |= column_filter
+
+    for index, name in searchable:
+        value = request.GET.get("columns[{}][search][value]".format(index), "").strip()
+
+        if not value:
+            continue
+
+        column_filter = get_column_filter(*columns[name], value) or Q(pk__in=[])
+        search_filter = (
+            column_filter if search_filter is None else search_filter & column_filter
+        )
+
+    return search_filter
+
+
+def get_order(request, columns):
+    """
+    Return the (field, descending) the request orders by, the first column by default
+    """
+    index = request.GET.get("order[0][column]")
+    name = request.GET.get("columns[{}][name]".format(index))
+
+    if name not in columns:
+        name = next(iter(columns))
+
+    return columns[name][0], request.GET.get("order[0][dir]", "desc") != "asc"
+
+
+def get_key(model, bot, *parts):
+    return "datatable:{}:{}:{}".format(
+        model._meta.model_name,
+        bot.pk,
+        hashlib.md5(repr(parts).encode("utf-8")).hexdigest(),
+    )
+
+
+def get_count(key, query_set, limit=None):
+    count = cache.get(key)
+
+    if count is None:
+        query_set = query_set.order_by()
+        count = (query_set[:limit] if limit else query_set).count()
+        cache.set(key, count, settings.DATA_TABLES_COUNT_SECONDS)
+
+    return count
+
+
+def get_page(request, model, bot, columns, data):
+    """
+    Return the DataTables page of the bot's model rows the request asks for.
+    data names the BotLatestState version of the table
+    """
+    draw = get_int(request, "draw", 0)
+    start = max(get_int(request, "start", 0), 0)
+    length = get_int(request, "length", settings.DATA_TABLES_MAX_LENGTH)
+
+    if not 0 < length <= settings.DATA_TABLES_MAX_LENGTH:
+        length = settings.DATA_TABLES_MAX_LENGTH
+
+    query_set = model.objects.filter(bot=bot)
+    results_total = get_count(get_key(model, bot, "total"), query_set)
+
+    search_filter = get_search_filter(request, columns)
+    search = repr(search_filter)
+
+    if search_filter is None:
+        results_filtered = results_total
+    else:
+        query_set = query_set.filter(search_filter)
+        results_filtered = get_count(
+            get_key(model, bot, "filtered", search),
+            query_set,
+            settings.DATA_TABLES_COUNT_LIMIT,
+        )
+
+    order_field, descending = get_order(request, columns)
+    prefix = "-" if descending else ""
+    query_set = query_set.order_by(
+        "{}{}".format(prefix, order_field), "{}pk".format(prefix)
+    )
+
+    keyset = not model._meta.get_field(order_field).null
+    version = getattr(bot.state, "{}_version".format(data))
+    page_key = get_key(model, bot, "page", version, search, order_field, descending)
+    after = cache.get("{}:{}".format(page_key, start)) if keyset and start else None
+
+    if after is not None:
+        value, pk = after
+        lookup = "lt" if descending else "gt"
+        rows = list(
+            query_set.filter(
+                Q(**{"{}__{}".format(order_field, lookup): value})
+                | Q(**{order_field: value, "pk__{}".format(lookup): pk})
+            )[:length]
+        )
+    else:
+        rows = list(query_set[start : start + length])
+
+    if keyset and rows:
+        cache.set(
+            "{}:{}".format(page_key, start + len(rows)),
+            (getattr(rows[-1], order_field), rows[-1].pk),
+            settings.DATA_TABLES_PAGE_SECONDS,
+        )
+
+    return {
+        "draw": draw,
+        "recordsTotal": results_total,
+        "recordsFiltered": results_filtered,
+        "data": rows,
+    }
@@ -0,0 +1,252 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ccxt
+from django.conf import settings
+from django.core.cache import cache
+
+from overwatch.bots.spread_bot.market_cache import MarketCache
+
+logger = logging.getLogger(__name__)
+
+"""
+Long lived ccxt clients for the exchange accounts.
+Building a client and loading its markets is expensive, so each account keeps one client for the life of the process.
+A client is only used by one thread at a time.
+Balances are cached for EXCHANGE_BALANCE_CACHE_SECONDS and shared by every user and page
+(and every process, if a shared CACHES backend is configured).
+
+Market metadata is the same for everyone using an exchange and can be megabytes to download.
+It is fetched once by a shared public client and kept in memory and in EXCHANGE_MARKETS_CACHE_DIR
+for EXCHANGE_MARKETS_CACHE_SECONDS. New clients are given the cached markets rather than loading their own.
+The cache is the MarketCache the spread bot uses
+"""
+
+_clients = {}
+_public_clients = {}
+_clients_lock = threading.Lock()
+
+_market_caches = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the bounded thread pool exchange requests are fanned out in
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.EXCHANGE_THREAD_POOL_SIZE,
+                    thread_name_prefix="exchange",
+                )
+
+    return _executor
+
+
+def get_account_client(exchange_account):
+    """
+    Return the ccxt client of the exchange account and the lock to hold while using it.
+    The client is replaced if the exchange or the credentials of the account change
+    """
+    identity = (
+        exchange_account.exchange.lower(),
+        exchange_account.key,
+        exchange_account.secret,
+    )
+
+    with _clients_lock:
+        client = _clients.get(exchange_account.pk)
+
+        if client is None or client[0] != identity:
+            wrapper_class = getattr(ccxt, exchange_account.exchange.lower())
+            client = (
+                identity,
+                wrapper_class(
+                    {
+                        "apiKey": exchange_account.key,
+                        "secret": exchange_account.secret,
+                        "nonce": ccxt.Exchange.milliseconds,
+                        "timeout": int(settings.EXCHANGE_TIMEOUT * 1000),
+                        "enableRateLimit": True,
+                    }
+                ),
+                threading.Lock(),
+            )
+            _clients[exchange_account.pk] = client
+            # held until the client has its markets so no other thread uses it before then
+            client[2].acquire()
+            created = True
+        else:
+            created = False
+
+    if created:
+        # outside the registry lock as the markets may need fetching
+        try:
+            set_markets(client[1])
+        finally:
+            client[2].release()
+
+    return client[1], client[2]
+
+
+def get_public_client(exchange):
+    """
+    Return the shared unauthenticated ccxt client of the exchange
+    """
+    exchange = exchange.lower()
+
+    with _clients_lock:
+        client = _public_clients.get(exchange)
+
+        if client is None:
+            client = getattr(ccxt, exchange)(
+                {
+                    "timeout": int(settings.EXCHANGE_TIMEOUT * 1000),
+                    "enableRateLimit": True,
+                }
+            )
+            _public_clients[exchange] = client
+
+    return client
+
+
+def get_market_cache():
+    """
+    Return the MarketCache for the configured directory and max age
+    """
+    key = (settings.EXCHANGE_MARKETS_CACHE_DIR, settings.EXCHANGE_MARKETS_CACHE_SECONDS)
+
+    with _clients_lock:
+        if key not in _market_caches:
+            _market_caches[key] = MarketCache(*key)
+
+        return _market_caches[key]
+
+
+def get_markets(exchange):
+    """
+    The markets of the exchange, as returned by ccxt fetch_markets.
+    Served from memory, then disk, and only fetched from the exchange by the shared public client once both are
+    older than EXCHANGE_MARKETS_CACHE_SECONDS. A stale copy is served if the exchange can't be reached
+    """
+    return get_market_cache().get_markets(
+        exchange, lambda: get_public_client(exchange).fetch_markets()
+    )
+
+
+def set_markets(client):
+    """
+    Give the client the cached markets of its exchange so it doesn't load its own
+    """
+    try:
+        client.set_markets(get_markets(client.id))
+    except ccxt.BaseError as e:
+        logger.warning("Failed getting {} markets: {}".format(client.id, e))
+
+
+def get_balances(exchange_account):
+    """
+    The balances of the exchange account as {currency: {"used": used, "free": free}}
+    """
+    cache_key = "exchange_balances:{}".format(exchange_account.pk)
+    balances = cache.get(cache_key)
+
+    if balances is not None:
+        return balances
+
+    client, lock = get_account_client(exchange_account)
+
+    with lock:
+        # another thread may have fetched them while we waited
+        balances = cache.get(cache_key)
+
+        if balances is not None:
+            return balances
+
+        balances = {
+            currency: {
+                "used": balance.get("used") or 0,
+                "free": balance.get("free") or 0,
+            }
+            for currency, balance in client.fetch_balance().items()
+            if currency not in ["info", "free", "used", "total"]
+            and isinstance(balance, dict)
+        }
+
+    cache.set(cache_key, balances, settings.EXCHANGE_BALANCE_CACHE_SECONDS)
+
+    return balances
+
+
+def iter_balances(exchange_accounts):
+    """
+    Fetch the balances of the exchange accounts concurrently.
+    Yields (exchange account, balances) as each exchange answers.
+    balances is None if the exchange failed or didn't answer in time.
+    Each exchange has EXCHANGE_TIMEOUT * 2 seconds from when its request starts,
+    so accounts queued behind others in the thread pool aren't timed out while they wait for a thread
+    """
+    timeout = settings.EXCHANGE_TIMEOUT * 2
+    # the longest an account can wait for a thread, if every request ahead of it takes its full time
+    queue_timeout = timeout * math.ceil(
+        len(exchange_accounts) / settings.EXCHANGE_THREAD_POOL_SIZE
+    )
+    submitted = time.monotonic()
+    started = {}
+
+    def fetch(exchange_account):
+        started[exchange_account.pk] = time.monotonic()
+        return get_balances(exchange_account)
+
+    futures = {
+        get_executor().submit(fetch, exchange_account): exchange_account
+        for exchange_account in exchange_accounts
+    }
+    pending = set(futures)
+
+    def get_deadline(future):
+        start = started.get(futures[future].pk)
+
+        if start is None:
+            return submitted + queue_timeout + timeout
+
+        return start + timeout
+
+    while pending:
+        now = time.monotonic()
+
+        for future in [future for future in pending if get_deadline(future) <= now]:
+            pending.discard(future)
+            future.cancel()
+            logger.warning("Timed out getting balances for {}".format(futures[future]))
+            yield futures[future], None
+
+        if not pending:
+            return
+
+        done, _ = wait(
+            pending,
+            timeout=min(get_deadline(future) for future in pending) - now,
+            return_when=FIRST_COMPLETED,
+        )
+
+        for future in done:
+            pending.discard(future)
+            exchange_account = futures[future]
+
+            try:
+                yield exchange_account, future.result()
+            except Exception as e:
+                logger.warning(
+                    "Failed getting balances for {}: {}".format(exchange_account, e)
+                )
+                yield exchange_account, None
@@ -1,6 +1,17 @@
-from datetime import datetime
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
 
 import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+
+from overwatch.models.price_history import PriceHistory
+from overwatch.utils.aggregator_client import get_client
+
+logger = logging.getLogger(__name__)
 
 
 def get_price_data(price_url, currency, dt=None):
@@ -8,6 +19,8 @@ def get_price_data(price_url, currency, dt=None):
     Contact the price-aggregator service and fetch a price for the given currency
     If time_stamp is None, the latest price is retrieved.
     Otherwise the price closest to the tie stamp is retrieved.
+    Responses are stored in PriceHistory and any stored price from the same aggregator
+    within PRICE_CACHE_TOLERANCE_MINUTES of the requested time is served without contacting it.
     """
     if currency.lower() == "usd":
         return {
@@ -26,21 +39,56 @@ def get_price_data(price_url, currency, dt=None):
     if currency.lower() == "cnnbt":
         currency = "cny"
 
+    target = dt if dt is not None else now()
+
+    cached_price = PriceHistory.objects.get_closest_to(
+        price_url,
+        currency,
+        target,
+        timedelta(minutes=settings.PRICE_CACHE_TOLERANCE_MINUTES),
+    )
+
+    if cached_price is not None:
+        return cached_price.get_data()
+
     url = "{}/{}".format(price_url, currency)
 
     if dt is not None:
         # price service expects timestamp in format yyyy-mm-ddTHH:MM:SS
         url += "/{}".format(datetime.strftime(dt, "%Y-%m-%dT%H:%M:%S"))
 
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
+    try:
+        r = get_client().get(url)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        # while the aggregator is unavailable fall back to the closest stored price we have
+        fallback_price = PriceHistory.objects.get_closest_to(
+            price_url,
+            currency,
+            target,
+            timedelta(minutes=settings.PRICE_CACHE_FALLBACK_MINUTES),
+        )
+
+        if fallback_price is None:
+            raise
+
+        logger.warning(
+            "Price aggregator failed ({}). Using stored {} price from {}".format(
+                e, currency, fallback_price.time
+            )
+        )
+        return fallback_price.get_data()
 
     try:
-        return r.json()
+        price_data = r.json()
     except ValueError:
         print("No Json Returned: {}".format(r.text))
         return None
 
+    PriceHistory.objects.record(price_url, currency, target, price_data)
+
+    return price_data
+
 
 def get_price_movement(price_url, currency):
     """
@@ -52,7 +100,7 @@ def get_price_movement(price_url, currency):
     if currency.lower() == "cnnbt":
         currency = "cny"
 
-    r = requests.get(url="{}/{}".format(price_url, currency), timeout=30)
+    r = get_client().get("{}/{}".format(price_url, currency))
     r.raise_for_status()
 
     try:
@@ -60,3 +108,37 @@ def get_price_movement(price_url, currency):
     except ValueError:
         print("No Json Returned: {}".format(r.text))
         return None
+
+
+def get_cached_price_movement(price_url, currency):
+    """
+    get the price movements from the cache, refreshing them from the price aggregator once they are
+    older than PRICE_MOVEMENT_CACHE_SECONDS.
+    If the refresh fails the previous movements are used until they are a day old
+    """
+    key = "price_movement:{}".format(
+        hashlib.md5(
+            "{}/{}".format(price_url, currency.lower()).encode("utf-8")
+        ).hexdigest()
+    )
+    cached = cache.get(key)
+
+    if cached is not None and cached["expires"] > time.time():
+        return cached["movements"]
+
+    try:
+        movements = get_price_movement(price_url, currency)
+    except requests.RequestException as e:
+        logger.warning("Failed to refresh {} price movements: {}".format(currency, e))
+        return cached["movements"] if cached is not None else None
+
+    cache.set(
+        key,
+        {
+            "movements": movements,
+            "expires": time.time() + settings.PRICE_MOVEMENT_CACHE_SECONDS,
+        },
+        60 * 60 * 24,
+    )
+
+    return movements
@@ -0,0 +1,258 @@
+import datetime
+import gzip
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from overwatch.models import (
+    Bot,
+    BotBalance,
+    BotDataRollup,
+    BotError,
+    BotHeartBeat,
+    BotLatestState,
+    BotPlacedOrder,
+    BotPrice,
+)
+
+logger = logging.getLogger(__name__)
+
+"""
+The telemetry tables only keep RETENTION_POLICIES[table]["days"] days of raw rows.
+Older rows are removed oldest first in batches of RETENTION_BATCH_SIZE, each in its own short transaction.
+Before a batch is deleted it can be
+archived: written to RETENTION_ARCHIVE_DIR/<table>/ as gzipped JSON holding a list of values per column,
+rolled up: summarised into the BotDataRollup of each bot and hour or day, as the count of rows
+and [count, sum, min, max] of each numeric field.
+Tables without a policy are kept forever.
+The rows a BotLatestState points at are never removed, so a bot that stopped reporting still shows its last data
+"""
+
+TABLES = {
+    "prices": {
+        "model": BotPrice,
+        "fields": ["price", "price_usd", "bid_price_usd", "ask_price_usd"],
+        "latest": "last_price",
+        "version": "prices",
+    },
+    "balances": {
+        "model": BotBalance,
+        "fields": [
+            "bid_available",
+            "ask_available",
+            "bid_on_order",
+            "ask_on_order",
+            "bid_available_usd",
+            "ask_available_usd",
+            "bid_on_order_usd",
+            "ask_on_order_usd",
+        ],
+        "latest": "last_balance",
+        "version": "balances",
+    },
+    "placed_orders": {
+        "model": BotPlacedOrder,
+        "fields": ["price", "price_usd", "amount"],
+        # buy and sell orders are summarised separately, e.g. "buy.price"
+        "group": "order_type",
+        "version": "placed_orders",
+    },
+    "heartbeats": {"model": BotHeartBeat, "fields": []},
+    "errors": {"model": BotError, "fields": [], "version": "errors"},
+}
+
+
+def get_expired(table, now):
+    """
+    The rows of the table that are older than its policy keeps
+    """
+    config = TABLES[table]
+    policy = settings.RETENTION_POLICIES[table]
+    expired = config["model"].objects.filter(
+        time__lt=now - datetime.timedelta(days=policy["days"])
+    )
+
+    if "latest" in config:
+        expired = expired.exclude(
+            pk__in=BotLatestState.objects.filter(
+                **{"{}__isnull".format(config["latest"]): False}
+            ).values(config["latest"])
+        )
+
+    return expired
+
+
+def get_period_start(time, period):
+    time = time.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    if period == BotDataRollup.DAY:
+        time = time.replace(hour=0)
+
+    return time
+
+
+def get_rollups(table, period, rows):
+    """
+    Summarise the rows as {(bot pk, period start): (count, stats)}
+    """
+    config = TABLES[table]
+    rollups = {}
+
+    for row in rows:
+        key = (row["bot_id"], get_period_start(row["time"], period))
+        count, stats = rollups.get(key, (0, {}))
+
+        for field in config["fields"]:
+            value = row[field]
+
+            if value is None:
+                continue
+
+            if "group" in config:
+                field = "{}.{}".format(row[config["group"]], field)
+
+            if field in stats:
+                field_count, total, low, high = stats[field]
+                stats[field] = [
+                    field_count + 1,
+                    total + value,
+                    min(low, value),
+                    max(high, value),
+                ]
+            else:
+                stats[field] = [1, value, value, value]
+
+        rollups[key] = (count + 1, stats)
+
+    return rollups
+
+
+def to_json(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+
+    return value
+
+
+def archive(table, columns, rows):
+    """
+    Write the rows to a gzipped JSON file of {"table": table, "columns": {column: [values]}}.
+    The file is named after the first row's time and the first and last pks so an archived batch
+    that is written again, because the delete after it failed, replaces the first copy
+    """
+    directory = os.path.join(settings.RETENTION_ARCHIVE_DIR, table)
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(
+        directory,
+        "{:%Y%m%d%H%M%S}-{}-{}.json.gz".format(
+            rows[0]["time"], rows[0]["id"], rows[-1]["id"]
+        ),
+    )
+    handle, temp_path = tempfile.mkstemp(dir=directory)
+
+    with os.fdopen(handle, "wb") as raw_file, gzip.GzipFile(
+        fileobj=raw_file, mode="wb"
+    ) as archive_file:
+        archive_file.write(
+            json.dumps(
+                {
+                    "table": table,
+                    "columns": {
+                        column: [to_json(row[column]) for row in rows]
+                        for column in columns
+                    },
+                }
+            ).encode("utf-8")
+        )
+
+    os.replace(temp_path, path)
+
+    return path
+
+
+def expire_batch(table, now, batch_size):
+    """
+    Archive, roll up and delete the oldest batch of the table's expired rows.
+    Returns the number of rows removed
+    """
+    config = TABLES[table]
+    policy = settings.RETENTION_POLICIES[table]
+    model = config["model"]
+    columns = [field.attname for field in model._meta.concrete_fields]
+
+    with transaction.atomic():
+        rows = list(
+            get_expired(table, now)
+            .select_for_update(skip_locked=True)
+            .order_by("time", "pk")
+            .values(*columns)[:batch_size]
+        )
+
+        if not rows:
+            return 0
+
+        if policy.get("archive"):
+            archive(table, columns, rows)
+
+        if policy.get("rollup"):
+            for (bot_pk, time), (count, stats) in get_rollups(
+                table, policy["rollup"], rows
+            ).items():
+                BotDataRollup.objects.add(
+                    bot_pk, table, policy["rollup"], time, count, stats
+                )
+
+        model.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+
+        if "version" in config:
+            # the tables and charts drawn from the rows are out of date
+            for bot in Bot.objects.filter(pk__in={row["bot_id"] for row in rows}):
+                BotLatestState.objects.touch(bot, data=config["version"])
+
+    return len(rows)
+
+
+def apply_retention(tables=None, batch_size=None, max_batches=None, now=None):
+    """
+    Remove the expired rows of the tables (by default every table with a policy), up to max_batches
+    batches of each table.
+    Returns ({table: rows removed}, whether every expired row was removed)
+    """
+    if now is None:
+        now = timezone.now()
+
+    if tables is None:
+        tables = [table for table in TABLES if table in settings.RETENTION_POLICIES]
+
+    if batch_size is None:
+        batch_size = settings.RETENTION_BATCH_SIZE
+
+    removed = {}
+    done = True
+
+    for table in tables:
+        removed[table] = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            count = expire_batch(table, now, batch_size)
+            removed[table] += count
+            batches += 1
+
+            if count < batch_size:
+                break
+        else:
+            done = False
+
+        logger.info("Removed {} expired {}".format(removed[table], table))
+
+    return removed, done
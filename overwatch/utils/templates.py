@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+from django.template import Context, Template
+
+"""
+Compiled template fragments.
+Lexing and parsing a Template is the expensive part of rendering the small fragments used for the bot data
+so each distinct template string is compiled once per process and reused
+"""
+
+
+@lru_cache(maxsize=512)
+def compile_template(template_string):
+    return Template(template_string)
+
+
+def render_fragment(template_string, context):
+    return compile_template(template_string).render(Context(context))
@@ -0,0 +1,517 @@
+import asyncio
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from overwatch.models import (
+    BotBalance,
+    BotLatestState,
+    BotPlacedOrder,
+    BotPrice,
+    BotProfitRollup,
+    BotTrade,
+)
+from overwatch.utils.aggregator_client import get_client
+from overwatch.utils.price_aggregator import get_price_data
+
+logger = logging.getLogger(__name__)
+
+"""
+Batched USD valuation of bot telemetry.
+Pending rows (updated=False) are pulled in bulk, the aggregator price for each distinct
+(price url, currency, time bucket) is fetched once and the results are written with bulk_update.
+Each run claims its batch by setting valuation_retry_at, so concurrent runs never value the same rows.
+Rows that can't be valued keep a later valuation_retry_at, backing off with each failed attempt
+"""
+
+
+def get_time_bucket(dt, minutes=None):
+    """
+    Floor the datetime to the start of the valuation bucket it falls in
+    """
+    if minutes is None:
+        minutes = settings.VALUATION_BUCKET_MINUTES
+
+    offset = int(dt.timestamp()) % (minutes * 60)
+    return dt.replace(microsecond=0) - datetime.timedelta(seconds=offset)
+
+
+def get_price_key(price_url, currency, dt):
+    return price_url, currency.lower(), get_time_bucket(dt)
+
+
+def get_price_requirements(row):
+    """
+    Return the (price_url, currency) pairs that need an aggregator price to value the row
+    """
+    bot = row.bot
+
+    if isinstance(row, BotBalance):
+        return [(bot.quote_price_url, bot.quote), (bot.base_price_url, bot.base)]
+
+    if isinstance(row, (BotPrice, BotTrade)):
+        return [(bot.quote_price_url, bot.quote)]
+
+    # BotPlacedOrders are valued from the closest BotPrice so need no aggregator price
+    return []
+
+
+def get_price_keys(rows):
+    """
+    Collect the distinct price keys needed to value all of the rows
+    """
+    keys = set()
+
+    for row in rows:
+        for price_url, currency in get_price_requirements(row):
+            if currency:
+                keys.add(get_price_key(price_url, currency, row.time))
+
+    return keys
+
+
+def fetch_price(key):
+    """
+    Get the 30 minute moving average USD price for a single price key
+    """
+    price_url, currency, bucket = key
+
+    try:
+        price_data = get_price_data(price_url, currency, bucket)
+    except requests.RequestException as e:
+        logger.error("Failed to get price for {} at {}: {}".format(currency, bucket, e))
+        return None
+
+    if price_data is None:
+        logger.error("No price data found for {} at {}".format(currency, bucket))
+        return None
+
+    price_30_ma = price_data.get("moving_averages", {}).get("30_minute")
+
+    if price_30_ma is None:
+        logger.error("No 30 min MA found for {} at {}".format(currency, bucket))
+
+    return price_30_ma
+
+
+def fetch_prices(keys):
+    return {key: fetch_price(key) for key in keys}
+
+
+def get_price(prices, price_url, currency, dt):
+    if not currency:
+        return None
+
+    return prices.get(get_price_key(price_url, currency, dt))
+
+
+def value_bot_price(bot_price, prices):
+    price_30_ma = get_price(
+        prices, bot_price.bot.quote_price_url, bot_price.bot.quote, bot_price.time
+    )
+
+    if price_30_ma is None:
+        return False
+
+    if bot_price.price:
+        bot_price.price_usd = bot_price.price * price_30_ma
+
+    if bot_price.bid_price:
+        bot_price.bid_price_usd = bot_price.bid_price * price_30_ma
+
+    if bot_price.ask_price:
+        bot_price.ask_price_usd = bot_price.ask_price * price_30_ma
+
+    if bot_price.market_price:
+        bot_price.market_price_usd = bot_price.market_price * price_30_ma
+
+    bot_price.unit = bot_price.bot.quote
+    bot_price.updated = True
+    return True
+
+
+def value_bot_balance(bot_balance, prices):
+    quote_price_30_ma = get_price(
+        prices, bot_balance.bot.quote_price_url, bot_balance.bot.quote, bot_balance.time
+    )
+    base_price_30_ma = get_price(
+        prices, bot_balance.bot.base_price_url, bot_balance.bot.base, bot_balance.time
+    )
+
+    if quote_price_30_ma is None or base_price_30_ma is None:
+        return False
+
+    if bot_balance.bid_available is not None:
+        bot_balance.bid_available_usd = bot_balance.bid_available * quote_price_30_ma
+
+        try:
+            nearest_price = BotPrice.objects.get_closest_to(
+                bot_balance.bot, bot_balance.time
+            )
+        except BotPrice.DoesNotExist:
+            nearest_price = None
+
+        if nearest_price and nearest_price.price:
+            bot_balance.bid_available_as_base = (
+                bot_balance.bid_available / nearest_price.price
+            )
+
+    if bot_balance.bid_on_order is not None:
+        # bid_balance_on_order will be denominated in the 'base' currency
+        bot_balance.bid_on_order_usd = bot_balance.bid_on_order * base_price_30_ma
+
+    if bot_balance.ask_available is not None:
+        bot_balance.ask_available_usd = bot_balance.ask_available * base_price_30_ma
+
+    if bot_balance.ask_on_order is not None:
+        bot_balance.ask_on_order_usd = bot_balance.ask_on_order * base_price_30_ma
+
+    bot_balance.updated = True
+    return True
+
+
+def value_bot_trade(bot_trade, prices):
+    got_price_usd = get_price(
+        prices, bot_trade.bot.quote_price_url, bot_trade.bot.quote, bot_trade.time
+    )
+
+    if got_price_usd is None or not bot_trade.price:
+        return False
+
+    # get the bot_price value closest to the trade.
+    try:
+        closest_bot_price = BotPrice.objects.get_closest_to(
+            bot_trade.bot, bot_trade.time
+        )
+    except BotPrice.DoesNotExist:
+        logger.error("No closest BotPrice for BotTrade {}".format(bot_trade.pk))
+        return False
+
+    bot_price_usd = closest_bot_price.price_usd
+
+    if bot_price_usd is None:
+        logger.error(
+            "Closest BotPrice has no USD value for BotTrade {}".format(bot_trade.pk)
+        )
+        return False
+
+    trade_price_usd = bot_trade.price * got_price_usd
+
+    bot_trade.trade_price_usd = trade_price_usd
+    bot_trade.target_price_usd = bot_price_usd
+
+    if bot_trade.trade_type == "buy":
+        trade_difference = bot_price_usd - trade_price_usd
+    else:
+        trade_difference = trade_price_usd - bot_price_usd
+
+    bot_trade.difference_usd = trade_difference
+    bot_trade.profit_usd = trade_difference * bot_trade.amount
+    bot_trade.updated = True
+    return True
+
+
+def value_bot_placed_order(bot_order, prices):
+    # we should use the bot price closest to the order being placed to calculate the USD value
+    try:
+        closest_bot_price = BotPrice.objects.get_closest_to(
+            bot_order.bot, bot_order.time
+        )
+    except BotPrice.DoesNotExist:
+        logger.error("No closest BotPrice for BotPlacedOrder {}".format(bot_order.pk))
+        return False
+
+    bot_quote_price = closest_bot_price.quote_price
+
+    if bot_quote_price is None:
+        logger.error(
+            "No USD Price for closest price to BotPlacedOrder {}".format(bot_order.pk)
+        )
+        return False
+
+    if bot_order.price:
+        bot_order.price_usd = bot_order.price * bot_quote_price
+
+    bot_order.updated = True
+    return True
+
+
+# the function used to value a row of each model and the fields it writes.
+# BotPrices come first as the other models are valued against the closest updated BotPrice
+VALUERS = {
+    BotPrice: (
+        value_bot_price,
+        [
+            "price_usd",
+            "bid_price_usd",
+            "ask_price_usd",
+            "market_price_usd",
+            "unit",
+            "updated",
+        ],
+    ),
+    BotBalance: (
+        value_bot_balance,
+        [
+            "bid_available_usd",
+            "bid_available_as_base",
+            "bid_on_order_usd",
+            "ask_available_usd",
+            "ask_on_order_usd",
+            "updated",
+        ],
+    ),
+    BotTrade: (
+        value_bot_trade,
+        [
+            "trade_price_usd",
+            "target_price_usd",
+            "difference_usd",
+            "profit_usd",
+            "updated",
+        ],
+    ),
+    BotPlacedOrder: (value_bot_placed_order, ["price_usd", "updated"]),
+}
+
+
+def claim_pending(model, batch_size=None, bot=None):
+    """
+    Claim the newest rows of the model that are waiting for USD values and are due a valuation.
+    The rows are skipped by other runs until VALUATION_CLAIM_SECONDS have passed
+    """
+    if batch_size is None:
+        batch_size = settings.VALUATION_BATCH_SIZE
+
+    now = timezone.now()
+    claimed_until = now + datetime.timedelta(seconds=settings.VALUATION_CLAIM_SECONDS)
+
+    due = model.objects.filter(updated=False).filter(
+        Q(valuation_retry_at__isnull=True) | Q(valuation_retry_at__lte=now)
+    )
+
+    if bot is not None:
+        due = due.filter(bot=bot)
+
+    with transaction.atomic():
+        pks = list(
+            due.select_for_update(skip_locked=True)
+            .order_by("-time")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+
+        if not pks:
+            return []
+
+        # the conditional update keeps two runs apart on databases without row locks
+        due.filter(pk__in=pks).update(valuation_retry_at=claimed_until)
+
+    return list(
+        model.objects.filter(pk__in=pks, valuation_retry_at=claimed_until)
+        .select_related("bot")
+        .order_by("-time")
+    )
+
+
+def get_retry_at(attempts, now=None):
+    """
+    When a row that has failed valuation the given number of times is next due
+    """
+    if now is None:
+        now = timezone.now()
+
+    delay = min(
+        settings.VALUATION_RETRY_SECONDS * 2 ** (attempts - 1),
+        settings.VALUATION_RETRY_MAX_SECONDS,
+    )
+    return now + datetime.timedelta(seconds=delay)
+
+
+def apply_values(model, rows, prices):
+    """
+    Calculate the USD values of the rows from the fetched prices and write the valued rows in bulk.
+    The rows that couldn't be valued are given a later retry time
+    """
+    value_row, fields = VALUERS[model]
+    valued = []
+    failed = []
+
+    for row in rows:
+        (valued if value_row(row, prices) else failed).append(row)
+
+    if valued:
+        model.objects.bulk_update(valued, fields)
+
+        if model is BotTrade:
+            BotProfitRollup.objects.refresh_for_trades(valued)
+
+        update_latest_states(model, valued)
+
+    if failed:
+        now = timezone.now()
+
+        for row in failed:
+            row.valuation_attempts += 1
+            row.valuation_retry_at = get_retry_at(row.valuation_attempts, now)
+
+        model.objects.bulk_update(failed, ["valuation_attempts", "valuation_retry_at"])
+
+    return valued
+
+
+def update_latest_states(model, valued):
+    """
+    bulk_update skips save() so bring the BotLatestState of each affected bot up to date here
+    """
+    newest = {}
+
+    for row in valued:
+        if row.bot_id not in newest or row.time > newest[row.bot_id].time:
+            newest[row.bot_id] = row
+
+    for row in newest.values():
+        if model is BotPrice:
+            BotLatestState.objects.record_price(row)
+        elif model is BotTrade:
+            BotLatestState.objects.record_profit(row.bot, new_trades=True)
+        elif model is BotBalance:
+            BotLatestState.objects.touch(row.bot, data="balances")
+        else:
+            BotLatestState.objects.touch(row.bot, data="placed_orders")
+
+
+def value_rows(model, rows):
+    """
+    Value the claimed rows, fetching each distinct price they need once.
+    Returns the rows that were valued
+    """
+    prices = fetch_prices(get_price_keys(rows))
+    valued = apply_values(model, rows, prices)
+
+    logger.info(
+        "Valued {} of {} pending {} rows from {} distinct prices".format(
+            len(valued), len(rows), model.__name__, len(prices)
+        )
+    )
+    logger.debug("Price aggregator client stats: {}".format(get_client().stats()))
+
+    return valued
+
+
+def value_pending(model, batch_size=None, bot=None):
+    """
+    Value one batch of pending rows of the given model.
+    Returns the rows that were valued
+    """
+    rows = claim_pending(model, batch_size, bot)
+
+    if not rows:
+        return []
+
+    return value_rows(model, rows)
+
+
+def drain_pending(model, batch_size=None, bot=None):
+    """
+    Value batches of the model until no rows are due.
+    Rows that fail are not due again until their retry time, so this always finishes.
+    Returns the number of rows valued
+    """
+    total = 0
+
+    while True:
+        rows = claim_pending(model, batch_size, bot)
+
+        if not rows:
+            return total
+
+        total += len(value_rows(model, rows))
+
+
+def value_all_pending(batch_size=None, bot=None):
+    """
+    Value every due row of every model, in dependency order
+    """
+    return {model.__name__: drain_pending(model, batch_size, bot) for model in VALUERS}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the bounded thread pool the async valuation path runs its blocking work in
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.VALUATION_THREAD_POOL_SIZE,
+                    thread_name_prefix="valuation",
+                )
+
+    return _executor
+
+
+def _run_with_connection(func, *args):
+    close_old_connections()
+
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args):
+    """
+    Run the blocking func (network or ORM) in the valuation thread pool
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        get_executor(), partial(_run_with_connection, func, *args)
+    )
+
+
+async def fetch_prices_async(keys):
+    """
+    Fetch all of the price keys concurrently
+    """
+    keys = list(keys)
+    results = await asyncio.gather(*[run_in_pool(fetch_price, key) for key in keys])
+    return dict(zip(keys, results))
+
+
+async def drain_pending_async(model, batch_size=None, bot=None):
+    """
+    The asyncio equivalent of drain_pending.
+    Prices are fetched concurrently and the ORM work runs in the valuation thread pool
+    """
+    total = 0
+
+    while True:
+        rows = await run_in_pool(claim_pending, model, batch_size, bot)
+
+        if not rows:
+            return total
+
+        prices = await fetch_prices_async(get_price_keys(rows))
+        valued = await run_in_pool(apply_values, model, rows, prices)
+
+        logger.info(
+            "Valued {} of {} pending {} rows from {} distinct prices".format(
+                len(valued), len(rows), model.__name__, len(prices)
+            )
+        )
+
+        total += len(valued)
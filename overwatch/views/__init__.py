@@ -18,6 +18,7 @@ from .bot_api import (
     BotApiPricesView,
     BotApiBalancesView,
     BotApiTradeView,
+    BotApiBatchView,
 )
 from .bot_user_api import BotUserApiErrorsView
 
@@ -40,5 +41,6 @@ __all__ = [
     "BotApiPricesView",
     "BotApiBalancesView",
     "BotApiTradeView",
+    "BotApiBatchView",
     "BotUserApiErrorsView",
 ]
@@ -1,12 +1,11 @@
 from functools import reduce
-from math import ceil
 from operator import itemgetter
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.forms import Select
 from django.http import JsonResponse
@@ -24,6 +23,7 @@ from django.views.generic import (
 
 from overwatch.forms import ExchangeForm, AWSForm
 from overwatch.models import Bot, BotError, BotPlacedOrder, BotTrade, Exchange, AWS
+from overwatch.utils import data_tables
 
 
 class ListBotView(LoginRequiredMixin, ListView):
@@ -41,6 +41,11 @@ class ListBotView(LoginRequiredMixin, ListView):
 class DetailBotView(LoginRequiredMixin, DetailView):
     model = Bot
 
+    def get_context_data(self, **kwargs):
+        context = super(DetailBotView, self).get_context_data(**kwargs)
+        context["heartbeat_history"] = settings.HEARTBEAT_HISTORY
+        return context
+
 
 class UpdateBotView(SuccessMessageMixin, LoginRequiredMixin, UpdateView):
     model = Bot
@@ -158,55 +163,42 @@ class ActivateBotView(LoginRequiredMixin, View):
         return redirect("bot_detail", pk=pk)
 
 
-def generic_data_tables_view(request, object, bot_pk):
-    # get the basic parameters
-    draw = int(request.GET.get("draw", 0))
-    start = int(request.GET.get("start", 0))
-    length = int(request.GET.get("length", 0))
-
-    # handle a search term
-    search = request.GET.get("search[value]", "")
-    query_set = object.objects.filter(bot__pk=bot_pk)
-    results_total = query_set.count()
-
-    if search:
-        # start with a blank Q object and add a query for every non-relational field attached to the model
-        q_objects = Q()
+ERROR_COLUMNS = {
+    "time": ("time", data_tables.TIME),
+    "title": ("title", data_tables.TEXT),
+    "message": ("message", data_tables.TEXT),
+}
 
-        for field in object._meta.fields:
-            if field.is_relation:
-                continue
-            kwargs = {"{}__icontains".format(field.name): search}
-            q_objects |= Q(**kwargs)
+PLACED_ORDER_COLUMNS = {
+    "time": ("time", data_tables.TIME),
+    "order_type": ("order_type", data_tables.EXACT),
+    "price": ("price", data_tables.NUMBER),
+    "price_usd": ("price_usd", data_tables.NUMBER),
+    "amount": ("amount", data_tables.NUMBER),
+}
 
-        query_set = query_set.filter(q_objects)
+TRADE_COLUMNS = {
+    "time": ("time", data_tables.TIME),
+    "trade_id": ("trade_id", data_tables.EXACT),
+    "order_type": ("trade_type", data_tables.EXACT),
+    "target_price_usd": ("target_price_usd", data_tables.NUMBER),
+    "trade_price_usd": ("trade_price_usd", data_tables.NUMBER),
+    "amount": ("total", data_tables.NUMBER),
+    "profit": ("profit_usd", data_tables.NUMBER),
+}
 
-    # handle the ordering
-    order_column_index = request.GET.get("order[0][column]")
-    order_by = request.GET.get("columns[{}][name]".format(order_column_index))
-    order_direction = request.GET.get("order[0][dir]")
 
-    if order_direction == "desc":
-        order_by = "-{}".format(order_by)
-
-    if order_by:
-        query_set = query_set.order_by(order_by)
-
-    # now we have our completed queryset. we can paginate it
-    index = start + 1  # start is 0 based, pages are 1 based
-    page = Paginator(query_set, length).get_page(ceil(index / length))
-
-    return {
-        "draw": draw,
-        "recordsTotal": results_total,
-        "recordsFiltered": query_set.count(),
-        "data": page,
-    }
+def generic_data_tables_view(request, object, bot_pk, columns, data):
+    """
+    The DataTables page of the bot's rows of the object model, see overwatch.utils.data_tables
+    """
+    bot = get_object_or_404(Bot.objects.select_related("latest_state"), pk=bot_pk)
+    return data_tables.get_page(request, object, bot, columns, data)
 
 
 class BotErrorsDataTablesView(LoginRequiredMixin, View):
     def get(self, request, pk):
-        data = generic_data_tables_view(request, BotError, pk)
+        data = generic_data_tables_view(request, BotError, pk, ERROR_COLUMNS, "errors")
         return JsonResponse(
             {
                 "draw": data["draw"],
@@ -228,7 +220,9 @@ class BotErrorsDataTablesView(LoginRequiredMixin, View):
 
 class BotPlacedOrdersDataTablesView(LoginRequiredMixin, View):
     def get(self, request, pk):
-        data = generic_data_tables_view(request, BotPlacedOrder, pk)
+        data = generic_data_tables_view(
+            request, BotPlacedOrder, pk, PLACED_ORDER_COLUMNS, "placed_orders"
+        )
         return JsonResponse(
             {
                 "draw": data["draw"],
@@ -254,7 +248,7 @@ class BotPlacedOrdersDataTablesView(LoginRequiredMixin, View):
 
 class BotTradesDataTablesView(LoginRequiredMixin, View):
     def get(self, request, pk):
-        data = generic_data_tables_view(request, BotTrade, pk)
+        data = generic_data_tables_view(request, BotTrade, pk, TRADE_COLUMNS, "trades")
         return JsonResponse(
             {
                 "draw": data["draw"],
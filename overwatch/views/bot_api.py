@@ -4,19 +4,25 @@ import logging
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.db import transaction
 from django.http import JsonResponse, HttpResponseNotFound, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
 
 from overwatch.models import (
     BotHeartBeat,
+    BotLatestState,
     Bot,
     BotPlacedOrder,
     BotPrice,
     BotBalance,
     BotTrade,
 )
+from overwatch.utils import bot_updates
 
 logger = logging.getLogger(__name__)
 
@@ -50,9 +56,7 @@ def handle_bot_api_auth(request_data, additional_keys=None):
     supplied_hash = request_data.get("h")
 
     try:
-        bot = Bot.objects.get(
-            name__iexact=name, exchange_account__exchange__iexact=exchange
-        )
+        bot = Bot.objects.get_for_api(name, exchange)
     except Bot.DoesNotExist:
         return (
             False,
@@ -86,6 +90,8 @@ def handle_bot_api_auth(request_data, additional_keys=None):
 class BotApiConfigView(View):
     """
     Endpoint to allow a bot to request it's  config as a json object.
+    The config is sent with an ETag, and a bot that sends it back in If-None-Match
+    is answered 304 Not Modified until the config changes.
     Hitting this endpoint also registers a Bot Heartbeat
     """
 
@@ -100,7 +106,31 @@ class BotApiConfigView(View):
         # create a heartbeat object
         BotHeartBeat.objects.create(bot=bot)
 
-        return JsonResponse(bot.serialize())
+        # the authenticated bot is a cached copy of its identity,
+        # so check the current config's ETag before loading the config itself
+        config_etag = (
+            Bot.objects.filter(pk=bot.pk).values_list("config_etag", flat=True).get()
+        )
+
+        if config_etag:
+            etag = '"{}"'.format(config_etag)
+            response = get_conditional_response(request, etag=etag)
+
+            if response is not None:
+                response["ETag"] = etag
+                return response
+
+        bot = Bot.objects.select_related("exchange_account").get(pk=bot.pk)
+
+        if not config_etag:
+            # the bot hasn't been saved since configs had an ETag
+            bot.save(update_fields=["config_etag"])
+            etag = '"{}"'.format(bot.config_etag)
+
+        response = JsonResponse(bot.serialize())
+        response["ETag"] = etag
+
+        return response
 
 
 class BotApiPlacedOrderView(View):
@@ -167,9 +197,7 @@ class BotApiPricesView(View):
             quote_price=request.POST.get("quote_price"),
         )
 
-        async_to_sync(get_channel_layer().group_send)(
-            "bot_{}".format(bot.pk), {"type": "get.price.info",}
-        )
+        bot_updates.announce(bot.pk, bot_updates.PRICE_INFO)
 
         return JsonResponse({"success": True})
 
@@ -275,3 +303,259 @@ class BotApiTradeView(View):
             return JsonResponse({"success": True, "trade_id": last_trade.trade_id})
 
         return JsonResponse({"success": True, "trade_id": None})
+
+
+class BotApiBatchView(View):
+    """
+    Endpoint to allow a bot to report everything from a run in a single request.
+    The body is a JSON object holding the usual authentication keys along with lists of
+    "prices", "balances", "placed_orders" and "trades" and an optional "heartbeat" flag.
+    Each list item holds the same keys as the single row endpoint.
+    Prices, balances and placed orders can also hold the "time" the bot recorded them,
+    which they are stored with, and rows already stored with that time are skipped,
+    so a batch that may not have been received can be sent again.
+    All rows are inserted in one transaction and valued from one message
+    """
+
+    # the keys required in each item of each list
+    batch_keys = {
+        "prices": [
+            "price",
+            "bid_price",
+            "ask_price",
+            "market_price",
+            "base_price",
+            "quote_price",
+        ],
+        "balances": [
+            "bid_available",
+            "ask_available",
+            "bid_on_order",
+            "ask_on_order",
+            "unit",
+        ],
+        "placed_orders": ["base", "quote", "order_type", "price", "amount"],
+        "trades": [
+            "trade_time",
+            "trade_id",
+            "trade_type",
+            "price",
+            "amount",
+            "total",
+            "age",
+        ],
+    }
+
+    @csrf_exempt
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request):
+        try:
+            batch = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            return JsonResponse({"success": False, "error": "body is not valid JSON"})
+
+        if not isinstance(batch, dict):
+            return JsonResponse(
+                {"success": False, "error": "body should be a JSON object"}
+            )
+
+        for batch_type, keys in self.batch_keys.items():
+            rows = batch.get(batch_type, [])
+
+            if not isinstance(rows, list):
+                return JsonResponse(
+                    {
+                        "success": False,
+                        "error": "{} should be a list".format(batch_type),
+                    }
+                )
+
+            for row in rows:
+                for key in keys:
+                    if not isinstance(row, dict) or key not in row:
+                        return JsonResponse(
+                            {
+                                "success": False,
+                                "error": "no {} present in {} data".format(
+                                    key, batch_type
+                                ),
+                            }
+                        )
+
+                if row.get("time") is not None:
+                    row["time"] = self.parse_time(row["time"])
+
+                    if row["time"] is None:
+                        return JsonResponse(
+                            {
+                                "success": False,
+                                "error": "time in {} data is not a valid timestamp".format(
+                                    batch_type
+                                ),
+                            }
+                        )
+
+        success, bot = handle_bot_api_auth(batch)
+
+        if not success:
+            # if the function returns False, then bot is set to a Response instance
+            return bot
+
+        with transaction.atomic():
+            created = self.create_rows(bot, batch)
+
+            if batch.get("heartbeat"):
+                BotHeartBeat.objects.create(bot=bot)
+
+            transaction.on_commit(lambda: self.send_updates(bot, created))
+
+        return JsonResponse({"success": True, "created": created})
+
+    @staticmethod
+    def parse_time(value):
+        """
+        Parse an ISO 8601 timestamp sent by the bot. Returns None if it isn't one
+        """
+        try:
+            dt = parse_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        if dt is not None and timezone.is_naive(dt):
+            dt = timezone.make_aware(dt, timezone.utc)
+
+        return dt
+
+    @staticmethod
+    def get_new_rows(model, bot, rows, now):
+        """
+        Give rows sent without a time the current time and leave out the rows already stored
+        """
+        for row in rows:
+            if row.get("time") is None:
+                row["time"] = now
+
+        existing_times = set(
+            model.objects.filter(
+                bot=bot, time__in=[row["time"] for row in rows]
+            ).values_list("time", flat=True)
+        )
+
+        return [row for row in rows if row["time"] not in existing_times]
+
+    def create_rows(self, bot, batch):
+        now = timezone.now()
+
+        prices = BotPrice.objects.bulk_create(
+            [
+                BotPrice(
+                    bot=bot,
+                    time=price["time"],
+                    price=price["price"],
+                    bid_price=price["bid_price"],
+                    ask_price=price["ask_price"],
+                    market_price=price["market_price"],
+                    base_price=price["base_price"],
+                    quote_price=price["quote_price"],
+                )
+                for price in self.get_new_rows(
+                    BotPrice, bot, batch.get("prices", []), now
+                )
+            ]
+        )
+
+        balances = BotBalance.objects.bulk_create(
+            [
+                BotBalance(
+                    bot=bot,
+                    time=balance["time"],
+                    bid_available=balance["bid_available"],
+                    ask_available=balance["ask_available"],
+                    bid_on_order=balance["bid_on_order"],
+                    ask_on_order=balance["ask_on_order"],
+                    # Bittrex still lists USNBT as NBT
+                    unit="USNBT"
+                    if balance["unit"].upper() == "NBT"
+                    else balance["unit"],
+                )
+                for balance in self.get_new_rows(
+                    BotBalance, bot, batch.get("balances", []), now
+                )
+            ]
+        )
+
+        placed_orders = BotPlacedOrder.objects.bulk_create(
+            [
+                BotPlacedOrder(
+                    bot=bot,
+                    time=placed_order["time"],
+                    base=placed_order["base"],
+                    quote=placed_order["quote"],
+                    order_type=placed_order["order_type"],
+                    price=placed_order["price"],
+                    amount=placed_order["amount"],
+                )
+                for placed_order in self.get_new_rows(
+                    BotPlacedOrder, bot, batch.get("placed_orders", []), now
+                )
+            ]
+        )
+
+        # trades that have already been reported are skipped
+        trades = batch.get("trades", [])
+        existing_trade_ids = set(
+            BotTrade.objects.filter(
+                bot=bot, trade_id__in=[str(trade["trade_id"]) for trade in trades]
+            ).values_list("trade_id", flat=True)
+        )
+        new_trades = BotTrade.objects.bulk_create(
+            [
+                BotTrade(
+                    bot=bot,
+                    time=trade["trade_time"],
+                    trade_id=trade["trade_id"],
+                    trade_type=trade["trade_type"],
+                    price=trade["price"],
+                    amount=trade["amount"],
+                    total=trade["total"],
+                    age=datetime.timedelta(seconds=int(trade["age"])),
+                )
+                for trade in trades
+                if str(trade["trade_id"]) not in existing_trade_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+        if balances:
+            # bulk_create skips save() so record the latest balance here
+            BotLatestState.objects.record_balance(
+                BotBalance.objects.filter(bot=bot).latest("time")
+            )
+
+        if placed_orders:
+            BotLatestState.objects.touch(bot, data="placed_orders")
+
+        if new_trades:
+            BotLatestState.objects.touch(bot, data="trades")
+
+        return {
+            "prices": len(prices),
+            "balances": len(balances),
+            "placed_orders": len(placed_orders),
+            "trades": len(new_trades),
+        }
+
+    @staticmethod
+    def send_updates(bot, created):
+        if not any(created.values()):
+            return
+
+        # value the whole batch from a single message
+        async_to_sync(get_channel_layer().send)(
+            "bot-valuation", {"type": "value.batch", "bot_pk": bot.pk}
+        )
+
+        if created["prices"]:
+            bot_updates.announce(bot.pk, bot_updates.PRICE_INFO)